@@ -8,6 +8,7 @@ import os
 import json
 from src.core.frames import Tipo_Mensaje
 from src.core.env_recb import Envio_recibo_frames
+from src.core.fragmentation import MensajeEnDisco
 from src.features.files import FileTransfer
 from src.core.mac import Mac
 from src.features.discovery import DiscoveryManager
@@ -505,7 +506,7 @@ class ChatMinimalTkinter:
             
             # Solo intentar decodificar para preview, no para procesamiento
             try:
-                if isinstance(datos_raw, bytes):
+                if isinstance(datos_raw, (bytes, bytearray)):
                     mensaje_preview = datos_raw.decode('utf-8', errors='ignore')[:100]
                 else:
                     mensaje_preview = str(datos_raw)[:100]
@@ -514,8 +515,13 @@ class ChatMinimalTkinter:
             
             print(f"   - Datos recibidos: {mensaje_preview}...")
             
+            # Archivos grandes llegan reensamblados en disco
+            if isinstance(datos_raw, MensajeEnDisco):
+                self.file_transfer.receive_file(datos_raw, frame.mac_origen)
+                return
+            
             # Procesar según el tipo de datos - pasar datos raw al file_transfer
-            if isinstance(datos_raw, bytes) and len(datos_raw) >= 2:
+            if isinstance(datos_raw, (bytes, bytearray)) and len(datos_raw) >= 2:
                 # Verificar formato FILE_TRANSFER: nuevo
                 if datos_raw.startswith(b"FILE_TRANSFER:"):
                     self.file_transfer.receive_file(datos_raw, frame.mac_origen)
@@ -534,7 +540,7 @@ class ChatMinimalTkinter:
             
             # Intentar formato legacy (string)
             try:
-                if isinstance(datos_raw, bytes):
+                if isinstance(datos_raw, (bytes, bytearray)):
                     mensaje = datos_raw.decode('utf-8', errors='ignore')
                 else:
                     mensaje = str(datos_raw)
@@ -741,7 +747,7 @@ class ChatMinimalTkinter:
             self.root.after(0, self.actualizar_destinos)
         
         # Mostrar mensaje
-        if isinstance(mensaje, bytes):
+        if isinstance(mensaje, (bytes, bytearray)):
             try:
                 # Intentar decodificar como texto
                 mensaje_texto = mensaje.decode('utf-8')
@@ -823,7 +829,7 @@ class ChatMinimalTkinter:
                     mensaje = decoded_frame.datos
                     
                     # Convertir a string si es bytes
-                    if isinstance(mensaje, bytes):
+                    if isinstance(mensaje, (bytes, bytearray)):
                         try:
                             mensaje = mensaje.decode('utf-8')
                         except:
@@ -1078,7 +1084,16 @@ class ChatMinimalTkinter:
         mensaje += f"   • Mensajes pendientes: {estadisticas.get('mensajes_pendientes', 0)}\n\n"
         
         mensaje += "🔧 PROTOCOLO:\n"
-        mensaje += f"   • Frames de protocolo enviados: {estadisticas.get('frames_protocolo_enviados', 0)}\n\n"
+        mensaje += f"   • Frames de protocolo enviados: {estadisticas.get('frames_protocolo_enviados', 0)}\n"
+        limites = []
+        if estadisticas.get('pacing_modo', 'desactivado') != 'desactivado':
+            if estadisticas.get('pacing_bytes_por_segundo'):
+                limites.append(f"{estadisticas['pacing_bytes_por_segundo'] / 1e6:.1f} MB/s")
+            if estadisticas.get('pacing_frames_por_segundo'):
+                limites.append(f"{estadisticas['pacing_frames_por_segundo']:,.0f} frames/s")
+        mensaje += f"   • Pacing: {estadisticas.get('pacing_modo', 'desactivado')}"
+        mensaje += f" ({', '.join(limites)})\n" if limites else "\n"
+        mensaje += f"   • Frames perdidos por buffer lleno (kernel): {estadisticas.get('frames_perdidos_buffer_kernel', 0)}\n\n"
         
         mensaje += "🔍 DESCUBRIMIENTO:\n"
         mensaje += f"   • Dispositivos descubiertos: {estadisticas.get('dispositivos_descubiertos', 0)}\n\n"
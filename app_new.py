@@ -367,7 +367,7 @@ class ChatMinimalTkinter:
             self.root.after(0, self.actualizar_destinos)
         
         # Mostrar mensaje
-        if isinstance(mensaje, bytes):
+        if isinstance(mensaje, (bytes, bytearray)):
             try:
                 # Intentar decodificar como texto
                 mensaje_texto = mensaje.decode('utf-8')
@@ -408,7 +408,16 @@ class ChatMinimalTkinter:
         mensaje += f"   • Mensajes pendientes: {estadisticas.get('mensajes_pendientes', 0)}\n\n"
         
         mensaje += " PROTOCOLO:\n"
-        mensaje += f"   • Frames de protocolo enviados: {estadisticas.get('frames_protocolo_enviados', 0)}\n\n"
+        mensaje += f"   • Frames de protocolo enviados: {estadisticas.get('frames_protocolo_enviados', 0)}\n"
+        limites = []
+        if estadisticas.get('pacing_modo', 'desactivado') != 'desactivado':
+            if estadisticas.get('pacing_bytes_por_segundo'):
+                limites.append(f"{estadisticas['pacing_bytes_por_segundo'] / 1e6:.1f} MB/s")
+            if estadisticas.get('pacing_frames_por_segundo'):
+                limites.append(f"{estadisticas['pacing_frames_por_segundo']:,.0f} frames/s")
+        mensaje += f"   • Pacing: {estadisticas.get('pacing_modo', 'desactivado')}"
+        mensaje += f" ({', '.join(limites)})\n" if limites else "\n"
+        mensaje += f"   • Frames perdidos por buffer lleno (kernel): {estadisticas.get('frames_perdidos_buffer_kernel', 0)}\n\n"
         
         mensaje += " DESCUBRIMIENTO:\n"
         mensaje += f"   • Dispositivos descubiertos: {estadisticas.get('dispositivos_descubiertos', 0)}\n\n"
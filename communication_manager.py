@@ -154,7 +154,7 @@ class CommunicationManager:
                     mensaje = decoded_frame.datos
                     
                     # Convertir a string si es bytes
-                    if isinstance(mensaje, bytes):
+                    if isinstance(mensaje, (bytes, bytearray)):
                         try:
                             mensaje = mensaje.decode('utf-8')
                         except:
@@ -3,6 +3,7 @@ import os
 import time
 from tkinter import filedialog, messagebox
 import tkinter as tk
+from src.core.fragmentation import MensajeEnDisco
 
 class FileTransferHandler:
     def __init__(self, app):
@@ -202,7 +203,7 @@ class FileTransferHandler:
             
             # Solo intentar decodificar para preview, no para procesamiento
             try:
-                if isinstance(datos_raw, bytes):
+                if isinstance(datos_raw, (bytes, bytearray)):
                     mensaje_preview = datos_raw.decode('utf-8', errors='ignore')[:100]
                 else:
                     mensaje_preview = str(datos_raw)[:100]
@@ -211,8 +212,13 @@ class FileTransferHandler:
             
             print(f"   - Datos recibidos: {mensaje_preview}...")
             
+            # Archivos grandes llegan reensamblados en disco
+            if isinstance(datos_raw, MensajeEnDisco):
+                self.file_transfer.receive_file(datos_raw, frame.mac_origen)
+                return
+            
             # Procesar según el tipo de datos - pasar datos raw al file_transfer
-            if isinstance(datos_raw, bytes) and len(datos_raw) >= 2:
+            if isinstance(datos_raw, (bytes, bytearray)) and len(datos_raw) >= 2:
                 # Verificar formato FILE_TRANSFER: nuevo
                 if datos_raw.startswith(b"FILE_TRANSFER:"):
                     self.file_transfer.receive_file(datos_raw, frame.mac_origen)
@@ -231,7 +237,7 @@ class FileTransferHandler:
             
             # Intentar formato legacy (string)
             try:
-                if isinstance(datos_raw, bytes):
+                if isinstance(datos_raw, (bytes, bytearray)):
                     mensaje = datos_raw.decode('utf-8', errors='ignore')
                 else:
                     mensaje = str(datos_raw)
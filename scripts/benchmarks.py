@@ -0,0 +1,1490 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks de Link-Chat
+
+Uso:
+    python3 scripts/benchmarks.py <benchmark> [opciones]
+    python3 scripts/benchmarks.py --lista
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BENCHMARKS = {}
+
+
+def benchmark(nombre):
+    """Registra una función como benchmark ejecutable desde la línea de comandos"""
+    def registrar(funcion):
+        BENCHMARKS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+@benchmark("bitmap")
+def bench_bitmap(args):
+    """Coste por fragmento del seguimiento con bitmap frente a set(range(n))"""
+    from src.core.fragmentation import MapaFragmentos
+
+    print(f"{'fragmentos':>12} {'bitmap ns/frag':>16} {'set ns/frag':>14}")
+    for total in (1_000, 10_000, 100_000, 1_000_000, 4_000_000):
+        inicio = time.perf_counter()
+        mapa = MapaFragmentos(total)
+        for i in range(total):
+            mapa.marcar(i)
+            if mapa.completo:
+                break
+        ns_bitmap = (time.perf_counter() - inicio) * 1e9 / total
+
+        # Método anterior: diferencia de conjuntos en cada fragmento (O(n²)),
+        # se mide sobre una muestra para que termine en un tiempo razonable
+        muestra = min(total, args.muestra)
+        esperados = set(range(total))
+        recibidos = {}
+        inicio = time.perf_counter()
+        for i in range(muestra):
+            recibidos[i] = None
+            faltantes = esperados - set(recibidos.keys())
+            if not faltantes:
+                break
+        ns_set = (time.perf_counter() - inicio) * 1e9 / muestra
+
+        print(f"{total:>12,} {ns_bitmap:>16.0f} {ns_set:>14.0f}")
+
+
+@contextmanager
+def par_veth(nombre="lcbench", mtu: int = 1500):
+    """Crea un par veth temporal (requiere root) y lo elimina al terminar"""
+    a, b = f"{nombre}0", f"{nombre}1"
+    subprocess.run(["ip", "link", "add", a, "type", "veth", "peer", "name", b], check=True)
+    try:
+        for interfaz in (a, b):
+            subprocess.run(["ip", "link", "set", interfaz, "mtu", str(mtu), "up"], check=True)
+        yield a, b
+    finally:
+        subprocess.run(["ip", "link", "del", a], check=False)
+
+
+@contextmanager
+def directorio_de_trabajo():
+    """
+    Ejecuta en un directorio temporal que se borra al terminar: lo que el
+    código guarda en ./downloads (reensamblados en disco, archivos recibidos)
+    no queda en el árbol del repositorio
+    """
+    anterior = os.getcwd()
+    directorio = tempfile.mkdtemp(prefix="linkchat_bench_")
+    try:
+        os.chdir(directorio)
+        yield directorio
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def _emisor_continuo(interfaz, mac_destino, segundos, tamaño_payload):
+    """Proceso emisor: envía frames de Link-Chat lo más rápido posible"""
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x88B5))
+    sock.bind((interfaz, 0))
+    frame = bytes.fromhex(mac_destino.replace(":", "")) + bytes(6) + b"\x88\xb5" + bytes(tamaño_payload)
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        for _ in range(256):
+            try:
+                sock.send(frame)
+            except OSError:
+                pass
+
+
+def _medir_recepcion(sock, backend, segundos):
+    """Cuenta frames recibidos durante `segundos` con el backend indicado"""
+    from src.core.packet_mmap import AnilloRecepcion
+    from src.core.recepcion_lotes import ReceptorLotes
+
+    recibidos = 0
+    fin = time.monotonic() + segundos
+    if backend == "lotes":
+        receptor = ReceptorLotes(sock)
+        while time.monotonic() < fin:
+            if receptor.esperar(timeout=0.1):
+                while True:
+                    recibidos += len(receptor.recibir_lote())
+                    if receptor.agotado:
+                        break
+        estado = receptor.estado()
+        print(f"{'':>10} lotes: {estado['recepcion_frames_por_lote']:.1f} frames/lote, "
+              f"{estado['recepcion_recv_por_frame']:.2f} recv/frame, "
+              f"{estado['recepcion_poll_por_frame']:.3f} poll/frame")
+        receptor.cerrar()
+    elif backend == "ring":
+        anillo = AnilloRecepcion(sock)
+        while time.monotonic() < fin:
+            if anillo.esperar(timeout=0.1):
+                for vista in anillo.frames():
+                    recibidos += 1
+                    del vista
+        anillo.cerrar()
+    else:
+        sock.settimeout(0.1)
+        while time.monotonic() < fin:
+            try:
+                sock.recvfrom(65535)
+                recibidos += 1
+            except socket.timeout:
+                pass
+    return recibidos
+
+
+@benchmark("rx")
+def bench_rx(args):
+    """Frames/s recibidos con recvfrom, por lotes (recv_into) y PACKET_RX_RING sobre un par veth (root)"""
+    from src.core import bpf
+
+    with par_veth() as (emisor, receptor):
+        with open(f"/sys/class/net/{receptor}/address") as f:
+            mac_receptor = f.read().strip()
+        print(f"{'backend':>10} {'frames/s':>12} {'perdidos por buffer':>20}")
+        for backend in ("recvfrom", "lotes", "ring"):
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x88B5))
+            sock.bind((receptor, 0))
+            bpf.adjuntar_filtro(sock, bpf.programa_filtro_mac([mac_receptor, "FF:FF:FF:FF:FF:FF"]))
+            bpf.leer_estadisticas(sock)
+            proceso = multiprocessing.Process(target=_emisor_continuo,
+                                              args=(emisor, mac_receptor, args.segundos + 1, args.payload))
+            proceso.start()
+            time.sleep(0.5)
+            recibidos = _medir_recepcion(sock, backend, args.segundos)
+            _, perdidos = bpf.leer_estadisticas(sock)
+            proceso.join()
+            sock.close()
+            print(f"{backend:>10} {recibidos / args.segundos:>12,.0f} {perdidos:>20,}")
+
+
+@benchmark("rx-drenado")
+def bench_rx_drenado(args):
+    """Frames/s al drenar una cola de recepción llena: recvfrom(65535) frente a lotes con recv_into (root)"""
+    from src.core.recepcion_lotes import ReceptorLotes
+
+    so_rcvbufforce = getattr(socket, 'SO_RCVBUFFORCE', 33)
+    cantidad = 20_000
+    frame = b"\xff" * 6 + bytes(6) + b"\x88\xb5" + bytes(args.payload + 13 + 4)  # Resto de la cabecera de Link-Chat + CRC
+    with par_veth() as (emisor, receptor):
+        envio = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        envio.bind((emisor, 0))
+        print(f"{'backend':>10} {'frames/s':>12} {'recv/frame':>11} {'poll/frame':>11}")
+        for backend in ("recvfrom", "lotes"):
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x88B5))
+            sock.setsockopt(socket.SOL_SOCKET, so_rcvbufforce, 256 << 20)
+            sock.bind((receptor, 0))
+            for _ in range(cantidad):
+                envio.send(frame)
+            recibidos = 0
+            inicio = time.perf_counter()
+            if backend == "lotes":
+                lotes = ReceptorLotes(sock)
+                while recibidos < cantidad and lotes.esperar(timeout=0.5):
+                    while True:
+                        recibidos += len(lotes.recibir_lote())
+                        if lotes.agotado:
+                            break
+                estado = lotes.estado()
+                recv_frame, poll_frame = estado['recepcion_recv_por_frame'], estado['recepcion_poll_por_frame']
+            else:
+                # Con timeout, CPython hace poll() antes de cada recvfrom
+                sock.settimeout(0.5)
+                while recibidos < cantidad:
+                    sock.recvfrom(65535)
+                    recibidos += 1
+                recv_frame, poll_frame = 1.0, 1.0
+            duracion = time.perf_counter() - inicio
+            sock.close()
+            print(f"{backend:>10} {recibidos / duracion:>12,.0f} {recv_frame:>11.3f} {poll_frame:>11.3f}")
+        envio.close()
+
+
+def _contador_tx(interfaz):
+    with open(f"/sys/class/net/{interfaz}/statistics/tx_packets") as f:
+        return int(f.read())
+
+
+@benchmark("tx")
+def bench_tx(args):
+    """Frames/s transmitidos con send() por frame frente a PACKET_TX_RING sobre un par veth (root)"""
+    from src.core.packet_mmap import AnilloTransmision
+
+    with par_veth() as (emisor, receptor):
+        frame = b"\xff" * 6 + bytes(6) + b"\x88\xb5" + bytes(args.payload)
+        total = int(200_000 * args.segundos)
+        print(f"{'backend':>10} {'frames/s':>12}")
+        for backend in ("send", "ring"):
+            antes = _contador_tx(emisor)
+            inicio = time.perf_counter()
+            if backend == "ring":
+                anillo = AnilloTransmision(emisor)
+                anillo.encolar_lote(frame for _ in range(total))
+                anillo.vaciar()
+                anillo.cerrar()
+            else:
+                sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+                sock.bind((emisor, 0))
+                for _ in range(total):
+                    sock.send(frame)
+                sock.close()
+            duracion = time.perf_counter() - inicio
+            enviados = _contador_tx(emisor) - antes
+            print(f"{backend:>10} {enviados / duracion:>12,.0f}")
+
+
+@benchmark("pacing")
+def bench_pacing(args):
+    """Caudal logrado por el Pacer frente a la tasa pedida y al sleep(1 ms) anterior"""
+    from src.core.pacing import Pacer
+
+    tamaño = 1506  # Frame completo con PAYLOAD_MAXIMO
+    print(f"{'configuración':>28} {'frames/s':>12} {'MB/s':>10}")
+
+    n = int(1000 * args.segundos)
+    inicio = time.perf_counter()
+    for _ in range(n):
+        time.sleep(0.001)
+    duracion = time.perf_counter() - inicio
+    print(f"{'sleep(0.001) por frame':>28} {n / duracion:>12,.0f} {n * tamaño / duracion / 1e6:>10.1f}")
+
+    for bytes_s in (10e6, 50e6, 100e6):
+        pacer = Pacer(bytes_por_segundo=bytes_s, frames_por_segundo=None)
+        n = int(bytes_s * args.segundos / tamaño)
+        inicio = time.perf_counter()
+        for _ in range(n):
+            pacer.esperar(tamaño)
+        duracion = time.perf_counter() - inicio
+        etiqueta = f"fijo {bytes_s / 1e6:.0f} MB/s"
+        print(f"{etiqueta:>28} {n / duracion:>12,.0f} {n * tamaño / duracion / 1e6:>10.1f}")
+
+
+@benchmark("pacing-auto")
+def bench_pacing_auto(args):
+    """Tasa del Pacer en modo auto durante transferencias fiables, con pérdidas en el tercio central"""
+    import random
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    datos = os.urandom(8 * 1024 * 1024)
+    aleatorio = random.Random(1)
+    directorio = tempfile.mkdtemp(prefix="linkchat_pacing_")
+    inicio = time.perf_counter()
+    ventana_perdidas = (args.segundos / 3, 2 * args.segundos / 3)
+
+    def con_perdidas():
+        return ventana_perdidas[0] <= time.perf_counter() - inicio < ventana_perdidas[1]
+
+    def enlace_con_perdidas(com):
+        procesar = com._procesar_frame_recibido
+
+        def recibir(frame):
+            if not con_perdidas() or aleatorio.random() >= 0.02:
+                procesar(frame)
+        com._procesar_frame_recibido = recibir
+
+    try:
+        with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+            configurar_logging("WARNING", salida=devnull)
+            emisor = Envio_recibo_frames(interfaz_a)
+            receptor = Envio_recibo_frames(interfaz_b)
+            receptor.fragment_manager.directorio_temporal = directorio
+            emisor.configurar_pacing("auto")
+            for com in (emisor, receptor):
+                _ampliar_rcvbuf(com.mi_socket)
+                enlace_con_perdidas(com)
+            hilos = [threading.Thread(target=com.receive_thread, args=(threading.Event(),))
+                     for com in (emisor, receptor)]
+            for hilo in hilos:
+                hilo.start()
+
+            fin = threading.Event()
+            completados = []
+
+            def enviar():
+                while not fin.is_set():
+                    try:
+                        emisor.enviar_fiable(receptor.mac_ori, Tipo_Mensaje.archivo, datos)
+                        receptor.cola_mensajes.get(timeout=1)
+                        completados.append(time.perf_counter() - inicio)
+                    except Exception:
+                        return
+                    for nombre in os.listdir(directorio):
+                        os.remove(os.path.join(directorio, nombre))
+
+            print(f"{'t (s)':>6} {'pérdida':>8} {'tasa MB/s':>10} {'recortes':>9} {'retx':>7}")
+            inicio = time.perf_counter()
+            hilo_envio = threading.Thread(target=enviar)
+            hilo_envio.start()
+            while time.perf_counter() - inicio < args.segundos:
+                time.sleep(args.segundos / 24)
+                estado = emisor.pacer.estado()
+                print(f"{time.perf_counter() - inicio:>6.2f} {'2%' if con_perdidas() else '0%':>8} "
+                      f"{estado['pacing_bytes_por_segundo'] / 1e6:>10.1f} {estado['pacing_recortes']:>9} "
+                      f"{emisor.fiable.retransmisiones:>7}")
+            fin.set()
+            hilo_envio.join()
+            for com in (emisor, receptor):
+                com.stop()
+            for hilo in hilos:
+                hilo.join()
+            print(f"Transferencias de 8 MB completadas: {len(completados)}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+        configurar_logging()
+
+
+def _codificar_anterior(destino, origen, tipo, id_mensaje, fragmento, total, payload):
+    """Codificación anterior: fromhex sobre las MACs en texto, to_bytes y concatenación"""
+    import binascii
+    frame = (bytes.fromhex(destino.replace(":", "")) + bytes.fromhex(origen.replace(":", "")) + b"\x88\xb5" +
+             tipo.to_bytes(1, 'big') + id_mensaje.to_bytes(2, 'big') + fragmento.to_bytes(4, 'big') +
+             total.to_bytes(4, 'big') + len(payload).to_bytes(2, 'big') + payload)
+    return frame + (binascii.crc32(frame) & 0xffffffff).to_bytes(4, 'big')
+
+
+def _decodificar_anterior(data):
+    """Decodificación anterior: MACs a texto con join y campos con int.from_bytes"""
+    from src.core.frames import Tipo_Mensaje
+    campos = {}
+    campos['mac_destino'] = ':'.join(f'{b:02x}' for b in data[0:6])
+    campos['mac_origen'] = ':'.join(f'{b:02x}' for b in data[6:12])
+    if data[12:14] != b"\x88\xb5":
+        raise ValueError("EtherType incorrecto")
+    campos['tipo_mensaje'] = Tipo_Mensaje.from_value(data[14])
+    campos['id_mensaje'] = int.from_bytes(data[15:17], 'big')
+    campos['fragmento'] = int.from_bytes(data[17:21], 'big')
+    campos['total_fragmentos'] = int.from_bytes(data[21:25], 'big')
+    longitud = int.from_bytes(data[25:27], 'big')
+    campos['datos'] = data[27:27 + longitud]
+    return campos
+
+
+@benchmark("codec")
+def bench_codec(args):
+    """Frames/s codificados y decodificados: struct precompilado frente a la implementación anterior, y cabecera v1 frente a v2"""
+    from src.core.codec import codificar, mac_a_bytes
+    from src.core.frames import Frame
+
+    destino, origen = "02:00:00:00:00:02", "02:00:00:00:00:01"
+    payload = os.urandom(args.payload)
+    n = 200_000
+
+    def medir(funcion):
+        inicio = time.perf_counter()
+        funcion()
+        return n / (time.perf_counter() - inicio)
+
+    def codificar_anterior():
+        for i in range(n):
+            _codificar_anterior(destino, origen, 2, 7, i, n, payload)
+
+    def codificar_struct():
+        dst, org = mac_a_bytes(destino), mac_a_bytes(origen)
+        for i in range(n):
+            codificar(dst, org, 2, 7, i, n, payload)
+
+    frame = codificar(mac_a_bytes(destino), mac_a_bytes(origen), 2, 7, 1, n, payload)
+
+    def decodificar_anterior():
+        for _ in range(n):
+            _decodificar_anterior(frame)
+
+    def decodificar_struct():
+        for _ in range(n):
+            Frame.desde_bytes(frame)
+
+    print(f"{'operación':>14} {'anterior frames/s':>18} {'struct frames/s':>16} {'factor':>8}")
+    for nombre, anterior, nuevo in (("codificar", codificar_anterior, codificar_struct),
+                                    ("decodificar", decodificar_anterior, decodificar_struct)):
+        tasa_anterior, tasa_nueva = medir(anterior), medir(nuevo)
+        print(f"{nombre:>14} {tasa_anterior:>18,.0f} {tasa_nueva:>16,.0f} {tasa_nueva / tasa_anterior:>7.1f}x")
+
+    # Cabecera v2 (id de 32 bits) frente a v1 con la implementación actual
+    frame_v2 = codificar(mac_a_bytes(destino), mac_a_bytes(origen), 2, 1 << 20, 1, n, payload)
+
+    def codificar_v2():
+        dst, org = mac_a_bytes(destino), mac_a_bytes(origen)
+        for i in range(n):
+            codificar(dst, org, 2, 1 << 20, i, n, payload)
+
+    def decodificar_v2():
+        for _ in range(n):
+            Frame.desde_bytes(frame_v2)
+
+    print(f"\n{'operación':>14} {'v1 frames/s':>18} {'v2 frames/s':>16} {'factor':>8}")
+    for nombre, v1, v2 in (("codificar", codificar_struct, codificar_v2),
+                           ("decodificar", decodificar_struct, decodificar_v2)):
+        tasa_v1, tasa_v2 = medir(v1), medir(v2)
+        print(f"{nombre:>14} {tasa_v1:>18,.0f} {tasa_v2:>16,.0f} {tasa_v2 / tasa_v1:>7.2f}x")
+
+
+def _receptor_sin_socket(mac="02:00:00:00:00:02"):
+    """Envio_recibo_frames sin socket: solo el estado que usa la ruta de recepción"""
+    import queue
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.fiable import ControlFiable
+    from src.core.fragmentation import FragmentManager
+
+    receptor = object.__new__(Envio_recibo_frames)
+    receptor.mac_ori = mac
+    receptor.grupos_multicast = set()
+    receptor.destinos_aceptados = frozenset({bytes.fromhex(mac.replace(":", "")), b"\xff" * 6})
+    receptor.frames_recibidos_total = 0
+    receptor.bytes_payload_recibidos = 0
+    receptor.bytes_payload_copiados = 0
+    receptor.frames_crc_incorrecto = 0
+    receptor.frames_crc_omitidos = 0
+    receptor.pares_v2 = set()
+    receptor.version_cabecera = None
+    receptor.pares_agrupacion = set()
+    receptor.mtu = 1500
+    receptor.mtu_pares = {}
+    receptor.cola_mensajes = queue.Queue()
+    receptor.fragment_manager = FragmentManager()
+    receptor.fiable = ControlFiable(receptor)
+    return receptor
+
+
+@benchmark("logging")
+def bench_logging(args):
+    """Frames/s en la ruta de recepción con logging por frame desactivado y activo"""
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging, TRAZA
+
+    emisor = object.__new__(Envio_recibo_frames)
+    emisor.mac_ori = "02:00:00:00:00:01"
+    emisor.ids_mensaje = itertools.count()
+    emisor.pares_v2 = set()
+    emisor.version_cabecera = None
+    emisor.mtu = 1500
+    emisor.mtu_pares = {}
+    emisor.fec = None
+    total = 2000
+    datos = os.urandom(total * args.payload)
+    trozos = (datos[i:i + args.payload] for i in range(0, len(datos), args.payload))
+    frames = list(emisor.crear_frames_stream("02:00:00:00:00:02", Tipo_Mensaje.archivo, trozos, len(datos),
+                                             tamaño_fragmento=args.payload))
+
+    print(f"{'configuración':>28} {'frames/s':>12}")
+    with open(os.devnull, "w") as devnull:
+        for etiqueta, nivel, limite in (("INFO (por frame desactivado)", "INFO", 20),
+                                        ("TRAZA, 20/s por mensaje", TRAZA, 20),
+                                        ("TRAZA sin límite", TRAZA, 0)):
+            configurar_logging(nivel, max_trazas_por_segundo=limite, salida=devnull)
+            procesados = 0
+            inicio = time.perf_counter()
+            while time.perf_counter() - inicio < args.segundos:
+                receptor = _receptor_sin_socket()
+                for frame in frames:
+                    receptor._procesar_frame_recibido(frame)
+                procesados += len(frames)
+            duracion = time.perf_counter() - inicio
+            print(f"{etiqueta:>28} {procesados / duracion:>12,.0f}")
+    configurar_logging()
+
+
+@benchmark("copias")
+def bench_copias(args):
+    """Copias por byte de payload y frames/s en la ruta de recepción (memoria, disco, frame único)"""
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    emisor = object.__new__(Envio_recibo_frames)
+    emisor.mac_ori = "02:00:00:00:00:01"
+    emisor.ids_mensaje = itertools.count()
+    emisor.pares_v2 = set()
+    emisor.version_cabecera = None
+    emisor.mtu = 1500
+    emisor.mtu_pares = {}
+    emisor.fec = None
+    print(f"{'caso':>22} {'frames/s':>12} {'copias/byte':>12}")
+    with tempfile.TemporaryDirectory() as directorio, open(os.devnull, "w") as devnull:
+        configurar_logging("INFO", salida=devnull)
+        for caso, total, umbral in (("fragmentado en memoria", 2000, 1 << 40),
+                                    ("fragmentado en disco", 2000, 0),
+                                    ("frames únicos", 1, 1 << 40)):
+            datos = b"FILE_TRANSFER:bench.bin:0:" + os.urandom(total * args.payload - 26)
+            trozos = (datos[i:i + args.payload] for i in range(0, len(datos), args.payload))
+            frames = list(emisor.crear_frames_stream("02:00:00:00:00:02", Tipo_Mensaje.archivo, trozos, len(datos),
+                                             tamaño_fragmento=args.payload))
+            frames *= 2000 // len(frames)
+            receptor = _receptor_sin_socket()
+            receptor.fragment_manager.umbral_disco = umbral
+            receptor.fragment_manager.directorio_temporal = directorio
+            procesados = 0
+            inicio = time.perf_counter()
+            while time.perf_counter() - inicio < args.segundos:
+                for frame in frames:
+                    # Como en el bucle de recepción: una vista sobre el buffer del socket
+                    receptor._procesar_frame_recibido(memoryview(frame))
+                procesados += len(frames)
+                while not receptor.cola_mensajes.empty():
+                    mensaje = receptor.cola_mensajes.get().datos
+                    if hasattr(mensaje, 'eliminar'):
+                        mensaje.eliminar()
+            duracion = time.perf_counter() - inicio
+            print(f"{caso:>22} {procesados / duracion:>12,.0f} {receptor.copias_por_byte():>12.2f}")
+    configurar_logging()
+
+
+@benchmark("crc")
+def bench_crc(args):
+    """Coste de validar el CRC por frame (copia + bytes frente a vista) y recepción con y sin cabecera de integridad"""
+    import binascii
+    import io
+    from src.core.codec import codificar, crc_correcto
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import PAYLOAD_MAXIMO, Tipo_Mensaje
+    from src.core.integridad import cabecera_integridad
+    from src.core.registro import configurar_logging
+
+    frame = codificar(b"\x02" * 6, b"\x04" * 6, 2, 1, 5, 100, os.urandom(args.payload))
+    frames_por_segundo = 1e9 / 8 / (len(frame) + 14 + 4 + 20)  # 1 Gbit/s con cabecera, FCS, preámbulo e IFG
+    repeticiones = 100_000
+
+    def anterior(datos):
+        # Método anterior: CRC del frame sin los 4 últimos bytes (una copia si son bytes) y comparación de bytes
+        return (binascii.crc32(datos[:-4]) & 0xffffffff).to_bytes(4, 'big') == bytes(datos[-4:])
+
+    print(f"{'método':>22} {'entrada':>11} {'ns/frame':>9} {'núcleo a 1 Gbit/s':>18}")
+    for (nombre, comprobar), entrada in itertools.product(
+            (("copia + bytes", anterior), ("vista (crc_correcto)", lambda datos: crc_correcto(datos, args.payload))),
+            (frame, memoryview(frame))):
+        mejor = float("inf")
+        for _ in range(5):
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                comprobar(entrada)
+            mejor = min(mejor, time.perf_counter() - inicio)
+        ns = mejor * 1e9 / repeticiones
+        print(f"{nombre:>22} {type(entrada).__name__:>11} {ns:>9.0f} {ns * frames_por_segundo / 1e9:>18.1%}")
+
+    # Ruta de recepción completa: con cabecera de integridad el CRC de los fragmentos se omite
+    emisor = object.__new__(Envio_recibo_frames)
+    emisor.mac_ori = "02:00:00:00:00:01"
+    emisor.ids_mensaje = itertools.count()
+    emisor.pares_v2 = set()
+    emisor.version_cabecera = None
+    emisor.mtu = 1500
+    emisor.mtu_pares = {}
+    emisor.fec = None
+    contenido = os.urandom(2000 * PAYLOAD_MAXIMO - 100)
+    print(f"\n{'mensaje':>22} {'frames/s':>10} {'CRC omitidos':>13}")
+    with open(os.devnull, "w") as devnull:
+        configurar_logging("WARNING", salida=devnull)
+        cabecera = cabecera_integridad(b"", io.BytesIO(contenido), len(contenido))
+        for nombre, prefijo, omitir in (("sin cabecera", b"", True),
+                                        ("cabecera, CRC siempre", cabecera, False),
+                                        ("cabecera, CRC omitido", cabecera, True)):
+            datos = prefijo + contenido
+            trozos = (datos[i:i + PAYLOAD_MAXIMO] for i in range(0, len(datos), PAYLOAD_MAXIMO))
+            frames = list(emisor.crear_frames_stream("02:00:00:00:00:02", Tipo_Mensaje.archivo, trozos, len(datos),
+                                             tamaño_fragmento=args.payload))
+            receptor = _receptor_sin_socket()
+            if not omitir:
+                receptor.fragment_manager.cubierto_por_integridad = lambda *_: False
+            procesados = 0
+            inicio = time.perf_counter()
+            while time.perf_counter() - inicio < args.segundos:
+                for frame in frames:
+                    receptor._procesar_frame_recibido(memoryview(frame))
+                procesados += len(frames)
+                while not receptor.cola_mensajes.empty():
+                    receptor.cola_mensajes.get()
+            duracion = time.perf_counter() - inicio
+            print(f"{nombre:>22} {procesados / duracion:>10,.0f} {receptor.frames_crc_omitidos:>13,}")
+    configurar_logging()
+
+
+@benchmark("eventos")
+def bench_eventos(args):
+    """Despertares en reposo, latencia de parada y envío encolado del bucle de eventos frente al timeout de 1 s"""
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+
+    with par_veth() as (interfaz_a, interfaz_b):
+        # Bucle anterior: recvfrom con timeout de 1 s, stop_event comprobado en cada vuelta
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x88B5))
+        sock.bind((interfaz_b, 0))
+        sock.settimeout(1.0)
+        parar = threading.Event()
+        despertares = [0]
+
+        def bucle_anterior():
+            while not parar.is_set():
+                try:
+                    sock.recvfrom(65535)
+                except socket.timeout:
+                    pass
+                despertares[0] += 1
+
+        hilo = threading.Thread(target=bucle_anterior)
+        hilo.start()
+        # Medio periodo de desfase: parar en un instante arbitrario respecto al timeout
+        time.sleep(args.segundos + 0.5)
+        inicio = time.perf_counter()
+        parar.set()
+        hilo.join()
+        parada_anterior = time.perf_counter() - inicio
+        sock.close()
+        print(f"{'bucle':>22} {'despertares':>12} {'parada (ms)':>12}")
+        print(f"{'timeout 1 s':>22} {despertares[0]:>12} {parada_anterior * 1000:>12.1f}")
+
+        emisor = Envio_recibo_frames(interfaz_a)
+        receptor = Envio_recibo_frames(interfaz_b)
+        hilo = threading.Thread(target=receptor.receive_thread, args=(threading.Event(),))
+        hilo.start()
+        time.sleep(args.segundos + 0.5)
+        inicio = time.perf_counter()
+        receptor.stop()
+        hilo.join()
+        parada = time.perf_counter() - inicio
+        print(f"{'epoll + eventfd':>22} {receptor.bucle.despertares:>12} {parada * 1000:>12.1f}")
+
+        # Envío encolado en el hilo de E/S con el pacer (sin dormir entre frames)
+        emisor.configurar_pacing(bytes_por_segundo=50e6, frames_por_segundo=None)
+        hilo = threading.Thread(target=emisor.receive_thread, args=(threading.Event(),))
+        hilo.start()
+        payload = os.urandom(args.payload)
+        frames = [emisor.crear_frame("ff:ff:ff:ff:ff:ff", Tipo_Mensaje.texto, payload)[0]
+                  for _ in range(int(50e6 * args.segundos / (args.payload + 31)))]
+        terminado = threading.Event()
+        inicio = time.perf_counter()
+        emisor.enviar_en_segundo_plano(frames, lambda _: terminado.set())
+        terminado.wait()
+        duracion = time.perf_counter() - inicio
+        estado = emisor.bucle.estado()
+        emisor.stop()
+        hilo.join()
+        total = sum(len(frame) for frame in frames)
+        print(f"envío encolado a 50 MB/s: {total / duracion / 1e6:.1f} MB/s, "
+              f"{len(frames) / max(estado['bucle_despertares'], 1):.1f} frames/despertar")
+
+
+def _ampliar_rcvbuf(sock, tamaño=8 << 20):
+    """Emisor y receptor comparten CPU: sin margen, una ráfaga del pacer desborda el socket"""
+    sock.setsockopt(socket.SOL_SOCKET, getattr(socket, 'SO_RCVBUFFORCE', 33), tamaño)
+
+
+@benchmark("async")
+def bench_async(args):
+    """Transferencias concurrentes: LinkChatTransport en un hilo frente a un hilo por envío"""
+    import asyncio
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.registro import configurar_logging
+    from src.features.transporte_async import LinkChatTransport
+
+    concurrentes = 64
+    mensaje = "x" * 1_000_000  # 678 fragmentos por mensaje
+    tasa = 50e6
+
+    def esperar_mensajes(cola, total, limite):
+        recibidos = 0
+        while recibidos < total and time.monotonic() < limite:
+            try:
+                cola.get(timeout=0.1)
+                recibidos += 1
+            except Exception:
+                pass
+        return recibidos
+
+    async def con_asyncio(interfaz_a, interfaz_b):
+        async with LinkChatTransport(interfaz_a) as emisor, LinkChatTransport(interfaz_b) as receptor:
+            emisor.com.configurar_pacing(bytes_por_segundo=tasa, frames_por_segundo=None)
+            _ampliar_rcvbuf(receptor.com.mi_socket)
+
+            async def recibir():
+                recibidos = 0
+                async for _ in receptor:
+                    recibidos += 1
+                    if recibidos == concurrentes:
+                        break
+                return recibidos
+
+            tarea = asyncio.create_task(recibir())
+            await asyncio.gather(*(emisor.send_message(receptor.mac, mensaje) for _ in range(concurrentes)))
+            try:
+                return await asyncio.wait_for(tarea, 10)
+            except asyncio.TimeoutError:
+                return receptor.com.estadisticas['mensajes_recibidos']
+
+    def con_hilos(interfaz_a, interfaz_b):
+        emisor = Envio_recibo_frames(interfaz_a)
+        receptor = Envio_recibo_frames(interfaz_b)
+        emisor.configurar_pacing(bytes_por_segundo=tasa, frames_por_segundo=None)
+        _ampliar_rcvbuf(receptor.mi_socket)
+        hilo_rx = threading.Thread(target=receptor.receive_thread, args=(threading.Event(),))
+        hilo_rx.start()
+        hilos = [threading.Thread(target=emisor.enviar_frame, args=(emisor.crear_frame(receptor.mac_ori, 1, mensaje),))
+                 for _ in range(concurrentes)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        recibidos = esperar_mensajes(receptor.cola_mensajes, concurrentes, time.monotonic() + 10)
+        receptor.stop()
+        hilo_rx.join()
+        emisor.stop()
+        return recibidos
+
+    print(f"{concurrentes} mensajes de {len(mensaje)} bytes en paralelo, pacer a {tasa / 1e6:.0f} MB/s")
+    print(f"{'modelo':>22} {'recibidos':>10} {'s reales':>10} {'s de CPU':>10} {'hilos':>6}")
+    with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+        configurar_logging("WARNING", salida=devnull)
+        for modelo in ("hilo por envío", "asyncio"):
+            inicio, cpu = time.perf_counter(), time.process_time()
+            if modelo == "asyncio":
+                hilos = 1
+                recibidos = asyncio.run(con_asyncio(interfaz_a, interfaz_b))
+            else:
+                hilos = concurrentes + 2
+                recibidos = con_hilos(interfaz_a, interfaz_b)
+            duracion, cpu = time.perf_counter() - inicio, time.process_time() - cpu
+            print(f"{modelo:>22} {recibidos:>10} {duracion:>10.2f} {cpu:>10.2f} {hilos:>6}")
+    configurar_logging()
+
+
+@benchmark("fiable")
+def bench_fiable(args):
+    """Transferencia de 20 MB con pérdidas simuladas: envío normal frente a ventana deslizante con SACK (send y anillo TX)"""
+    import random
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    tamaño = 20 * 1024 * 1024
+    datos = os.urandom(tamaño)
+    aleatorio = random.Random(1)
+    directorio = tempfile.mkdtemp(prefix="linkchat_fiable_")
+
+    def enlace_con_perdidas(com, perdida):
+        # Se descarta al recibir, en ambos sentidos: datos, SACK y consultas
+        procesar = com._procesar_frame_recibido
+
+        def recibir(frame):
+            if aleatorio.random() >= perdida:
+                procesar(frame)
+        com._procesar_frame_recibido = recibir
+
+    print(f"{'pérdida':>8} {'modo':>8} {'envío':>6} {'completo':>9} {'s':>7} {'MB/s útiles':>12} {'bytes/útil':>11} "
+          f"{'retx':>7}")
+    try:
+        with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+            configurar_logging("WARNING", salida=devnull)
+            for perdida in (0.0, 0.001, 0.01, 0.05, 0.1):
+                # Con el anillo TX los SACK y consultas tienen que salir sin esperar a llenar un lote
+                for modo, backend in (("normal", "send"), ("fiable", "send"), ("fiable", "ring")):
+                    emisor = Envio_recibo_frames(interfaz_a, backend_envio=backend)
+                    receptor = Envio_recibo_frames(interfaz_b, backend_envio=backend)
+                    receptor.fragment_manager.directorio_temporal = directorio
+                    for com in (emisor, receptor):
+                        _ampliar_rcvbuf(com.mi_socket)
+                        com.configurar_pacing(bytes_por_segundo=50e6, frames_por_segundo=None)
+                        enlace_con_perdidas(com, perdida)
+                    hilos = [threading.Thread(target=com.receive_thread, args=(threading.Event(),))
+                             for com in (emisor, receptor)]
+                    for hilo in hilos:
+                        hilo.start()
+                    inicio = time.perf_counter()
+                    enviados = 0
+                    try:
+                        if modo == "fiable":
+                            enviados = emisor.enviar_fiable(receptor.mac_ori, Tipo_Mensaje.archivo, datos)
+                        else:
+                            enviados = emisor.enviar_frame(emisor.crear_frame(receptor.mac_ori,
+                                                                              Tipo_Mensaje.archivo, datos))
+                        completo = receptor.cola_mensajes.get(timeout=1) is not None
+                    except Exception:
+                        completo = False
+                    duracion = time.perf_counter() - inicio
+                    retransmisiones = emisor.fiable.retransmisiones
+                    for com in (emisor, receptor):
+                        com.stop()
+                    for hilo in hilos:
+                        hilo.join()
+                    util = tamaño / duracion / 1e6 if completo else 0.0
+                    print(f"{perdida:>8.1%} {modo:>8} {backend:>6} {'sí' if completo else 'no':>9} {duracion:>7.2f} "
+                          f"{util:>12.1f} {enviados / tamaño:>11.3f} {retransmisiones:>7}")
+                    # Los mensajes completos quedan en disco a nombre de quien los recibe
+                    for nombre in os.listdir(directorio):
+                        os.remove(os.path.join(directorio, nombre))
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+        configurar_logging()
+
+
+@benchmark("reanudar")
+def bench_reanudar(args):
+    """Transferencia fiable de 50 MB cortada a mitad: reenviar desde cero frente a reanudar desde el checkpoint"""
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.fiable import FuenteFragmentos, huella_contenido
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    tamaño = 50 * 1024 * 1024
+    fuente = FuenteFragmentos(b"BENCH:", datos=os.urandom(tamaño))
+    huella = huella_contenido(fuente)
+    directorio = tempfile.mkdtemp(prefix="linkchat_reanudar_")
+
+    def arrancar():
+        emisor = Envio_recibo_frames(interfaz_a)
+        receptor = Envio_recibo_frames(interfaz_b)
+        receptor.fragment_manager.directorio_temporal = directorio
+        for com in (emisor, receptor):
+            _ampliar_rcvbuf(com.mi_socket)
+            com.configurar_pacing(bytes_por_segundo=50e6, frames_por_segundo=None)
+        hilos = [threading.Thread(target=com.receive_thread, args=(threading.Event(),))
+                 for com in (emisor, receptor)]
+        for hilo in hilos:
+            hilo.start()
+        return emisor, receptor, hilos
+
+    def parar(emisor, receptor, hilos):
+        for com in (emisor, receptor):
+            com.stop()
+        for hilo in hilos:
+            hilo.join()
+
+    print(f"{'corte':>6} {'modo':>10} {'s tras corte':>13} {'bytes/útil':>11} {'completo':>9}")
+    try:
+        with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+            configurar_logging("WARNING", salida=devnull)
+            for corte in (0.25, 0.5, 0.75):
+                for modo in ("desde cero", "reanudar"):
+                    # Primer intento: se paran ambos extremos al confirmar `corte` del mensaje
+                    emisor, receptor, hilos = arrancar()
+
+                    def cortar(_, confirmados, total, __):
+                        if confirmados >= corte * total and not emisor.cerrado:
+                            receptor.stop()
+                            emisor.stop()
+                    try:
+                        emisor.enviar_fiable(receptor.mac_ori, Tipo_Mensaje.archivo, fuente, cortar, "bench",
+                                             huella=huella if modo == "reanudar" else None)
+                    except (OSError, TimeoutError):
+                        pass
+                    parar(emisor, receptor, hilos)
+
+                    # Segundo intento con procesos nuevos: solo sobrevive lo guardado en disco
+                    emisor, receptor, hilos = arrancar()
+                    inicio = time.perf_counter()
+                    enviados = emisor.enviar_fiable(receptor.mac_ori, Tipo_Mensaje.archivo, fuente,
+                                                    huella=huella if modo == "reanudar" else None)
+                    mensaje = receptor.cola_mensajes.get(timeout=2)
+                    duracion = time.perf_counter() - inicio
+                    parar(emisor, receptor, hilos)
+                    completo = mensaje is not None and len(mensaje.datos) == fuente.longitud
+                    print(f"{corte:>6.0%} {modo:>10} {duracion:>13.2f} {enviados / tamaño:>11.3f} "
+                          f"{'sí' if completo else 'no':>9}")
+                    for nombre in os.listdir(directorio):
+                        os.remove(os.path.join(directorio, nombre))
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+        configurar_logging()
+
+
+@benchmark("fec")
+def bench_fec(args):
+    """Broadcast de 5 MB con pérdidas: mensajes completos sin FEC y con XOR/Reed-Solomon, y coste de codificar"""
+    import random
+    import threading
+    from src.core import fec
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    # Coste de codificar y de recuperar (el peor caso: m pérdidas por grupo)
+    print(f"{'k+m':>6} {'codificar MB/s':>15} {'recuperar MB/s':>15}")
+    grupo = [os.urandom(1475) for _ in range(16)]
+    for m in (1, 2, 4):
+        repeticiones = 200
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            paridad = fec.paridad(grupo, m)
+        codificar_mb = repeticiones * len(grupo) * 1475 / (time.perf_counter() - inicio) / 1e6
+        presentes = {i: grupo[i] for i in range(m, len(grupo))}
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            fec.reconstruir(presentes, dict(enumerate(paridad)), list(range(m)), m, 1475)
+        recuperar_mb = repeticiones * len(grupo) * 1475 / (time.perf_counter() - inicio) / 1e6
+        print(f"{f'16+{m}':>6} {codificar_mb:>15.1f} {recuperar_mb:>15.1f}")
+    print()
+
+    tamaño = 5 * 1024 * 1024
+    datos = os.urandom(tamaño)
+    intentos = 5
+    aleatorio = random.Random(1)
+    print(f"{'pérdida':>8} {'fec':>6} {'completos':>10} {'bytes/útil':>11} {'reparados':>10}")
+    with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+        configurar_logging("WARNING", salida=devnull)
+        for perdida in (0.0, 0.005, 0.01, 0.02, 0.05):
+            for m in (0, 1, 2, 4):
+                completos = reparados = 0
+                enviados = 0
+                for _ in range(intentos):
+                    emisor = Envio_recibo_frames(interfaz_a)
+                    receptor = Envio_recibo_frames(interfaz_b)
+                    for com in (emisor, receptor):
+                        _ampliar_rcvbuf(com.mi_socket)
+                        com.configurar_pacing(bytes_por_segundo=50e6, frames_por_segundo=None)
+                    emisor.configurar_fec(16, m)
+                    procesar = receptor._procesar_frame_recibido
+                    receptor._procesar_frame_recibido = (
+                        lambda frame, procesar=procesar: aleatorio.random() < perdida or procesar(frame))
+                    hilo = threading.Thread(target=receptor.receive_thread, args=(threading.Event(),))
+                    hilo.start()
+                    enviados = emisor.enviar_frame(emisor.crear_frame("ff:ff:ff:ff:ff:ff", Tipo_Mensaje.archivo,
+                                                                      datos))
+                    try:
+                        receptor.cola_mensajes.get(timeout=0.5)
+                        completos += 1
+                    except Exception:
+                        pass
+                    reparados += receptor.fragment_manager.fragmentos_reparados
+                    receptor.stop()
+                    emisor.stop()
+                    hilo.join()
+                print(f"{perdida:>8.1%} {f'16+{m}' if m else 'no':>6} {f'{completos}/{intentos}':>10} "
+                      f"{enviados / tamaño:>11.3f} {reparados / intentos:>10.1f}")
+    configurar_logging()
+
+
+@benchmark("compresion")
+def bench_compresion(args):
+    """Archivos de 20 MB (CSV y aleatorio) con FileTransfer a 12.5 y 50 MB/s: sin compresión frente a zlib, lzma y bz2"""
+    import threading
+    import types
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.registro import configurar_logging
+    from src.features.files import FileTransfer
+
+    tamaño = 20 * 1024 * 1024
+    directorio = tempfile.mkdtemp(prefix="linkchat_compresion_")
+    anterior = os.getcwd()
+    filas = b"".join(b"%d,2025-03-%02d 12:%02d:%02d,sensor-%d,%.3f,OK\n" % (i, i % 28 + 1, i % 60, i % 59, i % 97,
+                                                                            i * 0.37) for i in range(200_000))
+    contenidos = {
+        "csv": (filas * (tamaño // len(filas) + 1))[:tamaño],
+        "aleatorio": os.urandom(tamaño),
+    }
+    print(f"{'enlace':>10} {'datos':>10} {'códec':>6} {'s':>7} {'MB/s útiles':>12} {'en el cable':>12}")
+    try:
+        os.chdir(directorio)  # FileTransfer guarda en ./downloads
+        with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+            configurar_logging("WARNING", salida=devnull)
+            for tasa, (nombre, contenido), codec in itertools.product(
+                    (12.5e6, 50e6), contenidos.items(), (None, "zlib", "lzma", "bz2")):
+                    ruta = os.path.join(directorio, f"{nombre}.dat")
+                    if not os.path.exists(ruta):
+                        with open(ruta, "wb") as f:
+                            f.write(contenido)
+                    emisor = Envio_recibo_frames(interfaz_a)
+                    receptor = Envio_recibo_frames(interfaz_b)
+                    for com in (emisor, receptor):
+                        _ampliar_rcvbuf(com.mi_socket)
+                        com.configurar_pacing(bytes_por_segundo=tasa, frames_por_segundo=None)
+                    app_emisor = types.SimpleNamespace(com=emisor, mostrar_progreso_envio=lambda *_: None)
+                    app_receptor = types.SimpleNamespace(com=receptor, mostrar_mensaje=lambda *_: None)
+                    envio = FileTransfer(app_emisor)
+                    envio.configurar_compresion(codec)
+                    hilo = threading.Thread(target=receptor.receive_thread, args=(threading.Event(),))
+                    hilo.start()
+                    inicio = time.perf_counter()
+                    envio.send_file(ruta, receptor.mac_ori)
+                    mensaje = receptor.cola_mensajes.get(timeout=30)
+                    FileTransfer(app_receptor).receive_file(mensaje.datos, emisor.mac_ori)
+                    duracion = time.perf_counter() - inicio
+                    enviados = emisor.estadisticas['fragmentos_enviados']
+                    receptor.stop()
+                    emisor.stop()
+                    hilo.join()
+                    recibido = os.path.join("downloads", f"{nombre}.dat")
+                    with open(recibido, "rb") as f:
+                        correcto = f.read() == contenido
+                    os.remove(recibido)
+                    print(f"{f'{tasa / 1e6:g} MB/s':>10} {nombre:>10} {codec or 'no':>6} {duracion:>7.2f} "
+                          f"{tamaño / duracion / 1e6 if correcto else 0.0:>12.1f} {enviados * 1475 / tamaño:>11.1%}")
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(directorio, ignore_errors=True)
+        configurar_logging()
+
+
+@benchmark("paralelo")
+def bench_paralelo(args):
+    """Compresión y huella por trozos en el pool, y carpeta comprimida con y sin adelantar el siguiente archivo"""
+    import threading
+    import types
+    from src.core.compresion import CompresorTrozos
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.fiable import FuenteFragmentos, huella_contenido
+    from src.core.frames import Tipo_Mensaje
+    from src.core.paralelo import trabajadores_por_defecto
+    from src.core.registro import configurar_logging
+    from src.features.files import FileTransfer
+    from src.features.folder_transfer import FolderTransfer
+
+    filas = b"".join(b"%d,2025-03-%02d 12:%02d:%02d,sensor-%d,%.3f,OK\n" % (i, i % 28 + 1, i % 60, i % 59, i % 97,
+                                                                            i * 0.37) for i in range(200_000))
+    directorio = tempfile.mkdtemp(prefix="linkchat_paralelo_")
+    anterior = os.getcwd()
+    try:
+        tamaño = 64 * 1024 * 1024
+        ruta = os.path.join(directorio, "grande.csv")
+        with open(ruta, "wb") as f:
+            f.write((filas * (tamaño // len(filas) + 1))[:tamaño])
+        print(f"Núcleos disponibles: {trabajadores_por_defecto()}")
+        for trabajadores in (1, 2, 4):
+            compresor = CompresorTrozos("zlib", trabajadores=trabajadores)
+            inicio = time.perf_counter()
+            temporal, _, _ = compresor.comprimir_a_temporal(ruta)
+            duracion = time.perf_counter() - inicio
+            temporal.close()
+            print(f"  zlib, {trabajadores} trabajador(es): {tamaño / duracion / 1e6:7.1f} MB/s")
+        with open(ruta, "rb") as f:
+            inicio = time.perf_counter()
+            huella_contenido(FuenteFragmentos(b"", archivo=f))
+            print(f"  huella BLAKE2b:           {tamaño / (time.perf_counter() - inicio) / 1e6:7.1f} MB/s")
+        os.remove(ruta)
+
+        carpeta = os.path.join(directorio, "carpeta")
+        os.mkdir(carpeta)
+        archivos = 16
+        contenidos = {}
+        for i in range(archivos):
+            contenido = (filas[i * 1000:] + filas[:i * 1000])[:8 << 20]
+            contenidos[f"f{i:02}.csv"] = contenido
+            with open(os.path.join(carpeta, f"f{i:02}.csv"), "wb") as f:
+                f.write(contenido)
+        print(f"\nCarpeta de {archivos} CSV ({sum(map(len, contenidos.values())) / 1e6:.0f} MB) a 12.5 MB/s:")
+        os.chdir(directorio)  # FileTransfer y FolderTransfer usan ./downloads
+        with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+            configurar_logging("WARNING", salida=devnull)
+            for etiqueta, codec, adelantar in (("sin compresión", None, False),
+                                               ("zlib en serie", "zlib", False),
+                                               ("zlib adelantando", "zlib", True)):
+                emisor = Envio_recibo_frames(interfaz_a)
+                receptor = Envio_recibo_frames(interfaz_b)
+                for com in (emisor, receptor):
+                    _ampliar_rcvbuf(com.mi_socket)
+                    com.configurar_pacing(bytes_por_segundo=12.5e6, frames_por_segundo=None)
+                app_emisor = types.SimpleNamespace(com=emisor, mostrar_progreso_envio=lambda *_: None)
+                app_emisor.file_transfer = FileTransfer(app_emisor)
+                app_emisor.file_transfer.configurar_compresion(codec)
+                carpetas = FolderTransfer(app_emisor)
+                carpetas.adelantar_preparacion = adelantar
+                app_receptor = types.SimpleNamespace(com=receptor, mostrar_mensaje=lambda *_: None)
+                hilo = threading.Thread(target=receptor.receive_thread, args=(threading.Event(),))
+                hilo.start()
+                inicio = time.perf_counter()
+                exito, _ = carpetas.send_folder(carpeta, receptor.mac_ori)
+                recibidos = []
+                while exito and len(recibidos) < archivos:
+                    mensaje = receptor.cola_mensajes.get(timeout=30)
+                    if Tipo_Mensaje.from_value(mensaje.tipo_mensaje) is Tipo_Mensaje.archivo:
+                        recibidos.append(mensaje)
+                duracion = time.perf_counter() - inicio
+                receptor.stop()
+                emisor.stop()
+                hilo.join()
+                correctos = 0
+                recepcion = FileTransfer(app_receptor)
+                for mensaje in recibidos:
+                    recepcion.receive_file(mensaje.datos, emisor.mac_ori)
+                for nombre, contenido in contenidos.items():
+                    recibido = os.path.join("downloads", nombre)
+                    if os.path.exists(recibido):
+                        with open(recibido, "rb") as f:
+                            correctos += f.read() == contenido
+                        os.remove(recibido)
+                print(f"  {etiqueta:<18} {duracion:6.2f} s  ({correctos}/{archivos} archivos correctos)")
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(directorio, ignore_errors=True)
+        configurar_logging()
+
+
+@benchmark("integridad")
+def bench_integridad(args):
+    """Coste de la cabecera de integridad al enviar y al reensamblar, y recuperación de un trozo corrupto"""
+    import io
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.fiable import FuenteFragmentos
+    from src.core.fragmentation import FragmentManager
+    from src.core.frames import PAYLOAD_MAXIMO, Tipo_Mensaje
+    from src.core.integridad import cabecera_integridad
+    from src.core.registro import configurar_logging
+
+    tamaño = 20 * 1024 * 1024
+    contenido = os.urandom(tamaño)
+    prefijo = b"FILE_TRANSFER:bench.bin:%d:" % tamaño
+    for algoritmo in ("blake2b", "sha256"):
+        inicio = time.perf_counter()
+        cabecera_integridad(prefijo, io.BytesIO(contenido), tamaño, algoritmo)
+        print(f"Cabecera {algoritmo:<8} (emisor): {tamaño / (time.perf_counter() - inicio) / 1e6:7.1f} MB/s")
+
+    directorio = tempfile.mkdtemp(prefix="linkchat_integridad_")
+    print(f"\n{'reensamblado':>14} {'cabecera':>9} {'MB/s':>8} {'trozos verificados':>19}")
+    try:
+        with open(os.devnull, "w") as devnull:
+            configurar_logging("WARNING", salida=devnull)
+            for (destino, umbral), con_cabecera in itertools.product(
+                    (("en memoria", 1 << 40), ("en disco", 0)), (False, True)):
+                mensaje = prefijo + contenido
+                if con_cabecera:
+                    mensaje = cabecera_integridad(prefijo, io.BytesIO(contenido), tamaño) + mensaje
+                total = -(-len(mensaje) // PAYLOAD_MAXIMO)
+                fragmentos = [memoryview(mensaje)[i * PAYLOAD_MAXIMO:(i + 1) * PAYLOAD_MAXIMO] for i in range(total)]
+                gestor = FragmentManager(umbral_disco=umbral, directorio_temporal=directorio)
+                inicio = time.perf_counter()
+                for numero, fragmento in enumerate(fragmentos):
+                    completo = gestor.agregar_fragmento(1, numero, total, fragmento, "02:00:00:00:00:01")
+                duracion = time.perf_counter() - inicio
+                if hasattr(completo, 'eliminar'):
+                    completo.eliminar()
+                print(f"{destino:>14} {'sí' if con_cabecera else 'no':>9} {tamaño / duracion / 1e6:>8.1f} "
+                      f"{gestor.trozos_verificados:>19}")
+
+            # Envío fiable con un fragmento corrompido (una vez) en el receptor
+            ruta = os.path.join(directorio, "bench.bin")
+            with open(ruta, "wb") as f:
+                f.write(contenido)
+            cabecera = cabecera_integridad(prefijo, io.BytesIO(contenido), tamaño)
+            print(f"\n{'fiable 50 MB/s':>14} {'s':>7} {'retransmitidos':>15} {'corruptos':>10} {'correcto':>9}")
+            with par_veth() as (interfaz_a, interfaz_b):
+                for corromper in (None, 5000):
+                    emisor = Envio_recibo_frames(interfaz_a)
+                    receptor = Envio_recibo_frames(interfaz_b)
+                    for com in (emisor, receptor):
+                        _ampliar_rcvbuf(com.mi_socket)
+                        com.configurar_pacing(bytes_por_segundo=50e6, frames_por_segundo=None)
+                    pendiente = [corromper]
+                    procesar = receptor._procesar_frame_recibido
+
+                    def alterar(frame, procesar=procesar, pendiente=pendiente):
+                        # Cabecera Ethernet (14) + tipo (1) + id (2): el número de fragmento va en el byte 17
+                        if pendiente[0] is not None and len(frame) > 100 and \
+                                int.from_bytes(frame[17:21], 'big') == pendiente[0]:
+                            pendiente[0] = None
+                            frame = bytearray(frame)
+                            frame[100] ^= 1
+                        procesar(frame)
+                    receptor._procesar_frame_recibido = alterar
+                    hilos = [threading.Thread(target=com.receive_thread, args=(threading.Event(),))
+                             for com in (emisor, receptor)]
+                    for hilo in hilos:
+                        hilo.start()
+                    with open(ruta, "rb") as archivo:
+                        inicio = time.perf_counter()
+                        emisor.enviar_fiable(receptor.mac_ori, Tipo_Mensaje.archivo,
+                                             FuenteFragmentos(cabecera + prefijo, archivo=archivo))
+                        duracion = time.perf_counter() - inicio
+                    recibido = receptor.cola_mensajes.get(timeout=10).datos
+                    correcto = recibido.leer() == prefijo + contenido
+                    recibido.eliminar()
+                    estadisticas = emisor.obtener_estadisticas()
+                    corruptos = receptor.fragment_manager.trozos_corruptos
+                    receptor.stop()
+                    emisor.stop()
+                    for hilo in hilos:
+                        hilo.join()
+                    print(f"{'corrupto' if corromper is not None else 'limpio':>14} {duracion:>7.2f} "
+                          f"{estadisticas['fiable_retransmisiones']:>15} {corruptos:>10} {str(correcto):>9}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+        configurar_logging()
+
+
+@benchmark("planificador")
+def bench_planificador(args):
+    """Tiempo hasta completar un mensaje y un archivo pequeño enviados durante una transferencia masiva (root)"""
+    import threading
+    from src.core.codec import codificar
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    tasa = 100e6
+    destino = "02:00:00:00:00:02"
+    print(f"{'modo':>16} {'chat ms':>9} {'archivo ms':>11} {'masivo MB/s':>12}")
+    with par_veth() as (interfaz, _), open(os.devnull, "w") as devnull:
+        configurar_logging("WARNING", salida=devnull)
+        for modo in ("fifo", "sin planificador", "drr"):
+            emisor = Envio_recibo_frames(interfaz)
+            emisor.configurar_pacing(bytes_por_segundo=tasa, frames_por_segundo=None)
+            origen = bytes.fromhex(emisor.mac_ori.replace(":", ""))
+            grande = codificar(bytes.fromhex(destino.replace(":", "")), origen, Tipo_Mensaje.archivo.value, 1, 0, 2,
+                               bytes(args.payload))
+            total_masivo = int(tasa * args.segundos / len(grande))
+            chat = emisor.crear_frame(destino, Tipo_Mensaje.texto, "hola")
+            archivo = emisor.crear_frame(destino, Tipo_Mensaje.archivo, os.urandom(200_000))
+            turno_fifo = threading.Lock()
+
+            def enviar(frames, **opciones):
+                if modo == "drr":
+                    return emisor.enviar_frame(frames, **opciones)
+                if modo == "fifo":
+                    # Una transferencia detrás de otra, como la antigua cola de envío
+                    with turno_fifo:
+                        return emisor.enviar_frame(frames, **opciones)
+                # Bucle anterior: cada hilo envía lo suyo compitiendo solo por el pacer
+                enviados = 0
+                for frame in frames:
+                    emisor.pacer.esperar(len(frame))
+                    enviados += emisor._transmitir(frame)
+                return enviados
+
+            tiempos = {}
+
+            def medir(nombre, frames, **opciones):
+                inicio = time.perf_counter()
+                enviar(frames, **opciones)
+                tiempos[nombre] = time.perf_counter() - inicio
+
+            masivo = threading.Thread(target=medir, args=("masivo", (grande for _ in range(total_masivo))),
+                                      kwargs={'total_frames': total_masivo})
+            masivo.start()
+            time.sleep(args.segundos / 10)
+            pequeños = [threading.Thread(target=medir, args=("chat", chat), kwargs={'contar_como_mensaje_usuario': True}),
+                        threading.Thread(target=medir, args=("archivo", archivo))]
+            for hilo in pequeños:
+                hilo.start()
+            for hilo in pequeños + [masivo]:
+                hilo.join()
+            emisor.stop()
+            mb_s = total_masivo * len(grande) / tiempos["masivo"] / 1e6
+            print(f"{modo:>16} {tiempos['chat'] * 1e3:>9.1f} {tiempos['archivo'] * 1e3:>11.1f} {mb_s:>12.1f}")
+    configurar_logging()
+
+
+@benchmark("prioridades")
+def bench_prioridades(args):
+    """Latencia de chat y heartbeats durante una transferencia que satura el enlace: DRR frente a prioridad estricta (root)"""
+    import queue
+    import threading
+    from src.core.codec import codificar
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    def percentil(valores, p):
+        valores = sorted(valores)
+        return valores[min(len(valores) - 1, int(len(valores) * p))] * 1e3
+
+    print(f"{'modo':>10} {'chat p50 ms':>12} {'chat p99 ms':>12} {'control p50 ms':>15} {'control p99 ms':>15}")
+    with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+        configurar_logging("WARNING", salida=devnull)
+        for estricta in (False, True):
+            emisor = Envio_recibo_frames(interfaz_a)
+            receptor = Envio_recibo_frames(interfaz_b)
+            _ampliar_rcvbuf(receptor.mi_socket)
+            emisor.configurar_planificador(prioridad_estricta=estricta)  # Pacer por defecto: 10.000 frames/s
+            hilos = [threading.Thread(target=com.receive_thread, args=(threading.Event(),))
+                     for com in (emisor, receptor)]
+            for hilo in hilos:
+                hilo.start()
+            # Transferencia masiva a otra MAC: ocupa el enlace sin cargar al receptor (la descarta su filtro)
+            grande = codificar(bytes.fromhex("020000000099"), bytes.fromhex(emisor.mac_ori.replace(":", "")),
+                               Tipo_Mensaje.archivo.value, 1, 0, 2, bytes(args.payload))
+            activo = threading.Event()
+            activo.set()
+
+            def masivo():
+                def frames():
+                    while activo.is_set():
+                        yield grande
+                emisor.enviar_archivo(frames(), total_frames=0)
+
+            hilo_masivo = threading.Thread(target=masivo)
+            hilo_masivo.start()
+            time.sleep(0.2)
+            enviados = {}
+            latencias = {"chat": [], "control": []}
+            recibidos = receptor.cola_mensajes
+            muestras = int(50 * args.segundos)
+            for i in range(muestras):
+                for tipo in ("chat", "control"):
+                    texto = f"{tipo}:{i}"
+                    frame = emisor.crear_frame(receptor.mac_ori, Tipo_Mensaje.texto, texto)
+                    enviados[texto] = time.perf_counter()
+                    if tipo == "chat":
+                        emisor.enviar_frame(frame, contar_como_mensaje_usuario=True)
+                    else:
+                        emisor.enviar_protocolo(frame)
+                limite = time.perf_counter() + 0.02
+                while True:
+                    try:
+                        mensaje = recibidos.get(timeout=max(0.0, limite - time.perf_counter()))
+                    except queue.Empty:
+                        break
+                    texto = mensaje.datos if isinstance(mensaje.datos, str) else bytes(mensaje.datos).decode()
+                    if texto in enviados:
+                        latencias[texto.split(":")[0]].append(time.perf_counter() - enviados.pop(texto))
+            activo.clear()
+            hilo_masivo.join()
+            for com in (emisor, receptor):
+                com.stop()
+            for hilo in hilos:
+                hilo.join()
+            modo = "estricta" if estricta else "drr"
+            print(f"{modo:>10} {percentil(latencias['chat'], 0.5):>12.2f} {percentil(latencias['chat'], 0.99):>12.2f} "
+                  f"{percentil(latencias['control'], 0.5):>15.2f} {percentil(latencias['control'], 0.99):>15.2f}"
+                  f"   ({len(latencias['chat'])}/{muestras} chat, {len(latencias['control'])}/{muestras} control)")
+    configurar_logging()
+
+
+@benchmark("agrupacion")
+def bench_agrupacion(args):
+    """Ráfaga de 10.000 mensajes cortos con y sin agrupación en frames, y latencia de un mensaje suelto (root)"""
+    import queue
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    total = 10_000
+    print(f"{'modo':>10} {'frames':>8} {'mensajes/s':>11} {'frames/s':>10} {'recibidos':>10} {'suelto ms':>10}")
+    with par_veth() as (interfaz_a, interfaz_b), open(os.devnull, "w") as devnull:
+        configurar_logging("WARNING", salida=devnull)
+        for agrupar in (False, True):
+            emisor = Envio_recibo_frames(interfaz_a)
+            receptor = Envio_recibo_frames(interfaz_b)
+            _ampliar_rcvbuf(receptor.mi_socket)
+            emisor.configurar_pacing(modo="desactivado")
+            if agrupar:
+                emisor.configurar_agrupacion(espera_maxima=0.002)
+                emisor.registrar_agrupacion_par(receptor.mac_ori, True)  # Lo haría discovery
+            hilos = [threading.Thread(target=com.receive_thread, args=(threading.Event(),))
+                     for com in (emisor, receptor)]
+            for hilo in hilos:
+                hilo.start()
+            mensajes = [emisor.crear_frame(receptor.mac_ori, Tipo_Mensaje.texto, f"mensaje corto {i}")
+                        for i in range(total)]
+            frames_antes = emisor.estadisticas['fragmentos_enviados']
+            recibidos = 0
+            inicio = time.perf_counter()
+            for frames in mensajes:
+                emisor.enviar_frame(frames, contar_como_mensaje_usuario=True)
+            try:
+                while recibidos < total:
+                    receptor.cola_mensajes.get(timeout=1)
+                    recibidos += 1
+            except queue.Empty:
+                pass
+            duracion = time.perf_counter() - inicio
+            frames = emisor.estadisticas['fragmentos_enviados'] - frames_antes
+
+            # Un mensaje suelto solo espera a su temporizador (espera_maxima)
+            latencias = []
+            for i in range(20):
+                t0 = time.perf_counter()
+                emisor.enviar_frame(emisor.crear_frame(receptor.mac_ori, Tipo_Mensaje.texto, f"suelto {i}"),
+                                    contar_como_mensaje_usuario=True)
+                try:
+                    receptor.cola_mensajes.get(timeout=1)
+                    latencias.append(time.perf_counter() - t0)
+                except queue.Empty:
+                    pass
+                time.sleep(0.01)
+            for com in (emisor, receptor):
+                com.stop()
+            for hilo in hilos:
+                hilo.join()
+            suelto = sorted(latencias)[len(latencias) // 2] * 1e3 if latencias else float("nan")
+            modo = "agrupado" if agrupar else "uno a uno"
+            print(f"{modo:>10} {frames:>8,} {recibidos / duracion:>11,.0f} {frames / duracion:>10,.0f} "
+                  f"{recibidos:>10,} {suelto:>10.2f}")
+    configurar_logging()
+
+
+@benchmark("mtu")
+def bench_mtu(args):
+    """Transferencia fiable de 50 MB sin pacing con MTU 1500 frente a jumbo frames de 9000 (root)"""
+    import threading
+    from src.core.env_recb import Envio_recibo_frames
+    from src.core.frames import Tipo_Mensaje
+    from src.core.registro import configurar_logging
+
+    tamaño = 50 * 1024 * 1024
+    datos = os.urandom(tamaño)
+    print(f"{'MTU':>6} {'fragmento':>10} {'frames':>8} {'s':>7} {'MB/s':>8} {'CPU ms/MB':>10} {'retx':>6}")
+    with open(os.devnull, "w") as devnull:
+        configurar_logging("WARNING", salida=devnull)
+        for mtu in (1500, 9000):
+            with par_veth(mtu=mtu) as (interfaz_a, interfaz_b):
+                emisor = Envio_recibo_frames(interfaz_a)
+                receptor = Envio_recibo_frames(interfaz_b)
+                for com in (emisor, receptor):
+                    _ampliar_rcvbuf(com.mi_socket)
+                    com.configurar_pacing("desactivado")
+                # Lo que anuncia cada uno en discovery
+                emisor.registrar_mtu_par(receptor.mac_ori, receptor.mtu)
+                receptor.registrar_mtu_par(emisor.mac_ori, emisor.mtu)
+                hilos = [threading.Thread(target=com.receive_thread, args=(threading.Event(),))
+                         for com in (emisor, receptor)]
+                for hilo in hilos:
+                    hilo.start()
+                inicio, cpu = time.perf_counter(), time.process_time()
+                emisor.enviar_fiable(receptor.mac_ori, Tipo_Mensaje.archivo, datos)
+                mensaje = receptor.cola_mensajes.get(timeout=5)
+                duracion, cpu = time.perf_counter() - inicio, time.process_time() - cpu
+                frames = emisor.estadisticas['fragmentos_enviados']
+                retransmisiones = emisor.fiable.retransmisiones
+                fragmento = emisor.payload_maximo(receptor.mac_ori)
+                for com in (emisor, receptor):
+                    com.stop()
+                for hilo in hilos:
+                    hilo.join()
+                if hasattr(mensaje.datos, 'eliminar'):
+                    mensaje.datos.eliminar()
+                megas = tamaño / 1e6
+                print(f"{mtu:>6} {fragmento:>10} {frames:>8,} {duracion:>7.2f} {megas / duracion:>8.1f} "
+                      f"{cpu * 1e3 / megas:>10.1f} {retransmisiones:>6}")
+    configurar_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de Link-Chat")
+    parser.add_argument("benchmark", nargs="?", help="Nombre del benchmark a ejecutar")
+    parser.add_argument("--lista", action="store_true", help="Lista los benchmarks disponibles")
+    parser.add_argument("--muestra", type=int, default=200, help="Fragmentos medidos con el método anterior")
+    parser.add_argument("--segundos", type=float, default=3.0, help="Duración de los benchmarks de red")
+    parser.add_argument("--payload", type=int, default=1475, help="Bytes de payload por frame")
+    args = parser.parse_args()
+
+    if args.lista or not args.benchmark:
+        for nombre, funcion in BENCHMARKS.items():
+            print(f"{nombre:<16} {funcion.__doc__}")
+        return
+
+    if args.benchmark not in BENCHMARKS:
+        parser.error(f"Benchmark desconocido: {args.benchmark}")
+    with directorio_de_trabajo():
+        BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Agrupación de mensajes cortos en un solo frame
+
+Con la agrupación activa (Envio_recibo_frames.configurar_agrupacion), los
+mensajes de un solo frame hacia un mismo par y de una misma clase del
+planificador no salen uno a uno: se acumulan como registros
+
+    [1B tipo][2B longitud][payload]
+
+en el payload de un frame Tipo_Mensaje.agrupado, que sale cuando se llena
+o, como mucho, `espera_maxima` segundos después del primer registro. El
+receptor (Envio_recibo_frames._procesar_agrupado) los separa y entrega cada
+mensaje como si hubiera llegado en su propio frame. Un lote con un único
+registro se envía como el frame normal de ese mensaje.
+
+Solo se agrupa hacia pares que anuncian 'lotes' en discovery: los que no
+conocen el tipo agrupado descartarían el frame entero.
+"""
+
+import struct
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+from .codec import codificar, decodificar_cabecera, mac_a_bytes
+from .frames import Tipo_Mensaje, PAYLOAD_MAXIMO
+from .registro import obtener_logger
+
+log = obtener_logger(__name__)
+
+REGISTRO = struct.Struct('>BH')  # Tipo y longitud de cada mensaje agrupado
+TIPOS_AGRUPABLES = frozenset((Tipo_Mensaje.texto.value, Tipo_Mensaje.archivo.value))
+
+
+def registros(payload) -> Iterator[Tuple[int, memoryview]]:
+    """
+    Recorre los registros de un frame agrupado sin copiarlos.
+
+    Yields:
+        (tipo, payload): Tipo del mensaje y vista sobre su payload
+
+    Raises:
+        ValueError: Registro truncado
+    """
+    vista = memoryview(payload)
+    posicion = 0
+    while posicion < len(vista):
+        if posicion + REGISTRO.size > len(vista):
+            raise ValueError("Registro agrupado truncado")
+        tipo, longitud = REGISTRO.unpack_from(vista, posicion)
+        posicion += REGISTRO.size
+        if posicion + longitud > len(vista):
+            raise ValueError("Registro agrupado truncado")
+        yield tipo, vista[posicion:posicion + longitud]
+        posicion += longitud
+
+
+class Agrupador:
+    """
+    Acumula mensajes cortos por (destino, clase) y los entrega al
+    planificador agrupados. Se llama desde cualquier hilo; los
+    temporizadores corren en el bucle de E/S del comunicador.
+    """
+
+    def __init__(self, com, espera_maxima: float = 0.002, clases=None, tamaño_maximo: int = 512):
+        """
+        Args:
+            com: Envio_recibo_frames (bucle, planificador y MAC de origen)
+            espera_maxima: Segundos que un mensaje puede esperar a que se llene su frame
+            clases: Clases del planificador que se agrupan (None = todas)
+            tamaño_maximo: Payload máximo de un mensaje para agruparlo
+        """
+        self.com = com
+        self.espera_maxima = espera_maxima
+        self.clases = frozenset(clases) if clases is not None else None
+        self.tamaño_maximo = min(tamaño_maximo, PAYLOAD_MAXIMO - REGISTRO.size)
+        self.lock = threading.Lock()
+        self.pendientes: Dict[Tuple[bytes, str], bytearray] = {}
+        self.mensajes_agrupados = 0
+        self.frames_agrupados = 0
+
+    def admite(self, clase: str) -> bool:
+        return self.clases is None or clase in self.clases
+
+    def agregar(self, frame: bytes, clase: str) -> bool:
+        """
+        Acumula un mensaje ya codificado si es de un solo frame y cabe.
+
+        Returns:
+            bool: True si queda agrupado; False si hay que enviarlo tal cual
+        """
+        try:
+            destino, _, _, tipo, _, fragmento, total, longitud, cabecera = decodificar_cabecera(frame)
+        except ValueError:
+            return False
+        if total or fragmento or tipo not in TIPOS_AGRUPABLES or longitud > self.tamaño_maximo:
+            return False
+        clave = (destino, clase)
+        registro = REGISTRO.pack(tipo, longitud) + frame[cabecera:cabecera + longitud]
+        capacidad = self.com.payload_maximo(destino)  # Con jumbo frames caben más mensajes por lote
+        lleno = None
+        with self.lock:
+            lote = self.pendientes.get(clave)
+            if lote is not None and len(lote) + len(registro) > capacidad:
+                lleno = self.pendientes.pop(clave)
+                lote = None
+            nuevo = lote is None
+            if nuevo:
+                lote = self.pendientes[clave] = bytearray()
+            lote += registro
+        if lleno is not None:
+            self._emitir(clave, lleno)
+        if nuevo:
+            self._programar(clave, lote)
+        return True
+
+    def _programar(self, clave, lote: bytearray):
+        """Temporizador que envía `lote` si sigue pendiente al cumplirse la espera máxima"""
+        bucle = self.com.bucle
+        if bucle.en_hilo_del_bucle():
+            bucle.llamar_en(self.espera_maxima, self._expirar, clave, lote)
+        else:
+            bucle.llamar_desde_hilo(bucle.llamar_en, self.espera_maxima, self._expirar, clave, lote)
+
+    def _expirar(self, clave, lote: bytearray):
+        with self.lock:
+            if self.pendientes.get(clave) is not lote:
+                return  # Ya salió al llenarse
+            del self.pendientes[clave]
+        self._emitir(clave, lote)
+
+    def vaciar(self, destino: Optional[bytes] = None):
+        """Envía ya lo acumulado (hacia `destino` o hacia todos) para no adelantarlo"""
+        with self.lock:
+            claves = [clave for clave in self.pendientes if destino is None or clave[0] == destino]
+            lotes = [(clave, self.pendientes.pop(clave)) for clave in claves]
+        for clave, lote in lotes:
+            self._emitir(clave, lote)
+
+    def _emitir(self, clave, lote: bytearray):
+        destino, clase = clave
+        com = self.com
+        origen = mac_a_bytes(com.mac_ori)
+        id_mensaje = com.nuevo_id_mensaje(destino)
+        tipo, longitud = REGISTRO.unpack_from(lote)
+        if REGISTRO.size + longitud == len(lote):
+            # Un solo mensaje: sale en su frame normal
+            frame = codificar(destino, origen, tipo, id_mensaje, 0, 0, memoryview(lote)[REGISTRO.size:])
+        else:
+            frame = codificar(destino, origen, Tipo_Mensaje.agrupado.value, id_mensaje, 0, 0, lote)
+            self.frames_agrupados += 1
+            self.mensajes_agrupados += sum(1 for _ in registros(lote))
+        com.enviar_en_segundo_plano([frame], clase=clase)
+
+    def estado(self) -> dict:
+        return {
+            'agrupacion_mensajes_agrupados': self.mensajes_agrupados,
+            'agrupacion_frames_agrupados': self.frames_agrupados
+        }
@@ -0,0 +1,96 @@
+import ctypes
+import socket
+import struct
+from typing import Iterable, List, Tuple
+
+# Constantes de Linux (no todas están expuestas por el módulo socket)
+SO_ATTACH_FILTER = getattr(socket, 'SO_ATTACH_FILTER', 26)
+SO_DETACH_FILTER = getattr(socket, 'SO_DETACH_FILTER', 27)
+SOL_PACKET = getattr(socket, 'SOL_PACKET', 263)
+PACKET_ADD_MEMBERSHIP = 1
+PACKET_DROP_MEMBERSHIP = 2
+PACKET_MR_MULTICAST = 0
+PACKET_STATISTICS = 6
+
+# Opcodes de BPF clásico
+BPF_LD_W_ABS = 0x20   # A = palabra (4 bytes) en offset k
+BPF_LD_H_ABS = 0x28   # A = media palabra (2 bytes) en offset k
+BPF_JEQ_K = 0x15      # si A == k salta jt, si no jf
+BPF_RET_K = 0x06      # devuelve k bytes del paquete (0 = descartar)
+
+ACEPTAR_TODO = 0x40000
+MAX_DIRECCIONES = 60  # Los saltos de BPF clásico son de 8 bits
+
+
+def mac_a_bytes(mac: str) -> bytes:
+    """Convierte 'aa:bb:cc:dd:ee:ff' en 6 bytes"""
+    return bytes.fromhex(mac.replace(":", "").replace("-", ""))
+
+
+def programa_filtro_mac(macs: Iterable[str]) -> List[Tuple[int, int, int, int]]:
+    """
+    Construye un programa BPF que solo admite frames cuya MAC destino
+    esté en `macs`. Cada dirección ocupa un bloque de 4 instrucciones:
+
+        ld  [0]            ; 4 primeros bytes de la MAC destino
+        jeq #alto, 0, 2    ; si no coinciden, siguiente bloque
+        ldh [4]            ; 2 últimos bytes
+        jeq #bajo, ACEPTAR ; si coinciden, aceptar
+    """
+    direcciones = []
+    for mac in macs:
+        mac_bytes = mac_a_bytes(mac)
+        if mac_bytes not in direcciones:
+            direcciones.append(mac_bytes)
+    if len(direcciones) > MAX_DIRECCIONES:
+        raise ValueError(f"Demasiadas direcciones para el filtro BPF: {len(direcciones)} (máximo {MAX_DIRECCIONES})")
+
+    instrucciones = []
+    indice_aceptar = 4 * len(direcciones) + 1
+    for mac_bytes in direcciones:
+        alto = int.from_bytes(mac_bytes[:4], 'big')
+        bajo = int.from_bytes(mac_bytes[4:], 'big')
+        indice_jeq_bajo = len(instrucciones) + 3
+        instrucciones.extend([
+            (BPF_LD_W_ABS, 0, 0, 0),
+            (BPF_JEQ_K, 0, 2, alto),
+            (BPF_LD_H_ABS, 0, 0, 4),
+            (BPF_JEQ_K, indice_aceptar - indice_jeq_bajo - 1, 0, bajo),
+        ])
+    instrucciones.append((BPF_RET_K, 0, 0, 0))
+    instrucciones.append((BPF_RET_K, 0, 0, ACEPTAR_TODO))
+    return instrucciones
+
+
+def adjuntar_filtro(sock: socket.socket, instrucciones: List[Tuple[int, int, int, int]]):
+    """Adjunta (o reemplaza) el programa BPF en el socket con SO_ATTACH_FILTER"""
+    codigo = b"".join(struct.pack('HBBI', *instruccion) for instruccion in instrucciones)
+    buffer = ctypes.create_string_buffer(codigo)
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack('HL', len(instrucciones), ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def cambiar_membresia_multicast(sock: socket.socket, interfaz: str, mac: str, agregar: bool = True):
+    """Suscribe (o da de baja) la interfaz a un grupo multicast Ethernet"""
+    mac_bytes = mac_a_bytes(mac)
+    # struct packet_mreq { int ifindex; unsigned short type; unsigned short alen; unsigned char address[8]; }
+    mreq = struct.pack('iHH8s', socket.if_nametoindex(interfaz), PACKET_MR_MULTICAST, len(mac_bytes), mac_bytes)
+    opcion = PACKET_ADD_MEMBERSHIP if agregar else PACKET_DROP_MEMBERSHIP
+    sock.setsockopt(SOL_PACKET, opcion, mreq)
+
+
+def leer_estadisticas(sock: socket.socket) -> Tuple[int, int]:
+    """
+    Lee PACKET_STATISTICS: (frames que pasaron el filtro, incluidos los
+    perdidos; frames perdidos por buffer o anillo de recepción lleno). Los que
+    rechaza el filtro BPF no se cuentan en ninguno. El kernel pone los
+    contadores a cero en cada lectura.
+    """
+    datos = sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, struct.calcsize('II'))
+    return struct.unpack('II', datos)
+
+
+def es_multicast(mac: str) -> bool:
+    """True si la MAC es de grupo (bit menos significativo del primer byte)"""
+    return bool(mac_a_bytes(mac)[0] & 0x01)
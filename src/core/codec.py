@@ -0,0 +1,153 @@
+"""
+Codificación binaria de la cabecera de Link-Chat
+
+    [6B MAC destino][6B MAC origen][2B EtherType][1B tipo][2B id mensaje]
+    [4B fragmento][4B total fragmentos][2B longitud][payload][4B CRC32]
+
+La versión 2 de la cabecera marca el tipo con el bit alto (VERSION_2) y
+lleva un id de 32 bits:
+
+    [6B MAC destino][6B MAC origen][2B EtherType][1B tipo | 0x80][4B id mensaje]
+    [4B fragmento][4B total fragmentos][2B longitud][payload][4B CRC32]
+
+Los ids de la versión 2 son siempre mayores que MAX_ID_V1, así que el
+propio id decide la cabecera al codificar y un receptor nunca confunde un
+mensaje de 16 bits con uno de 32 del mismo emisor. Solo se usa con pares
+que la admiten (ver Envio_recibo_frames.nuevo_id_mensaje).
+
+Las MACs viajan y se guardan como 6 bytes; el texto 'aa:bb:...' solo se
+genera cuando alguien lo pide (bytes_a_mac, con caché).
+"""
+
+import binascii
+import struct
+from functools import lru_cache
+from typing import Tuple
+
+ETHERTYPE_LINKCHAT = 0x88B5
+CABECERA = struct.Struct('>6s6sHBHIIH')
+TAM_CABECERA = CABECERA.size  # 27 bytes
+CABECERA_V2 = struct.Struct('>6s6sHBIIIH')
+TAM_CABECERA_V2 = CABECERA_V2.size  # 29 bytes
+VERSION_2 = 0x80  # Bit del tipo que marca la cabecera con id de 32 bits
+MAX_ID_V1 = 0xFFFF
+MAX_ID_V2 = 0xFFFFFFFF
+CRC = struct.Struct('>I')
+TAM_CRC = CRC.size
+TAM_MINIMO = TAM_CABECERA + TAM_CRC
+MAX_PAYLOAD = 0xFFFF  # El campo longitud es de 2 bytes
+
+
+def tam_cabecera(id_mensaje: int) -> int:
+    """Bytes de cabecera de un frame con este id (27, o 29 con id de 32 bits)"""
+    return TAM_CABECERA_V2 if id_mensaje > MAX_ID_V1 else TAM_CABECERA
+
+
+@lru_cache(maxsize=1024)
+def mac_a_bytes(mac: str) -> bytes:
+    """Convierte 'aa:bb:cc:dd:ee:ff' (o 'aa-bb-...') en 6 bytes"""
+    mac_bytes = bytes.fromhex(mac.replace(":", "").replace("-", ""))
+    if len(mac_bytes) != 6:
+        raise ValueError(f"MAC no válida: {mac}")
+    return mac_bytes
+
+
+@lru_cache(maxsize=1024)
+def bytes_a_mac(mac_bytes: bytes) -> str:
+    """Convierte 6 bytes en 'aa:bb:cc:dd:ee:ff'"""
+    return mac_bytes.hex(':')
+
+
+def codificar(destino: bytes, origen: bytes, tipo_mensaje: int, id_mensaje: int,
+              fragmento: int, total_fragmentos: int, payload) -> bytes:
+    """
+    Construye un frame completo (cabecera + payload + CRC).
+
+    Args:
+        destino: MAC destino (6 bytes)
+        origen: MAC origen (6 bytes)
+        tipo_mensaje: Valor numérico del tipo de mensaje
+        id_mensaje: ID del mensaje (hasta MAX_ID_V1: cabecera de 16 bits; si no, versión 2)
+        fragmento: Número de fragmento (32 bits)
+        total_fragmentos: Total de fragmentos (32 bits, 0 = frame único)
+        payload: Datos (bytes, bytearray o memoryview)
+
+    Returns:
+        bytes: Frame listo para enviar
+    """
+    longitud = len(payload)
+    if longitud > MAX_PAYLOAD:
+        raise ValueError(f"Payload demasiado grande: {longitud} bytes (máximo {MAX_PAYLOAD})")
+    try:
+        if id_mensaje > MAX_ID_V1:
+            cabecera = CABECERA_V2.pack(destino, origen, ETHERTYPE_LINKCHAT, tipo_mensaje | VERSION_2,
+                                        id_mensaje, fragmento, total_fragmentos, longitud)
+        else:
+            cabecera = CABECERA.pack(destino, origen, ETHERTYPE_LINKCHAT, tipo_mensaje,
+                                     id_mensaje, fragmento, total_fragmentos, longitud)
+    except struct.error as e:
+        raise ValueError(f"Campo de cabecera fuera de rango: {e}") from e
+    # CRC encadenado sobre cabecera y payload: el payload solo se copia una vez, en el join
+    crc = binascii.crc32(payload, binascii.crc32(cabecera))
+    return b"".join((cabecera, payload, CRC.pack(crc)))
+
+
+def codificar_en(buffer, offset: int, destino: bytes, origen: bytes, tipo_mensaje: int, id_mensaje: int,
+                 fragmento: int, total_fragmentos: int, payload) -> int:
+    """
+    Como codificar(), pero escribe el frame directamente en `buffer` (un
+    bytearray, mmap o memoryview escribible) a partir de `offset`.
+
+    Returns:
+        int: Bytes escritos
+    """
+    longitud = len(payload)
+    tamaño = tam_cabecera(id_mensaje)
+    fin = offset + tamaño + longitud
+    try:
+        if tamaño == TAM_CABECERA_V2:
+            CABECERA_V2.pack_into(buffer, offset, destino, origen, ETHERTYPE_LINKCHAT, tipo_mensaje | VERSION_2,
+                                  id_mensaje, fragmento, total_fragmentos, longitud)
+        else:
+            CABECERA.pack_into(buffer, offset, destino, origen, ETHERTYPE_LINKCHAT, tipo_mensaje,
+                               id_mensaje, fragmento, total_fragmentos, longitud)
+    except struct.error as e:
+        raise ValueError(f"Campo de cabecera fuera de rango: {e}") from e
+    with memoryview(buffer) as vista:
+        vista[offset + tamaño:fin] = payload
+        crc = binascii.crc32(payload, binascii.crc32(vista[offset:offset + tamaño]))
+    CRC.pack_into(buffer, fin, crc)
+    return fin + TAM_CRC - offset
+
+
+def crc_correcto(data, longitud: int, cabecera: int = TAM_CABECERA) -> bool:
+    """
+    Comprueba el CRC32 que sigue a un payload de `longitud` bytes tras una
+    cabecera de `cabecera` bytes. Se calcula sobre una vista del frame, sin
+    copiarlo; lo que haya tras el CRC (relleno Ethernet de los frames
+    cortos) no cuenta.
+    """
+    fin = cabecera + longitud
+    if len(data) < fin + TAM_CRC:
+        return False
+    return binascii.crc32(memoryview(data)[:fin]) == CRC.unpack_from(data, fin)[0]
+
+
+def decodificar_cabecera(data) -> Tuple[bytes, bytes, int, int, int, int, int, int, int]:
+    """
+    Lee la cabecera (versión 1 o 2) sin copiar el payload.
+
+    Returns:
+        (destino, origen, ethertype, tipo, id_mensaje, fragmento, total_fragmentos, longitud,
+        bytes de cabecera); `tipo` va sin el bit de versión
+    """
+    if len(data) < TAM_MINIMO:
+        raise ValueError("Frame invalido")
+    if not data[14] & VERSION_2:
+        return CABECERA.unpack_from(data) + (TAM_CABECERA,)
+    if len(data) < TAM_CABECERA_V2 + TAM_CRC:
+        raise ValueError("Frame invalido")
+    destino, origen, ethertype, tipo, id_mensaje, fragmento, total, longitud = CABECERA_V2.unpack_from(data)
+    if id_mensaje <= MAX_ID_V1:
+        raise ValueError(f"Id {id_mensaje} en cabecera de 32 bits")
+    return destino, origen, ethertype, tipo & ~VERSION_2, id_mensaje, fragmento, total, longitud, TAM_CABECERA_V2
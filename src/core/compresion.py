@@ -0,0 +1,180 @@
+"""
+Compresión por trozos para transferencias de archivos
+
+El contenido comprimido es una secuencia de registros independientes:
+
+    [1B método][4B longitud original][4B longitud en el cable][datos]
+
+Cada trozo se comprime por separado (o va tal cual si una muestra dice
+que no merece la pena), así que el receptor puede descomprimir registro a
+registro, en streaming, sin cargar el archivo entero en memoria. Al ser
+independientes, los trozos se comprimen en paralelo (paralelo.mapa_ordenado)
+y se escriben en orden.
+"""
+
+import bz2
+import functools
+import lzma
+import struct
+import tempfile
+import zlib
+from typing import BinaryIO, Callable, Optional, Tuple
+
+from .paralelo import mapa_ordenado, pool_compartido, trabajadores_por_defecto
+from .registro import obtener_logger
+
+log = obtener_logger(__name__)
+
+REGISTRO = struct.Struct('>BII')
+SIN_COMPRIMIR = 0
+CODECS = {'zlib': 1, 'lzma': 2, 'bz2': 3}
+NIVEL_POR_DEFECTO = {'zlib': 1, 'lzma': 0, 'bz2': 1}  # Rápidos: compiten con el enlace, no con el disco
+
+def _lzma(datos: bytes, nivel: int) -> bytes:
+    return lzma.compress(datos, preset=nivel)
+
+
+# Funciones de módulo (no lambdas) para que los trozos puedan ir a un pool de procesos
+_COMPRIMIR = {
+    1: zlib.compress,
+    2: _lzma,
+    3: bz2.compress,
+}
+_DESCOMPRIMIR = {
+    1: zlib.decompress,
+    2: lzma.decompress,
+    3: bz2.decompress,
+}
+
+
+def _registro(metodo: int, nivel: int, muestra: int, umbral: float, trozo: bytes) -> Tuple[bytes, bool]:
+    """(registro, si va comprimido) de un trozo; se ejecuta en los trabajadores del pool"""
+    prueba = trozo[:muestra]
+    if len(zlib.compress(prueba, 1)) < umbral * len(prueba):
+        comprimido = _COMPRIMIR[metodo](trozo, nivel)
+        if len(comprimido) < len(trozo):
+            return REGISTRO.pack(metodo, len(trozo), len(comprimido)) + comprimido, True
+    return REGISTRO.pack(SIN_COMPRIMIR, len(trozo), len(trozo)) + trozo, False
+
+
+class CompresorTrozos:
+    """Comprime archivos por trozos, saltándose los que no se dejan comprimir"""
+
+    def __init__(self, codec: str = "zlib", nivel: Optional[int] = None, tamaño_trozo: int = 256 * 1024,
+                 muestra: int = 4096, umbral: float = 0.9, trabajadores: Optional[int] = None,
+                 procesos: bool = False):
+        """
+        Args:
+            codec: "zlib", "lzma" o "bz2"
+            nivel: Nivel de compresión (por defecto, el más rápido del códec)
+            tamaño_trozo: Bytes del archivo por registro
+            muestra: Bytes de cada trozo con los que se prueba si es compresible
+            umbral: Si la muestra no baja de esta fracción, el trozo va sin comprimir
+            trabajadores: Trozos comprimiéndose a la vez (por defecto, uno por
+                núcleo; 1 comprime en el hilo que envía)
+            procesos: Usar el pool compartido de procesos en lugar del de hilos
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Códec no soportado: {codec} (opciones: {', '.join(CODECS)})")
+        self.codec = codec
+        self.metodo = CODECS[codec]
+        self.nivel = NIVEL_POR_DEFECTO[codec] if nivel is None else nivel
+        self.tamaño_trozo = tamaño_trozo
+        self.muestra = muestra
+        self.umbral = umbral
+        self.trabajadores = trabajadores_por_defecto() if trabajadores is None else max(1, trabajadores)
+        self.procesos = procesos
+        self.trozos_comprimidos = 0
+        self.trozos_sin_comprimir = 0
+
+    def comprimir_trozo(self, trozo: bytes) -> bytes:
+        """Registro de un trozo: comprimido o, si no compensa, tal cual"""
+        registro, comprimido = _registro(self.metodo, self.nivel, self.muestra, self.umbral, trozo)
+        self._contar(comprimido)
+        return registro
+
+    def _contar(self, comprimido: bool):
+        if comprimido:
+            self.trozos_comprimidos += 1
+        else:
+            self.trozos_sin_comprimir += 1
+
+    def comprimir_archivo(self, archivo: BinaryIO, destino: BinaryIO) -> Tuple[int, int]:
+        """
+        Escribe en `destino` los registros de todo `archivo`. Con varios
+        trabajadores hay como mucho 2 × trabajadores trozos en memoria.
+
+        Returns:
+            (bytes originales, bytes comprimidos)
+        """
+        trozos = iter(functools.partial(archivo.read, self.tamaño_trozo), b'')
+        trabajo = functools.partial(_registro, self.metodo, self.nivel, self.muestra, self.umbral)
+        if self.trabajadores == 1:
+            registros = map(trabajo, trozos)
+        else:
+            registros = mapa_ordenado(trabajo, trozos, pool_compartido(self.procesos), 2 * self.trabajadores)
+        originales = comprimidos = 0
+        for registro, comprimido in registros:
+            destino.write(registro)
+            originales += REGISTRO.unpack_from(registro)[1]
+            comprimidos += len(registro)
+            self._contar(comprimido)
+        return originales, comprimidos
+
+    def comprimir_a_temporal(self, ruta: str, en_memoria: int = 16 * 1024 * 1024) -> Tuple[BinaryIO, int, int]:
+        """
+        Comprime un archivo a un temporal (en memoria hasta `en_memoria` bytes,
+        después en disco), posicionado al inicio.
+
+        Returns:
+            (temporal, bytes originales, bytes comprimidos)
+        """
+        temporal = tempfile.SpooledTemporaryFile(max_size=en_memoria)
+        try:
+            with open(ruta, 'rb') as archivo:
+                originales, comprimidos = self.comprimir_archivo(archivo, temporal)
+        except BaseException:
+            temporal.close()
+            raise
+        temporal.seek(0)
+        return temporal, originales, comprimidos
+
+
+def descomprimir(leer: Callable[[int], bytes], escribir: Callable[[bytes], object], longitud: int) -> int:
+    """
+    Descomprime registro a registro.
+
+    Args:
+        leer: Devuelve los siguientes n bytes del contenido comprimido
+        escribir: Recibe cada trozo ya descomprimido
+        longitud: Bytes de contenido comprimido a consumir
+
+    Returns:
+        int: Bytes descomprimidos
+
+    Raises:
+        ValueError: Registro truncado, método desconocido o datos corruptos
+    """
+    consumidos = escritos = 0
+    while consumidos < longitud:
+        cabecera = leer(REGISTRO.size)
+        if len(cabecera) < REGISTRO.size:
+            raise ValueError("Registro comprimido truncado")
+        metodo, original, en_cable = REGISTRO.unpack(cabecera)
+        datos = leer(en_cable)
+        if len(datos) < en_cable:
+            raise ValueError("Registro comprimido truncado")
+        if metodo != SIN_COMPRIMIR:
+            descomprimir_trozo = _DESCOMPRIMIR.get(metodo)
+            if descomprimir_trozo is None:
+                raise ValueError(f"Método de compresión desconocido: {metodo}")
+            try:
+                datos = descomprimir_trozo(datos)
+            except (zlib.error, lzma.LZMAError, OSError, EOFError) as e:
+                raise ValueError(f"Trozo comprimido corrupto: {e}") from e
+        if len(datos) != original:
+            raise ValueError(f"Trozo de {len(datos)} bytes, se esperaban {original}")
+        escribir(datos)
+        consumidos += REGISTRO.size + en_cable
+        escritos += original
+    return escritos
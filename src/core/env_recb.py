@@ -3,16 +3,32 @@ import threading
 import time
 import random
 import queue
+import itertools
 from .mac import Mac
-from .frames import Frame, Tipo_Mensaje
-from .fragmentation import FragmentManager
+from .frames import Frame, Tipo_Mensaje, PAYLOAD_MAXIMO, MTU_ESTANDAR, MTU_MINIMA, payload_para_mtu
+from .codec import codificar, mac_a_bytes, bytes_a_mac, MAX_ID_V1, MAX_ID_V2
+from .fragmentation import FragmentManager, MensajeEnDisco
+from . import bpf
+from .packet_mmap import AnilloRecepcion, AnilloTransmision, TPACKET2_OFFSET_DATOS
+from .recepcion_lotes import ReceptorLotes, mtu_interfaz, CABECERA_ETHERNET, MARGEN_VLAN, MSG_DONTWAIT
+from .pacing import Pacer
+from .planificador import PlanificadorEnvio, FlujoEnvio, QUANTUM, CLASE_CONTROL, CLASE_INTERACTIVA, CLASE_MASIVA
+from .eventos import BucleEventos
+from .fiable import ControlFiable, FuenteFragmentos
+from .fec import CodificadorFEC, CABECERA_REPARACION
+from .agrupacion import Agrupador, registros, TIPOS_AGRUPABLES
+from .registro import obtener_logger, TRAZA
 import struct
 from typing import Callable, Optional, Union
 
+log = obtener_logger(__name__)
+
+_TIPOS_DATOS = (Tipo_Mensaje.texto, Tipo_Mensaje.archivo)  # Los que se reensamblan en FragmentManager
 
 
 class Envio_recibo_frames:
-    def __init__(self, interfaz = None, progress_callback=None):
+    def __init__(self, interfaz = None, progress_callback=None, backend_recepcion: str = "lotes",
+                 backend_envio: str = "send"):
         if interfaz is not None:
             resultado = Mac.obtener_mac(interfaz)
         else:
@@ -28,6 +44,58 @@ class Envio_recibo_frames:
         self.lock = threading.Lock()
         self.fragment_manager = FragmentManager(progress_callback=progress_callback)
         self.cola_mensajes = queue.Queue()
+        self.grupos_multicast = set()  # MACs multicast a las que estamos suscritos
+        self.destinos_aceptados = frozenset()  # MACs destino admitidas (6 bytes), ver actualizar_filtro_bpf
+        self.filtro_bpf_activo = False
+        self.backend_recepcion = backend_recepcion  # "lotes", "recvfrom" o "ring" (PACKET_RX_RING)
+        self.anillo_rx = None
+        self.receptor_lotes = None
+        self.backend_envio = backend_envio  # "send" o "ring" (PACKET_TX_RING)
+        self.anillo_tx = None
+        self.frames_recibidos_total = 0
+        # Bytes de payload aceptados y copias hechas en espacio de usuario (ver copias_por_byte)
+        self.bytes_payload_recibidos = 0
+        self.bytes_payload_copiados = 0
+        # Frames descartados por CRC y frames cuyo CRC no se comprobó (los cubre la cabecera de integridad)
+        self.frames_crc_incorrecto = 0
+        self.frames_crc_omitidos = 0
+        # Sin regulación salvo que se pida con configurar_pacing: un límite por defecto acotaría todo envío
+        self.pacer = Pacer(modo="desactivado")
+        # MTU propia y la que anuncia cada par en discovery: fijan el tamaño de fragmento (ver payload_maximo)
+        self.mtu = mtu_interfaz(self.interfaz)
+        self.mtu_pares = {}
+        # Bucle de E/S del hilo de recepción: también transmite lo encolado en segundo plano y ejecuta temporizadores.
+        # LinkChatTransport lo sustituye por el loop de asyncio
+        self.bucle = BucleEventos()
+        # Todos los envíos pasan por el planificador, que intercala sus frames por turnos (DRR)
+        self.planificador = PlanificadorEnvio(quantum=max(QUANTUM, 4 * (self.mtu + CABECERA_ETHERNET + MARGEN_VLAN)),
+                                              vaciar=self._vaciar_anillo_tx, despertar=self._despertar_envios)
+        self.envio_retenido = None  # (turno, posición) que el bucle de E/S reanuda cuando lo permita el pacer
+        self.temporizador_envio = None
+        self.frames_por_turno = 64
+        self.buffer_recepcion = None
+        self.cerrado = False
+        # IDs de mensaje consecutivos (partiendo del reloj): dos envíos concurrentes
+        # en el mismo milisegundo no comparten ID ni mezclan sus fragmentos
+        self.ids_mensaje = itertools.count(int(time.time() * 1000))
+        # Pares que admiten la cabecera v2 (id de 32 bits): anunciado en discovery
+        # o visto en un frame suyo. None en version_cabecera = negociar por par
+        self.pares_v2 = set()
+        self.version_cabecera: Optional[int] = None
+        # Mensajes cortos agrupados en un frame (ver configurar_agrupacion), solo hacia pares que lo anuncian
+        self.agrupador: Optional[Agrupador] = None
+        self.pares_agrupacion = set()
+        self.fiable = ControlFiable(self)  # Transferencias con ventana deslizante y SACK (ver enviar_fiable)
+        # Trozos corruptos (cabecera de integridad): en transferencias fiables se vuelven a pedir
+        self.fragment_manager.rechazo_callback = self.fiable.trozo_rechazado
+        self.fec: Optional[CodificadorFEC] = None  # Reparaciones FEC en mensajes fragmentados (ver configurar_fec)
+        self.fec_solo_difusion = True
+        # Contadores de PACKET_STATISTICS (acumulados: el kernel los reinicia al leerlos). Son pérdidas por
+        # desbordamiento del buffer o del anillo de recepción, no frames rechazados por el filtro BPF
+        self.estadisticas_kernel = {
+            'frames_entregados_kernel': 0,
+            'frames_perdidos_buffer_kernel': 0
+        }
         self.conectar()
         
         # Estadísticas de comunicación
@@ -48,148 +116,559 @@ class Envio_recibo_frames:
             # Usar nuestro protocolo específico en lugar de ETH_P_ALL
             self.mi_socket.bind((self.interfaz, 0))
             
-            print(f"✅ Conectado a interfaz {self.interfaz} con MAC {self.mac_ori}")
+            log.info("✅ Conectado a interfaz %s con MAC %s", self.interfaz, self.mac_ori)
+            self.actualizar_filtro_bpf()
+            if self.backend_recepcion == "ring":
+                self._configurar_anillo_rx()
+            elif self.backend_recepcion == "lotes":
+                tamaño_buffer = self.mtu + CABECERA_ETHERNET + MARGEN_VLAN
+                self.receptor_lotes = ReceptorLotes(self.mi_socket, tamaño_buffer=tamaño_buffer)
+            if self.backend_envio == "ring":
+                self._configurar_anillo_tx()
             
         except PermissionError:
             raise Exception("Se necesitan permisos de root (sudo)")
         except Exception as e:
             raise Exception(f"Error conectando a {self.interfaz}: {e}")
         
-    def enviar_frame(self, frames, contar_como_mensaje_usuario=False, progress_callback=None, archivo_nombre=None):
-        total_bytes = 0
-        for i, frame in enumerate(frames):
-            try:
-                print(f"📤 Frame {i+1}/{len(frames)}: {len(frame)} bytes")
-                print(f"📤 Primeros 50 bytes hex: {frame.hex()[:100]}...")
-                bytes_sent = self.mi_socket.send(frame)
-                print(f"Frame {i+1}/{len(frames)} enviado ({bytes_sent} bytes)")
-                
-                # Actualizar estadísticas de envío - siempre contar fragmentos
-                self.estadisticas['fragmentos_enviados'] += 1
-                total_bytes += bytes_sent
-                
-                # Mostrar progreso de envío si hay callback y nombre de archivo
-                if progress_callback and archivo_nombre and len(frames) > 10:  # Solo para archivos con más de 10 fragmentos
-                    try:
-                        progress_callback(archivo_nombre, i+1, len(frames), total_bytes)
-                    except Exception as e:
-                        print(f"❌ Error en progress_callback de envío: {e}")
-                
-                # Agregar delay entre fragmentos para archivos grandes (más de 100 fragmentos)
-                if len(frames) > 100 and i < len(frames) - 1:
-                    import time
-                    time.sleep(0.001)  # 1ms de delay entre fragmentos
-                
-            except Exception as e:
-                print(f"Error enviando frame {i+1}: {e}")
-                raise
+    def _configurar_anillo_rx(self):
+        """Activa PACKET_RX_RING; si el kernel no lo soporta se usa recvfrom"""
+        try:
+            self.anillo_rx = AnilloRecepcion(self.mi_socket)
+            log.info("💍 Recepción con PACKET_RX_RING (TPACKET_V3)")
+        except (OSError, ValueError) as e:
+            self.anillo_rx = None
+            log.warning("⚠️ PACKET_RX_RING no disponible (%s), usando recvfrom", e)
+
+    def _configurar_anillo_tx(self):
+        """Activa PACKET_TX_RING; si el kernel no lo soporta se usa send() por frame"""
+        # Ranuras (potencia de 2) donde quepa un frame de la MTU; con jumbo frames, menos ranuras
+        tamaño_frame = 2048
+        while tamaño_frame < TPACKET2_OFFSET_DATOS + CABECERA_ETHERNET + MARGEN_VLAN + self.mtu:
+            tamaño_frame <<= 1
+        try:
+            self.anillo_tx = AnilloTransmision(self.interfaz, tamaño_frame=tamaño_frame,
+                                               num_frames=max(256, (2048 * 1024) // tamaño_frame),
+                                               tamaño_bloque=max(1 << 16, tamaño_frame))
+            log.info("💍 Envío con PACKET_TX_RING (TPACKET_V2)")
+        except (OSError, ValueError) as e:
+            self.anillo_tx = None
+            log.warning("⚠️ PACKET_TX_RING no disponible (%s), usando send()", e)
+
+    def configurar_pacing(self, modo: str = "fijo", bytes_por_segundo: Optional[float] = None,
+                          frames_por_segundo: Optional[float] = None, **opciones):
+        """
+        Reemplaza el regulador de envío. Por defecto no hay regulación; con
+        "fijo" el caudal queda acotado por las tasas dadas (p. ej. 10000
+        frames/s son ~15 MB/s con frames completos), también con el anillo TX.
+        En "auto" la tasa sube mientras ControlFiable no notifique pérdidas,
+        así que solo se adapta con envíos fiables.
+
+        Args:
+            modo: "fijo", "auto" (sube la tasa hasta que se notifiquen pérdidas) o "desactivado"
+            bytes_por_segundo: Tasa en bytes/s (None = sin límite de bytes)
+            frames_por_segundo: Tasa en frames/s (None = sin límite de frames)
+            **opciones: rafaga_bytes, rafaga_frames, espera_minima... (ver Pacer)
+        """
+        self.pacer = Pacer(modo=modo, bytes_por_segundo=bytes_por_segundo,
+                           frames_por_segundo=frames_por_segundo, **opciones)
+
+    def configurar_fec(self, k: int = 16, m: int = 1, solo_difusion: bool = True):
+        """
+        Activa la corrección de errores hacia delante: tras cada grupo de `k`
+        fragmentos se envían `m` de reparación (redundancia m/k) y cada
+        receptor recupera hasta `m` pérdidas por grupo sin retransmisiones.
+
+        Args:
+            k: Fragmentos de datos por grupo
+            m: Fragmentos de reparación por grupo (0 desactiva FEC)
+            solo_difusion: Aplicarlo solo a broadcast/multicast, donde no hay ACK que escale
+        """
+        self.fec = CodificadorFEC(k, m) if m > 0 else None
+        self.fec_solo_difusion = solo_difusion
+        if self.fec is not None:
+            log.info("🩹 FEC activado: %d+%d por grupo (redundancia %.1f%%)", k, m, self.fec.redundancia * 100)
+
+    def _codificador_fec(self, destino: bytes, total_fragmentos: int) -> Optional[CodificadorFEC]:
+        """Codificador FEC para un mensaje, o None si no se aplica"""
+        if self.fec is None or total_fragmentos < 2:
+            return None
+        if self.fec_solo_difusion and not destino[0] & 1:  # Bit I/G: dirección de grupo
+            return None
+        return self.fec
+
+    def _transmitir(self, frame: bytes) -> int:
+        """Envía un frame: directo al socket o a una ranura del anillo TX"""
+        if self.anillo_tx is not None:
+            return self.anillo_tx.encolar(frame)
+        return self.mi_socket.send(frame)
+
+    def actualizar_filtro_bpf(self):
+        """
+        (Re)construye el filtro BPF del socket para que el kernel solo entregue
+        frames dirigidos a nuestra MAC, a broadcast o a un grupo suscrito.
+        """
+        macs = [self.mac_ori, "FF:FF:FF:FF:FF:FF", *sorted(self.grupos_multicast)]
+        # Mismo criterio en espacio de usuario (por si el filtro no se pudo adjuntar)
+        self.destinos_aceptados = frozenset(mac_a_bytes(mac) for mac in macs)
+        try:
+            bpf.adjuntar_filtro(self.mi_socket, bpf.programa_filtro_mac(macs))
+            self.filtro_bpf_activo = True
+            log.info("🛡️ Filtro BPF activo para %d direcciones", len(macs))
+        except (OSError, ValueError) as e:
+            # Sin filtro en el kernel se sigue filtrando en decodificar_frame
+            self.filtro_bpf_activo = False
+            log.warning("⚠️ No se pudo adjuntar el filtro BPF: %s", e)
+
+    def suscribir_multicast(self, mac_grupo: str):
+        """Se une a un grupo multicast Ethernet y lo admite en el filtro BPF"""
+        mac_grupo = mac_grupo.upper()
+        if not bpf.es_multicast(mac_grupo):
+            raise ValueError(f"{mac_grupo} no es una dirección multicast")
+        if mac_grupo in self.grupos_multicast:
+            return
+        bpf.cambiar_membresia_multicast(self.mi_socket, self.interfaz, mac_grupo, agregar=True)
+        self.grupos_multicast.add(mac_grupo)
+        self.actualizar_filtro_bpf()
+
+    def cancelar_multicast(self, mac_grupo: str):
+        """Abandona un grupo multicast y lo quita del filtro BPF"""
+        mac_grupo = mac_grupo.upper()
+        if mac_grupo not in self.grupos_multicast:
+            return
+        try:
+            bpf.cambiar_membresia_multicast(self.mi_socket, self.interfaz, mac_grupo, agregar=False)
+        except OSError as e:
+            log.warning("⚠️ Error abandonando grupo %s: %s", mac_grupo, e)
+        self.grupos_multicast.discard(mac_grupo)
+        self.actualizar_filtro_bpf()
+
+    def obtener_estadisticas_kernel(self):
+        """Acumula y retorna los contadores PACKET_STATISTICS del socket"""
+        try:
+            aceptados, perdidos = bpf.leer_estadisticas(self.mi_socket)
+            self.estadisticas_kernel['frames_entregados_kernel'] += aceptados - perdidos
+            self.estadisticas_kernel['frames_perdidos_buffer_kernel'] += perdidos
+        except (OSError, AttributeError):
+            pass
+        return dict(self.estadisticas_kernel)
+
+    def enviar_frame(self, frames, contar_como_mensaje_usuario=False, progress_callback=None, archivo_nombre=None,
+                     total_frames=None, clase: Optional[str] = None):
+        """
+        Envía frames por el socket. `frames` puede ser una lista o un generador
+        (envío en streaming); en ese caso `total_frames` indica el total esperado.
+
+        Los frames se registran como un flujo en el planificador: si hay otros
+        envíos en curso se intercalan con ellos por turnos en lugar de esperar
+        a que terminen. Bloquea hasta que sale el último frame.
+
+        Args:
+            clase: Clase del planificador (por defecto interactiva para mensajes
+                del usuario y masiva para el resto)
+        """
+        if total_frames is None:
+            total_frames = len(frames)
+        if clase is None:
+            clase = CLASE_INTERACTIVA if contar_como_mensaje_usuario else CLASE_MASIVA
+        if self.agrupador is not None and self._agrupar(frames, clase):
+            # Sale con otros mensajes cortos en, como mucho, espera_maxima segundos
+            if contar_como_mensaje_usuario:
+                self.estadisticas['mensajes_enviados'] += 1
+            return len(frames[0])
+        traza = log.isEnabledFor(TRAZA)  # Se consulta una vez: sin coste por frame si está desactivado
+        informar = progress_callback and archivo_nombre and total_frames > 10  # Solo archivos con más de 10 fragmentos
+
+        def al_enviar(flujo: FlujoEnvio):
+            if traza:
+                log.log(TRAZA, "📤 Frame %d/%d enviado (%d bytes acumulados)", flujo.enviados, total_frames, flujo.bytes)
+            if informar:
+                try:
+                    progress_callback(archivo_nombre, flujo.enviados, total_frames, flujo.bytes)
+                except Exception as e:
+                    log.error("❌ Error en progress_callback de envío: %s", e)
+
+        flujo = self.planificador.registrar(frames, clase, al_enviar if traza or informar else None)
+        self._conducir(flujo)
+        if flujo.error is not None:
+            raise flujo.error
         
         # Solo contar como "mensaje enviado" si está marcado como mensaje de usuario
-        if len(frames) > 0 and contar_como_mensaje_usuario:
+        if flujo.enviados > 0 and contar_como_mensaje_usuario:
             self.estadisticas['mensajes_enviados'] += 1
-            if len(frames) > 1:
+            if flujo.enviados > 1:
                 self.estadisticas['mensajes_fragmentados'] += 1
         
-        return total_bytes
+        return flujo.bytes
+
+    def _conducir(self, flujo: FlujoEnvio):
+        """
+        Espera a que `flujo` termine. Mientras nadie más transmita, este hilo
+        hace de conductor: transmite los turnos que reparta el planificador,
+        sean suyos o de otros envíos, y cede el turno al acabar el suyo.
+        """
+        planificador = self.planificador
+        while planificador.tomar_turno(flujo):
+            try:
+                while not flujo.terminado:
+                    turno = planificador.turno()
+                    if turno is None:
+                        break
+                    self._transmitir_turno(*turno)
+            finally:
+                planificador.soltar_turno()
+
+    def _transmitir_turno(self, flujo: FlujoEnvio, frames, agotado: bool, inicio: int = 0,
+                          con_temporizador: bool = False, reservado: bool = False):
+        """
+        Transmite los frames de un turno del planificador; un error termina solo su flujo.
+
+        Args:
+            inicio: Primer frame a transmitir
+            con_temporizador: No dormir (bucle de E/S): si el pacer pide esperar se
+                retorna (posición, espera) con los tokens de ese frame ya reservados
+            reservado: El frame `inicio` ya tiene sus tokens (reanudación tras la espera)
+
+        Returns:
+            (posición, espera) si hay que reanudar más tarde, None si el turno terminó
+        """
+        pacer = self.pacer
+        planificador = self.planificador
+        transmitir = self._transmitir
+        al_enviar = flujo.al_enviar
+        i = inicio
+        try:
+            for i in range(inicio, len(frames)):
+                frame = frames[i]
+                if reservado:
+                    reservado = False
+                elif planificador.interrumpir and i > inicio:
+                    # Hay un flujo más prioritario: lo que queda del turno vuelve a su flujo
+                    planificador.devolver(flujo, frames[i:])
+                    return None
+                elif con_temporizador:
+                    espera = pacer.reservar(len(frame))
+                    if espera >= pacer.espera_minima:
+                        return i, espera
+                else:
+                    pacer.esperar(len(frame))
+                flujo.bytes += transmitir(frame)
+                flujo.enviados += 1
+                if al_enviar is not None:
+                    al_enviar(flujo)
+            else:
+                i = len(frames)
+        except Exception as e:
+            log.error("Error enviando frame %d: %s", flujo.enviados + 1, e)
+            planificador.terminar(flujo, e)
+            return None
+        finally:
+            self.estadisticas['fragmentos_enviados'] += i - inicio
+        if agotado:
+            planificador.terminar(flujo)
+        return None
+
+    def _vaciar_anillo_tx(self):
+        """Con el anillo TX, una sola llamada transmite lo que quede pendiente"""
+        if self.anillo_tx is not None:
+            self.anillo_tx.vaciar()
+
+    def configurar_planificador(self, quantum: Optional[int] = None, pesos_clase: Optional[dict] = None,
+                                pesos_par: Optional[dict] = None, prioridad_estricta: Optional[bool] = None):
+        """
+        Ajusta el reparto del enlace entre envíos simultáneos.
+
+        Args:
+            quantum: Bytes por turno de un flujo de peso 1
+            pesos_clase: Pesos por clase, p. ej. {"masivo": 2}
+            pesos_par: Pesos por MAC destino, p. ej. {"aa:bb:cc:dd:ee:ff": 4}
+            prioridad_estricta: Control > interactivo > masivo sin reparto entre
+                clases (por defecto); False reparte el enlace según los pesos de clase
+        """
+        planificador = self.planificador
+        if prioridad_estricta is not None:
+            planificador.prioridad_estricta = prioridad_estricta
+        if quantum is not None:
+            if quantum < CABECERA_ETHERNET + MARGEN_VLAN + payload_para_mtu(self.mtu):
+                raise ValueError(f"El quantum ({quantum} bytes) no cabe un frame completo")
+            planificador.quantum = quantum
+        for clase, peso in (pesos_clase or {}).items():
+            if clase not in planificador.pesos_clase or peso < 1:
+                raise ValueError(f"Peso de clase no válido: {clase}={peso}")
+            planificador.pesos_clase[clase] = peso
+        for mac, peso in (pesos_par or {}).items():
+            planificador.configurar_peso_par(mac_a_bytes(mac), peso)
     
-    def enviar_archivo(self, frames, progress_callback=None, archivo_nombre=None):
+    def configurar_agrupacion(self, activa: bool = True, espera_maxima: float = 0.002, clases=None,
+                              tamaño_maximo: int = 512):
+        """
+        Agrupa los mensajes cortos hacia un mismo par en un solo frame (ver
+        agrupacion.py). Necesita el bucle de E/S en marcha; sin él, o hacia
+        pares que no anuncian 'lotes', los mensajes salen uno a uno.
+
+        Args:
+            activa: False desactiva la agrupación y envía lo acumulado
+            espera_maxima: Segundos que un mensaje puede esperar a que se llene su frame
+            clases: Clases del planificador que se agrupan (None = todas); p. ej.
+                (CLASE_INTERACTIVA,) deja fuera los frames de control
+            tamaño_maximo: Payload máximo de un mensaje para agruparlo
+        """
+        anterior = self.agrupador
+        self.agrupador = Agrupador(self, espera_maxima, clases, tamaño_maximo) if activa else None
+        if anterior is not None:
+            anterior.vaciar()
+
+    def _agrupar(self, frames, clase: str) -> bool:
+        """Intenta agrupar un envío; False si debe salir por su cuenta"""
+        agrupador = self.agrupador
+        if (isinstance(frames, (list, tuple)) and len(frames) == 1 and self.bucle.ejecutando and
+                agrupador.admite(clase) and bytes(frames[0][:6]) in self.pares_agrupacion and
+                agrupador.agregar(frames[0], clase)):
+            return True
+        if agrupador.pendientes:
+            # Lo acumulado sale antes que este envío: no se adelanta a mensajes anteriores
+            agrupador.vaciar()
+        return False
+
+    def registrar_agrupacion_par(self, mac: Union[str, bytes], admite: bool):
+        """Anota si un par entiende frames agrupados (lo llama discovery con sus capacidades)"""
+        if isinstance(mac, str):
+            mac = mac_a_bytes(mac)
+        if admite:
+            self.pares_agrupacion.add(mac)
+        else:
+            self.pares_agrupacion.discard(mac)
+
+    def enviar_archivo(self, frames, progress_callback=None, archivo_nombre=None, total_frames=None):
         """Envía frames de archivo y actualiza estadísticas correspondientes"""
         total_bytes = self.enviar_frame(frames, contar_como_mensaje_usuario=False, 
-                                      progress_callback=progress_callback, archivo_nombre=archivo_nombre)
-        if len(frames) > 0:
+                                      progress_callback=progress_callback, archivo_nombre=archivo_nombre,
+                                      total_frames=total_frames, clase=CLASE_MASIVA)
+        if total_bytes > 0:
             self.estadisticas['archivos_enviados'] += 1
         return total_bytes
     
-    def enviar_protocolo(self, frames):
-        """Envía frames de protocolo (discovery, seguridad, etc.) y actualiza estadísticas"""
-        total_bytes = self.enviar_frame(frames, contar_como_mensaje_usuario=False)
+    def enviar_fiable(self, mac_destino: str, tipo_mensaje, datos: Union[bytes, str, FuenteFragmentos],
+                      progress_callback=None, archivo_nombre=None, huella: Optional[bytes] = None,
+                      clase: Optional[str] = None) -> int:
+        """
+        Envía un mensaje en modo fiable: el receptor confirma con SACK y solo
+        se retransmiten los fragmentos perdidos. Necesita el hilo de recepción
+        en marcha (procesa los SACK) y bloquea hasta la confirmación completa.
+
+        Args:
+            mac_destino: MAC destino
+            tipo_mensaje: Tipo_Mensaje.texto o Tipo_Mensaje.archivo
+            datos: Mensaje o FuenteFragmentos (p. ej. un archivo con su metadata)
+            progress_callback: Callback (archivo_nombre, confirmados, total, bytes_enviados)
+            archivo_nombre: Nombre que se pasa al callback de progreso
+            huella: Huella del contenido (fiable.huella_contenido) para que la
+                transferencia se pueda reanudar si se interrumpe
+            clase: Clase del planificador (por defecto masiva para archivos e interactiva para texto)
+
+        Returns:
+            int: Bytes enviados, retransmisiones incluidas
+        """
+        if isinstance(datos, str):
+            datos = datos.encode('utf-8')
+        fuente = datos if isinstance(datos, FuenteFragmentos) else FuenteFragmentos(datos=datos)
+        total_bytes = self.fiable.enviar(mac_destino, tipo_mensaje, fuente, progress_callback, archivo_nombre,
+                                         huella, clase)
+        if Tipo_Mensaje.from_value(tipo_mensaje) == Tipo_Mensaje.archivo:
+            self.estadisticas['archivos_enviados'] += 1
+        else:
+            self.estadisticas['mensajes_enviados'] += 1
+            self.estadisticas['mensajes_fragmentados'] += 1
+        return total_bytes
+
+    def enviar_protocolo(self, frames, clase: str = CLASE_CONTROL):
+        """
+        Envía frames de protocolo (discovery, seguridad, etc.) y actualiza estadísticas.
+        Con el bucle de E/S en marcha se encolan en él y la llamada no bloquea.
+        Por defecto van en la clase de control, por delante de chat y archivos.
+        """
+        if self.bucle.ejecutando:
+            if self.agrupador is None or not self._agrupar(frames, clase):
+                self.enviar_en_segundo_plano(frames, clase=clase)
+            total_bytes = sum(len(frame) for frame in frames)
+        else:
+            total_bytes = self.enviar_frame(frames, contar_como_mensaje_usuario=False, clase=clase)
         if len(frames) > 0:
             self.estadisticas['frames_protocolo_enviados'] += 1
         return total_bytes
 
     def receive_frame(self, buff_size=65535):
         try:
-            print("👂 RECEIVE_FRAME: Esperando frame...")
             frame, addr = self.mi_socket.recvfrom(buff_size)
-            print(f"Frame recibido de {addr}: {len(frame)} bytes")
+            if log.isEnabledFor(TRAZA):
+                log.log(TRAZA, "Frame recibido de %s: %d bytes", addr, len(frame))
             return frame
         except socket.timeout:
             return None
         except Exception as e:
-            print(f"Error en receive_frame: {e}")
+            log.error("Error en receive_frame: %s", e)
             return None
         
     def receive_thread(self, stop_event):
+        """
+        Hilo de E/S: ejecuta el bucle de eventos (recepción, envíos encolados
+        y temporizadores). No hay timeouts periódicos; stop() despierta el
+        bucle al instante, por lo que quien use `stop_event` debe llamar
+        también a stop().
+        """
         try:
-            # Configurar timeout para verificar stop_event periódicamente
-            self.mi_socket.settimeout(1.0)
-            print("🎧 RECEIVE_THREAD: Iniciado")
-
-            frame_count = 0
-            our_protocol_count = 0
-            our_mac_count = 0
-            broadcast_count = 0
-            other_mac_count = 0
-            
-            while not stop_event.is_set():
-                try:
-                    frame = self.receive_frame()
-
-                    if frame is None:
-                        continue  # Continuar con la siguiente iteración
-
-                    frame_count += 1
-                    if len(frame) >= 14:  # Mínimo para cabecera Ethernet
-                        # Extraer MAC destino (primeros 6 bytes)
-                        mac_dest_bytes = frame[0:6]
-                        mac_dest = ':'.join(f'{b:02x}' for b in mac_dest_bytes).upper()
-                        
-                        # Extraer MAC origen (siguientes 6 bytes)
-                        mac_orig_bytes = frame[6:12]
-                        mac_orig = ':'.join(f'{b:02x}' for b in mac_orig_bytes).upper()
-                        
-                        # Extraer EtherType
-                        eth_type = struct.unpack('>H', frame[12:14])[0]
-                            
-                        # Determinar tipo de frame
-                        if eth_type == 0x88B5:
-                            our_protocol_count += 1
-                            frame_type = "NUESTRO_PROTOCOLO"
-                        else:
-                            frame_type = f"OTRO_PROTOCOLO(0x{eth_type:04x})"
-                            
-                        # Determinar destino
-                        if mac_dest == "FF:FF:FF:FF:FF:FF":
-                            broadcast_count += 1
-                            dest_type = "BROADCAST"
-                        elif mac_dest == self.mac_ori.upper():
-                            our_mac_count += 1
-                            dest_type = "NUESTRA_MAC"
-                        else:
-                            other_mac_count += 1
-                            dest_type = "OTRA_MAC"
-                            
-                        # Mostrar información del frame
-                        print(f"📥 Frame #{frame_count}: {dest_type} | {frame_type}")
-                        print(f"   - Destino: {mac_dest} | Origen: {mac_orig}")
-                        print(f"   - Tamaño: {len(frame)} bytes")
-                            
-                        # Solo procesar frames de nuestro protocolo
-                        if eth_type == 0x88B5:
-                            decoded_frame = self.decodificar_frame(frame)
-                            if decoded_frame:
-                                self.cola_mensajes.put(decoded_frame)
-                            else:
-                                print(f"📥 Frame #{frame_count}: Tamaño insuficiente ({len(frame)} bytes)")
-                            
-                except socket.timeout:
-                    # Timeout normal, continuar
-                    continue
+            if stop_event.is_set():
+                return
+            lector = self.lector_recepcion()
+            self.bucle.registrar_lector(self.mi_socket.fileno(), lector)
+            self.bucle.ejecutar()
         except Exception as e:
-            print(f"❌ Error en receive_thread: {e}")
+            log.error("❌ Error en receive_thread: %s", e)
         finally:
             self.stop()
 
+    def lector_recepcion(self) -> Callable[[], None]:
+        """
+        Callback que drena el socket con el backend configurado. Se llama
+        cada vez que el socket tiene datos (BucleEventos o loop.add_reader).
+        """
+        if self.anillo_rx is not None:
+            log.info("🎧 Recepción iniciada (backend PACKET_RX_RING)")
+            return self._leer_anillo
+        if self.receptor_lotes is not None:
+            log.info("🎧 Recepción iniciada (backend por lotes, buffers de %d bytes)",
+                     self.receptor_lotes.tamaño_buffer)
+            return self._leer_lotes
+        log.info("🎧 Recepción iniciada (backend recvfrom)")
+        self.buffer_recepcion = bytearray(65535)
+        return self._leer_recvfrom
+
+    def _leer_lotes(self):
+        """Backend por defecto: el socket tiene datos, drenarlo por lotes"""
+        receptor = self.receptor_lotes
+        while True:
+            lote = receptor.recibir_lote()
+            if lote:
+                self._procesar_lote(lote)
+            if receptor.agotado:
+                break
+
+    def _procesar_lote(self, lote):
+        """Decodifica un lote completo; las vistas se reutilizan al volver"""
+        procesar = self._procesar_frame_recibido
+        for frame in lote:
+            procesar(frame)
+
+    def _leer_recvfrom(self):
+        """Backend simple: recv_into sobre un buffer reutilizable hasta vaciar el socket (máx. un turno)"""
+        recv_into = self.mi_socket.recv_into
+        buffer = self.buffer_recepcion
+        for _ in range(self.frames_por_turno):
+            try:
+                n = recv_into(buffer, 0, MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return
+            # La vista solo es válida hasta el siguiente recv_into: el payload
+            # se copia a su destino final dentro de _procesar_frame_recibido
+            with memoryview(buffer) as vista:
+                self._procesar_frame_recibido(vista[:n])
+
+    def _leer_anillo(self):
+        """Backend PACKET_RX_RING: drenar todos los bloques listos"""
+        for vista in self.anillo_rx.frames():
+            # Sin copia: el payload se copia a su destino antes de devolver el bloque al kernel
+            self._procesar_frame_recibido(vista)
+
+    def enviar_en_segundo_plano(self, frames, al_terminar: Optional[Callable[[int], None]] = None,
+                                clase: str = CLASE_CONTROL,
+                                al_enviar: Optional[Callable[[FlujoEnvio], None]] = None) -> FlujoEnvio:
+        """
+        Registra frames en el planificador sin esperar: los transmite el hilo
+        de E/S respetando el pacer con temporizadores (sin dormir),
+        intercalados con la recepción, o el hilo que esté enviando en ese momento.
+
+        Args:
+            frames: Lista o generador de frames
+            al_terminar: Callback opcional con los bytes enviados, llamado desde el hilo que los transmita
+            clase: Clase del planificador
+            al_enviar: Callback opcional tras cada frame, también desde el hilo que los transmita
+
+        Returns:
+            FlujoEnvio: El flujo registrado (su `error` indica si falló)
+        """
+        flujo = self.planificador.registrar(frames, clase, al_enviar, al_terminar)
+        self.bucle.llamar_desde_hilo(self._bombear_envios)
+        return flujo
+
+    def _despertar_envios(self):
+        """Quedan flujos sin conductor: que los transmita el bucle de E/S"""
+        if not self.bucle.ejecutando:
+            return
+        if self.bucle.en_hilo_del_bucle():
+            if self.temporizador_envio is None:
+                # Con un temporizador (no una llamada pendiente) la recepción corre antes del siguiente turno
+                self.temporizador_envio = self.bucle.llamar_en(0, self._bombear_envios, True)
+        else:
+            self.bucle.llamar_desde_hilo(self._bombear_envios)
+
+    def _bombear_envios(self, desde_temporizador: bool = False):
+        """Transmite lo planificado hasta que el pacer pida esperar o se agote el turno"""
+        if self.temporizador_envio is not None and not desde_temporizador:
+            return  # Ya hay un temporizador que reanudará el envío
+        self.temporizador_envio = None
+        planificador = self.planificador
+        if not planificador.tomar_turno(bloquear=False):
+            return  # Conduce otro hilo: también transmitirá estos flujos
+        enviados = 0
+        turno, inicio, reservado = None, 0, False
+        if self.envio_retenido is not None:
+            (turno, inicio), self.envio_retenido = self.envio_retenido, None
+            reservado = True
+        while turno is not None or (enviados < self.frames_por_turno and not planificador.hay_esperando()):
+            if turno is None:
+                turno, inicio, reservado = planificador.turno(), 0, False
+                if turno is None:
+                    break
+            pausa = self._transmitir_turno(*turno, inicio=inicio, con_temporizador=True, reservado=reservado)
+            if pausa is not None:
+                # Se conserva el turno para no desordenar el flujo del frame retenido
+                self.envio_retenido = (turno, pausa[0])
+                self.temporizador_envio = self.bucle.llamar_en(pausa[1], self._bombear_envios, True)
+                return
+            enviados += len(turno[1]) - inicio
+            turno = None
+        self._vaciar_anillo_tx()
+        # Cede el turno a un hilo que espere o, si no hay, sigue en el próximo giro del bucle
+        planificador.soltar_turno()
+
+    def _procesar_frame_recibido(self, frame):
+        """
+        Clasifica un frame recibido y encola el mensaje decodificado.
+        `frame` puede ser una memoryview sobre un buffer que se reutiliza:
+        nada de lo encolado puede seguir apuntando a ella.
+        """
+        self.frames_recibidos_total += 1
+        if len(frame) < 14:  # Mínimo para cabecera Ethernet
+            return
+        eth_type = struct.unpack_from('>H', frame, 12)[0]
+        if log.isEnabledFor(TRAZA):
+            mac_dest = frame[0:6].hex(':').upper()
+            if mac_dest == "FF:FF:FF:FF:FF:FF":
+                dest_type = "BROADCAST"
+            elif mac_dest == self.mac_ori.upper():
+                dest_type = "NUESTRA_MAC"
+            else:
+                dest_type = "OTRA_MAC"
+            log.log(TRAZA, "📥 Frame #%d: %s | EtherType 0x%04x | Destino: %s | Origen: %s | %d bytes",
+                    self.frames_recibidos_total, dest_type, eth_type, mac_dest,
+                    frame[6:12].hex(':').upper(), len(frame))
+
+        # Solo procesar frames de nuestro protocolo
+        if eth_type == 0x88B5:
+            decoded_frame = self.decodificar_frame(frame)
+            if decoded_frame:
+                self.cola_mensajes.put(decoded_frame)
+
 
     def crear_frame(self, mac_destino: str, tipo_mensaje: int, mensaje: Union[bytes, str], nombre_archivo: str = None) -> bytes:
         """
@@ -212,13 +691,12 @@ class Envio_recibo_frames:
 
         # Calcular longitud
         longitud = len(mensaj_bytes)
-        id_mensaje = int(time.time() * 1000) % 65536
-        offset = 0
+        id_mensaje = self.nuevo_id_mensaje(mac_destino)
         el_origen = self.mac_ori 
-        numero_fragmento = 0
         frames =[]
+        tamaño_fragmento = self.payload_maximo(mac_destino)
 
-        if(longitud <= 1475):
+        if(longitud <= tamaño_fragmento):
             # Construir frame
             frame = Frame(
                 destino = mac_destino,
@@ -230,114 +708,265 @@ class Envio_recibo_frames:
                 Datos= mensaj_bytes
             )
         
-            print(f"📦 Frame creado:")
-            print(f"   → MAC destino: {mac_destino}")
-            print(f"   → MAC origen:  {self.mac_ori}")
-            print(f"   → EtherType:   0x{self.tipo_protocolo:04x}")
-            print(f"   → Tipo:        {tipo_mensaje}")
-            print(f"   → Longitud:    {longitud} bytes")
-            print(f"   → Datos:       '{mensaje[:50]}{'...' if len(mensaje) > 50 else ''}'")
+            log.debug("📦 Frame creado: %s → %s, tipo %s, %d bytes", self.mac_ori, mac_destino,
+                      tipo_mensaje, longitud)
             #print(f"🔧 Frame completo: {len(frame)} bytes")
             frames.append(frame.hacia_bytes())
             return frames
     
          # Fragmentar el mensaje
-        total_fragmentos = (longitud + 1475 - 1) // 1475
-        
-        # Verificar límites para evitar overflow
-        if total_fragmentos > 0xFFFFFFFF:  # 4 bytes máximo
-            raise ValueError(f"Archivo demasiado grande: requiere {total_fragmentos} fragmentos (máximo: {0xFFFFFFFF})")
+        total_fragmentos = self.calcular_total_fragmentos(longitud, tamaño_fragmento)
         
-        print(f"🔧 Fragmentando mensaje en {total_fragmentos} partes")
-        print(f"🔧 Tamaño total: {longitud} bytes ({longitud / (1024*1024):.1f} MB)")
-        print(f"🔧 Fragmentos por MB: ~{1024*1024 // 1475}")
+        log.debug("🔧 Fragmentando mensaje en %d partes (%d bytes)", total_fragmentos, longitud)
         
         if total_fragmentos > 100000:  # Advertencia para archivos muy grandes
-            print(f"⚠️  ARCHIVO MUY GRANDE: {total_fragmentos} fragmentos pueden tomar varios minutos")
+            log.warning("⚠️  ARCHIVO MUY GRANDE: %d fragmentos pueden tomar varios minutos", total_fragmentos)
 
         # Fragmentar el mensaje
-        while offset < longitud:
-            chunk = mensaj_bytes[offset:offset + 1475]
-            offset += 1475
-
-            frame = Frame(
-                destino=mac_destino,
-                origen=self.mac_ori,
-                tipo_mensaje=tipo_mensaje,
-                id=id_mensaje,
-                fragment_num=numero_fragmento,
-                total=total_fragmentos,
-                Datos=chunk
-            )
-            frame_bytes = frame.hacia_bytes()
-            frames.append(frame_bytes)
-            numero_fragmento += 1
+        trozos = (mensaj_bytes[inicio:inicio + tamaño_fragmento] for inicio in range(0, longitud, tamaño_fragmento))
+        frames.extend(self.crear_frames_stream(mac_destino, tipo_mensaje, trozos, longitud, id_mensaje,
+                                               tamaño_fragmento))
 
         return frames
+
+    def crear_frames_stream(self, mac_destino: str, tipo_mensaje: int, trozos, longitud: int, id_mensaje: int = None,
+                            tamaño_fragmento: Optional[int] = None):
+        """
+        Generador que construye cada frame justo antes de enviarlo.
+
+        Args:
+            mac_destino: MAC de destino
+            tipo_mensaje: Tipo de mensaje del frame
+            trozos: Iterable de payloads de `tamaño_fragmento` bytes (el último, menos)
+            longitud: Longitud total del mensaje (para calcular total_fragmentos)
+            id_mensaje: ID del mensaje; se genera uno si no se indica
+            tamaño_fragmento: Bytes por trozo (por defecto, payload_maximo(mac_destino))
+
+        Yields:
+            bytes: Frame listo para enviar
+        """
+        # Campos constantes del mensaje: se convierten una sola vez
+        destino = mac_a_bytes(mac_destino)
+        if tamaño_fragmento is None:
+            tamaño_fragmento = self.payload_maximo(destino)
+        total_fragmentos = self.calcular_total_fragmentos(longitud, tamaño_fragmento)
+        if id_mensaje is None:
+            id_mensaje = self.nuevo_id_mensaje(destino)
+        origen = mac_a_bytes(self.mac_ori)
+        tipo = tipo_mensaje.value if isinstance(tipo_mensaje, Tipo_Mensaje) else int(tipo_mensaje)
+
+        fec = self._codificador_fec(destino, total_fragmentos)
+        if fec is None:
+            for numero_fragmento, chunk in enumerate(trozos):
+                yield codificar(destino, origen, tipo, id_mensaje, numero_fragmento, total_fragmentos, chunk)
+            return
+
+        reparacion = Tipo_Mensaje.reparacion.value
+        for numero, es_reparacion, payload in fec.intercalar(trozos, tipo):
+            yield codificar(destino, origen, reparacion if es_reparacion else tipo, id_mensaje, numero,
+                            total_fragmentos, payload)
+
+    def nuevo_id_mensaje(self, destino: Union[str, bytes, None] = None) -> int:
+        """
+        Siguiente ID de mensaje. Con pares que admiten la cabecera v2 es de
+        32 bits y por encima de MAX_ID_V1 (el id decide la cabecera, ver
+        codec.py); con el resto, y en broadcast, de 16 bits.
+        """
+        secuencia = next(self.ids_mensaje)
+        if self.usa_cabecera_v2(destino):
+            return MAX_ID_V1 + 1 + secuencia % (MAX_ID_V2 - MAX_ID_V1)
+        return secuencia % (MAX_ID_V1 + 1)
+
+    def usa_cabecera_v2(self, destino: Union[str, bytes, None]) -> bool:
+        """True si los mensajes a `destino` llevan la cabecera con id de 32 bits"""
+        if self.version_cabecera is not None:
+            return self.version_cabecera >= 2
+        if destino is None:
+            return False
+        if isinstance(destino, str):
+            destino = mac_a_bytes(destino)
+        return destino in self.pares_v2
+
+    def registrar_version_par(self, mac: Union[str, bytes], admite_v2: bool):
+        """Anota si un par admite la cabecera v2 (lo llama discovery con sus capacidades)"""
+        if isinstance(mac, str):
+            mac = mac_a_bytes(mac)
+        if admite_v2 and mac not in self.pares_v2:
+            self.pares_v2.add(mac)
+            log.info("🆔 %s admite IDs de 32 bits (cabecera v2)", bytes_a_mac(mac))
+        elif not admite_v2:
+            self.pares_v2.discard(mac)
+
+    def payload_maximo(self, destino: Union[str, bytes, None] = None) -> int:
+        """
+        Bytes de datos por frame hacia `destino`, según la menor MTU de los dos
+        extremos. Con pares que no anuncian su MTU, y en broadcast, como mucho
+        la de Ethernet estándar: el receptor reensambla con el tamaño de
+        fragmento que recibe, pero el frame tiene que caber en su interfaz.
+        """
+        if isinstance(destino, str):
+            destino = mac_a_bytes(destino)
+        return payload_para_mtu(min(self.mtu, self.mtu_pares.get(destino, MTU_ESTANDAR)))
+
+    def registrar_mtu_par(self, mac: Union[str, bytes], mtu: Optional[int]):
+        """Anota la MTU que anuncia un par en discovery (None o no válida = Ethernet estándar)"""
+        if isinstance(mac, str):
+            mac = mac_a_bytes(mac)
+        if not isinstance(mtu, int) or not MTU_MINIMA <= mtu <= 0xFFFF:
+            mtu = MTU_ESTANDAR
+        anterior = self.mtu_pares.get(mac, MTU_ESTANDAR)
+        if mtu == MTU_ESTANDAR:
+            self.mtu_pares.pop(mac, None)
+        else:
+            self.mtu_pares[mac] = mtu
+        if mtu != anterior:
+            log.info("📏 %s anuncia MTU %d: fragmentos de %d bytes", bytes_a_mac(mac), mtu, self.payload_maximo(mac))
+
+    @staticmethod
+    def calcular_total_fragmentos(longitud: int, tamaño_fragmento: int = PAYLOAD_MAXIMO) -> int:
+        """Total de fragmentos que se anuncia en la cabecera (0 = frame único)"""
+        if longitud <= tamaño_fragmento:
+            return 0
+        total_fragmentos = (longitud + tamaño_fragmento - 1) // tamaño_fragmento
+        if total_fragmentos > 0xFFFFFFFF:  # 4 bytes máximo
+            raise ValueError(f"Archivo demasiado grande: requiere {total_fragmentos} fragmentos (máximo: {0xFFFFFFFF})")
+        return total_fragmentos
     
+    def calcular_total_frames(self, mac_destino: str, longitud: int) -> int:
+        """Frames que genera crear_frames_stream para un mensaje, reparaciones FEC incluidas"""
+        destino = mac_a_bytes(mac_destino)
+        total_fragmentos = self.calcular_total_fragmentos(longitud, self.payload_maximo(destino))
+        fec = self._codificador_fec(destino, total_fragmentos)
+        return max(1, fec.frames_totales(total_fragmentos) if fec is not None else total_fragmentos)
+
     def decodificar_frame(self, frame_: bytes):
         """Decodifica un frame recibido"""
-        print(f"🔧 DECODIFICANDO Frame: {len(frame_)} bytes")
-       
+        traza = log.isEnabledFor(TRAZA)
         try:
             frame = Frame.desde_bytes(frame_)
-            print(f"🔧 Frame decodificado: Destino={frame.mac_destino}, Origen={frame.mac_origen}, Tipo={frame.tipo_mensaje}")
         except ValueError as e:
-            print(f"Error parsing frame: {e}")
-            return None
-        
-        if not frame.verify_crc(frame_):
-            print("Error: CRC no coincide, descartando frame")  
+            log.warning("Error parsing frame: %s", e)
             return None
         
         #verificar si es pa mi
-        mac_propia = self.mac_ori.upper()
-        mac_destino_frame = frame.mac_destino.upper()
-        print(f"🔍 Verificando destino: Frame para {mac_destino_frame}, nuestra MAC: {mac_propia}")
-        if mac_destino_frame != mac_propia and mac_destino_frame != "FF:FF:FF:FF:FF:FF":
-            print(f"❌ Frame descartado: no es para nosotros")
+        if frame.destino not in self.destinos_aceptados:
+            if traza:
+                log.log(TRAZA, "❌ Frame descartado: para %s, no es para nosotros", frame.mac_destino)
+            return None
+
+        # Los fragmentos de un mensaje con cabecera de integridad ya cargada se
+        # comprueban por trozos (integridad.py): su CRC no aporta nada
+        if (frame.total_fragmentos > 1 and frame.tipo_mensaje in _TIPOS_DATOS and
+                self.fragment_manager.cubierto_por_integridad(frame.id_mensaje, frame.total_fragmentos,
+                                                              frame.mac_origen)):
+            self.frames_crc_omitidos += 1
+        elif not frame.verify_crc(frame_):
+            self.frames_crc_incorrecto += 1
+            log.debug("❌ CRC incorrecto, frame descartado (%d en total)", self.frames_crc_incorrecto)
             return None
-        
-        print(f"✅ Frame aceptado: es para nosotros")
+
+        self.bytes_payload_recibidos += frame.longitud
+        if frame.id_mensaje > MAX_ID_V1 and frame.origen not in self.pares_v2:
+            # Quien envía la cabecera v2 también la entiende
+            self.registrar_version_par(frame.origen, True)
+
+        if frame.tipo_mensaje is Tipo_Mensaje.control:
+            self.fiable.procesar_control(frame)
+            return None
+
+        if frame.tipo_mensaje is Tipo_Mensaje.reparacion:
+            return self._procesar_reparacion(frame)
+
+        if frame.tipo_mensaje is Tipo_Mensaje.agrupado:
+            return self._procesar_agrupado(frame)
 
         # Verificar si es un fragmento (aplicable tanto a archivos como texto)
         if frame.total_fragmentos > 1:
-            print(f"🔧 Frame fragmentado detectado: {frame.fragmento+1}/{frame.total_fragmentos}")
+            if traza:
+                log.log(TRAZA, "🔧 Fragmento %d/%d de %s (id %d, %d bytes)", frame.fragmento + 1,
+                        frame.total_fragmentos, frame.mac_origen, frame.id_mensaje, len(frame.datos))
             return self._procesar_fragmento(frame)
         else:
             # Frame completo (no fragmentado)
             return self.process_complete_frame(frame)
         
+    def _procesar_agrupado(self, frame: Frame):
+        """
+        Separa los mensajes de un frame agrupado. Se encolan todos menos el
+        último, que se retorna como cualquier otro mensaje: el orden se conserva.
+        """
+        if frame.origen not in self.pares_agrupacion:
+            self.registrar_agrupacion_par(frame.origen, True)  # Quien los envía también los entiende
+        mensajes = []
+        try:
+            for tipo, datos in registros(frame.datos):
+                if tipo not in TIPOS_AGRUPABLES:
+                    log.warning("⚠️ Tipo %d no válido en un frame agrupado de %s", tipo, frame.mac_origen)
+                    continue
+                mensaje = Frame(frame.destino, frame.origen, Tipo_Mensaje(tipo), frame.id_mensaje, 0, 0, datos)
+                mensajes.append(self.process_complete_frame(mensaje))
+        except ValueError as e:
+            log.warning("⚠️ Frame agrupado de %s incompleto: %s", frame.mac_origen, e)
+        for mensaje in mensajes[:-1]:
+            self.cola_mensajes.put(mensaje)
+        return mensajes[-1] if mensajes else None
+
+    def _materializar_payload(self, frame: Frame):
+        """
+        Copia el payload de un frame único (memoryview sobre el buffer de
+        recepción) a su destino final: texto decodificado o bytes.
+        """
+        vista = frame.datos
+        self.bytes_payload_copiados += len(vista)
+        if frame.tipo_mensaje == Tipo_Mensaje.texto:
+            try:
+                frame.datos = str(vista, 'utf-8')
+                return
+            except UnicodeDecodeError:
+                log.warning("Error decodificando payload de texto")
+        frame.datos = bytes(vista)
+
     def process_complete_frame(self, frame: Frame) -> Frame:
         """Procesa un frame que ya está completo (no fragmentado)"""
+        if isinstance(frame.datos, memoryview):
+            self._materializar_payload(frame)
+        if isinstance(frame.datos, MensajeEnDisco):
+            if frame.tipo_mensaje == Tipo_Mensaje.archivo:
+                # Reensamblado en disco: se entrega la ruta, sin cargarlo en memoria
+                log.info("💾 Archivo reensamblado en disco: %s", frame.datos.ruta)
+                return frame
+            mensaje_disco = frame.datos
+            frame.datos = mensaje_disco.leer()
+            mensaje_disco.eliminar()
         if frame.tipo_mensaje == Tipo_Mensaje.texto:    
+            if isinstance(frame.datos, str):
+                return frame
             try:
                 frame.datos = frame.datos.decode('utf-8')
             except Exception:
-                print("Error decodificando payload de texto")
+                log.warning("Error decodificando payload de texto")
         elif frame.tipo_mensaje == Tipo_Mensaje.archivo:
             try:
-                print(f"🔧 Procesando frame de archivo")
-                print(f"📊 Datos recibidos: {len(frame.datos)} bytes")
+                log.debug("🔧 Procesando frame de archivo: %d bytes", len(frame.datos))
                 
                 # Verificar si es el nuevo formato FILE_TRANSFER
                 if frame.datos:
                     try:
-                        if isinstance(frame.datos, bytes):
-                            datos_str = frame.datos.decode('utf-8', errors='ignore')
+                        if isinstance(frame.datos, (bytes, bytearray)):
+                            datos_str = frame.datos[:14].decode('utf-8', errors='ignore')
                         else:
                             datos_str = str(frame.datos)
                         
                         # Nuevo formato unificado
                         if datos_str.startswith("FILE_TRANSFER:"):
-                            print("✅ Archivo con formato unificado detectado")
+                            log.debug("✅ Archivo con formato unificado detectado")
                             return frame
                     except:
                         pass
                 
                 # Si los datos están vacíos pero nombre_archivo tiene contenido (sistema legacy)
                 if not frame.datos and hasattr(frame, 'nombre_archivo') and frame.nombre_archivo:
-                    print("⚠️  Datos vacíos, usando nombre_archivo como datos")
+                    log.warning("⚠️  Datos vacíos, usando nombre_archivo como datos")
                     
                     # Si el nombre_archivo contiene metadata FILE_, procesarlo como archivo fragmentado legacy
                     if frame.nombre_archivo.startswith(('FILE_METADATA:', 'FILE_CHUNK:', 'FILE_END:')):
@@ -357,29 +986,24 @@ class Envio_recibo_frames:
                             frame.nombre_archivo = nombre_archivo
                             frame.datos = datos_archivo
                             
-                            print(f"✅ Archivo legacy procesado: {nombre_archivo}, {len(datos_archivo)} bytes")
+                            log.info("✅ Archivo legacy procesado: %s, %d bytes", nombre_archivo, len(datos_archivo))
                             return frame
                     except Exception as e:
-                        print(f"❌ Error procesando estructura legacy: {e}")
+                        log.error("❌ Error procesando estructura legacy: %s", e)
                 
                 # Si llegamos aquí, mantener el frame como está
                 return frame
                 
             except Exception as e:
-                print(f"❌ Error en process_file_frame: {e}")
+                log.error("❌ Error en process_file_frame: %s", e)
         return frame
                 
                     
     def _procesar_fragmento(self, frame: Frame):
         try:
             """Procesa un fragmento de mensaje y reensambla cuando está completo"""
-            print(f"🔧 _procesar_fragmento: Fragmento {frame.fragmento}/{frame.total_fragmentos}")
-            print(f"🔧 _procesar_fragmento: ID mensaje: {frame.id_mensaje}")
-            print(f"🔧 _procesar_fragmento: MAC origen: {frame.mac_origen}")
-            print(f"🔧 _procesar_fragmento: Tamaño datos: {len(frame.datos)} bytes")
-            
             if frame.datos is None or len(frame.datos) == 0:
-                print(f"❌ _procesar_fragmento: Fragmento {frame.fragmento} tiene datos vacíos")
+                log.warning("❌ _procesar_fragmento: Fragmento %d tiene datos vacíos", frame.fragmento)
                 return None
         
             # Determinar el total real de fragmentos
@@ -387,8 +1011,10 @@ class Envio_recibo_frames:
                 total_real = frame.fragmento + 1
             else:
                 total_real = frame.total_fragmentos
-            
-            print(f"🔧 Total real de fragmentos: {total_real}")
+
+
+            if self.fiable.descartar_fragmento(frame):
+                return None
 
             # Usar el FragmentManager para manejar la fragmentación
             mensaje_completo = self.fragment_manager.agregar_fragmento(
@@ -398,45 +1024,109 @@ class Envio_recibo_frames:
                 frame.datos,
                 frame.mac_origen
             )
+            self.fiable.al_recibir_fragmento(frame, mensaje_completo is not None)
             
             if mensaje_completo is not None:
-                print(f"🎉 MENSAJE COMPLETO REENSAMBLADO: {len(mensaje_completo)} bytes")
-                
-                # Crear un nuevo frame con el mensaje completo
-                frame_completo = Frame(
-                    destino=frame.mac_destino,
-                    origen=frame.mac_origen,
-                    tipo_mensaje=frame.tipo_mensaje,
-                    id=frame.id_mensaje,
-                    fragment_num=0,
-                    total=0,
-                    Datos=mensaje_completo
-                )
-                
-                return self.process_complete_frame(frame_completo)
+                return self._mensaje_reensamblado(frame, frame.tipo_mensaje, mensaje_completo)
             else:
-                # Aún faltan fragmentos - MOSTRAR ESTADO ACTUAL
-                estado = self.fragment_manager.obtener_estado_ensamblaje()
-                print(f"📦 Esperando más fragmentos... Estado: {estado}")
+                # Aún faltan fragmentos
+                if log.isEnabledFor(TRAZA):
+                    log.log(TRAZA, "📦 Esperando más fragmentos... Estado: %s",
+                            self.fragment_manager.obtener_estado_ensamblaje())
                 return None
                     
         except Exception as e:
-            print(f"❌ Error procesando fragmento: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("❌ Error procesando fragmento: %s", e)
             return None
 
+    def _mensaje_reensamblado(self, frame: Frame, tipo_mensaje: Tipo_Mensaje, mensaje_completo):
+        """Entrega como un frame único el mensaje que `frame` acaba de completar"""
+        log.info("🎉 MENSAJE COMPLETO REENSAMBLADO: %d bytes", len(mensaje_completo))
+
+        # Crear un nuevo frame con el mensaje completo
+        frame_completo = Frame(
+            destino=frame.destino,
+            origen=frame.origen,
+            tipo_mensaje=tipo_mensaje,
+            id=frame.id_mensaje,
+            fragment_num=0,
+            total=0,
+            Datos=mensaje_completo
+        )
+
+        return self.process_complete_frame(frame_completo)
+
+    def _procesar_reparacion(self, frame: Frame):
+        """Procesa un fragmento de reparación FEC: puede recuperar pérdidas y completar el mensaje"""
+        try:
+            tipo, k, m, indice, longitud_ultimo = CABECERA_REPARACION.unpack_from(frame.datos)
+            tipo_mensaje = Tipo_Mensaje.from_value(tipo)
+        except (struct.error, ValueError) as e:
+            log.warning("❌ Reparación FEC no válida de %s: %s", frame.mac_origen, e)
+            return None
+        mensaje_completo = self.fragment_manager.agregar_reparacion(
+            frame.id_mensaje,
+            frame.fragmento,
+            frame.total_fragmentos,
+            k, m, indice, longitud_ultimo,
+            frame.datos[CABECERA_REPARACION.size:],
+            frame.mac_origen
+        )
+        if mensaje_completo is None:
+            return None
+        return self._mensaje_reensamblado(frame, tipo_mensaje, mensaje_completo)
+
     def stop(self):
         """Detiene la ejecución"""
         self.ejecutando = False
+        # Despierta el bucle de E/S y espera a que salga antes de cerrar lo que usa
+        self.bucle.detener()
+        if self.cerrado:
+            return
+        self.cerrado = True
+        if self.anillo_rx is not None:
+            self.anillo_rx.cerrar()
+            self.anillo_rx = None
+        if self.anillo_tx is not None:
+            self.anillo_tx.cerrar()
+            self.anillo_tx = None
+        if self.receptor_lotes is not None:
+            self.receptor_lotes.cerrar()
         if self.mi_socket:
             self.mi_socket.close()
-        print(" Comunicación detenida")
+        # Lo recibido de transferencias reanudables se conserva para la próxima vez; el resto se borra
+        self.fragment_manager.cerrar()
+        if not self.bucle.ejecutando:
+            self.bucle.cerrar()
+        log.info(" Comunicación detenida")
+
+    def copias_por_byte(self) -> float:
+        """
+        Copias en espacio de usuario por byte de payload recibido. Con la ruta
+        sin copias vale 1.0 (solo la copia al destino final); si sube, alguien
+        ha vuelto a copiar el payload por el camino.
+        """
+        if not self.bytes_payload_recibidos:
+            return 0.0
+        copiados = self.bytes_payload_copiados + self.fragment_manager.bytes_copiados
+        return copiados / self.bytes_payload_recibidos
 
     def obtener_estadisticas(self):
         """Retorna estadísticas de fragmentación"""
         estado_ensamblaje = self.fragment_manager.obtener_estado_ensamblaje()
-        return {**self.estadisticas, **estado_ensamblaje}
+        estado_recepcion = self.receptor_lotes.estado() if self.receptor_lotes is not None else {}
+        return {**self.estadisticas, **estado_ensamblaje, **self.obtener_estadisticas_kernel(), **self.pacer.estado(),
+                **estado_recepcion, **self.bucle.estado(), **self.fiable.estado(), **self.planificador.estado(),
+                **(self.agrupador.estado() if self.agrupador is not None else {}),
+                'copias_por_byte_recibido': self.copias_por_byte(),
+                'fec_reparaciones_recibidas': self.fragment_manager.reparaciones_recibidas,
+                'fec_fragmentos_reparados': self.fragment_manager.fragmentos_reparados,
+                'trozos_verificados': self.fragment_manager.trozos_verificados,
+                'trozos_corruptos': self.fragment_manager.trozos_corruptos,
+                'frames_crc_incorrecto': self.frames_crc_incorrecto,
+                'frames_crc_omitidos': self.frames_crc_omitidos,
+                'mtu_interfaz': self.mtu,
+                'pares_mtu_distinta': len(self.mtu_pares)}
     
     def reiniciar_estadisticas(self):
         """Reinicia las estadísticas a cero"""
@@ -450,5 +1140,5 @@ class Envio_recibo_frames:
             'archivos_recibidos': 0,         # Archivos recibidos
             'frames_protocolo_enviados': 0   # Frames de protocolo (discovery, seguridad, etc.)
         }
-        print("📊 Estadísticas reiniciadas")
+        log.info("📊 Estadísticas reiniciadas")
     
\ No newline at end of file
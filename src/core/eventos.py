@@ -0,0 +1,180 @@
+import heapq
+import itertools
+import os
+import selectors
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from .registro import obtener_logger
+
+log = obtener_logger(__name__)
+
+
+class Temporizador:
+    """Llamada programada en un BucleEventos; cancelar() la anula"""
+    __slots__ = ('instante', 'callback', 'args', 'intervalo', 'cancelado')
+
+    def __init__(self, instante: float, callback: Callable, args: tuple, intervalo: Optional[float] = None):
+        self.instante = instante
+        self.callback = callback
+        self.args = args
+        self.intervalo = intervalo
+        self.cancelado = False
+
+    def cancelar(self):
+        self.cancelado = True
+
+
+class BucleEventos:
+    """
+    Bucle de E/S sobre selectors (epoll en Linux) para un único hilo.
+
+    Vigila descriptores de lectura, ejecuta temporizadores y llamadas
+    encoladas desde otros hilos. Un eventfd (o un self-pipe si no existe)
+    despierta el bucle al instante para detenerlo o cuando otro hilo
+    encola trabajo, así que select() puede bloquear sin timeout mientras
+    no haya temporizadores: sin despertares en vacío con el enlace inactivo.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.temporizadores = []
+        self.secuencia = itertools.count()  # Desempate estable en el heap
+        self.pendientes = deque()  # Llamadas encoladas desde otros hilos
+        self.ejecutando = False
+        self.detenido = False
+        self.hilo = None
+        self.terminado = threading.Event()
+        self.despertares = 0
+        self.despertares_vacios = 0
+
+        if hasattr(os, 'eventfd'):
+            self.fd_despertar = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self.fd_escritura = self.fd_despertar
+        else:
+            self.fd_despertar, self.fd_escritura = os.pipe()
+            os.set_blocking(self.fd_despertar, False)
+            os.set_blocking(self.fd_escritura, False)
+        self.selector.register(self.fd_despertar, selectors.EVENT_READ, self._vaciar_despertar)
+
+    def registrar_lector(self, fd, callback: Callable):
+        """Llama a `callback()` cada vez que `fd` tenga datos para leer"""
+        self.selector.register(fd, selectors.EVENT_READ, callback)
+
+    def quitar_lector(self, fd):
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, ValueError, OSError):
+            pass
+
+    def llamar_en(self, segundos: float, callback: Callable, *args) -> Temporizador:
+        """Programa `callback(*args)` dentro de `segundos` (solo desde el hilo del bucle o antes de ejecutar())"""
+        temporizador = Temporizador(time.monotonic() + segundos, callback, args)
+        heapq.heappush(self.temporizadores, (temporizador.instante, next(self.secuencia), temporizador))
+        return temporizador
+
+    def llamar_cada(self, intervalo: float, callback: Callable, *args, inicio: float = 0.0) -> Temporizador:
+        """Programa `callback(*args)` periódicamente, la primera vez dentro de `inicio` segundos"""
+        temporizador = self.llamar_en(inicio, callback, *args)
+        temporizador.intervalo = intervalo
+        return temporizador
+
+    def llamar_desde_hilo(self, callback: Callable, *args):
+        """Encola `callback(*args)` desde cualquier hilo y despierta el bucle"""
+        self.pendientes.append((callback, args))
+        self.despertar()
+
+    def despertar(self):
+        try:
+            os.write(self.fd_escritura, (1).to_bytes(8, 'little'))
+        except (BlockingIOError, OSError):
+            # Contador lleno o bucle cerrado: ya hay un despertar pendiente
+            pass
+
+    def _vaciar_despertar(self):
+        try:
+            os.read(self.fd_despertar, 8 if self.fd_despertar == self.fd_escritura else 4096)
+        except (BlockingIOError, OSError):
+            pass
+
+    def en_hilo_del_bucle(self) -> bool:
+        return self.hilo is threading.current_thread()
+
+    def _timeout(self) -> Optional[float]:
+        """Tiempo hasta el próximo temporizador; None = bloquear indefinidamente"""
+        if self.pendientes:
+            return 0
+        while self.temporizadores and self.temporizadores[0][2].cancelado:
+            heapq.heappop(self.temporizadores)
+        if not self.temporizadores:
+            return None
+        return max(0.0, self.temporizadores[0][0] - time.monotonic())
+
+    def _ejecutar_temporizadores(self) -> int:
+        ejecutados = 0
+        ahora = time.monotonic()
+        while self.temporizadores and self.temporizadores[0][0] <= ahora:
+            _, _, temporizador = heapq.heappop(self.temporizadores)
+            if temporizador.cancelado:
+                continue
+            if temporizador.intervalo is not None:
+                temporizador.instante = ahora + temporizador.intervalo
+                heapq.heappush(self.temporizadores, (temporizador.instante, next(self.secuencia), temporizador))
+            self._llamar(temporizador.callback, temporizador.args)
+            ejecutados += 1
+        return ejecutados
+
+    def _llamar(self, callback: Callable, args: tuple):
+        try:
+            callback(*args)
+        except Exception as e:
+            log.exception("❌ Error en callback del bucle de eventos: %s", e)
+
+    def ejecutar(self):
+        """Ejecuta el bucle en el hilo actual hasta que se llame a detener()"""
+        self.hilo = threading.current_thread()
+        self.ejecutando = True
+        self.terminado.clear()
+        try:
+            while not self.detenido:
+                eventos = self.selector.select(self._timeout())
+                self.despertares += 1
+                trabajo = 0
+                for clave, _ in eventos:
+                    if clave.fd != self.fd_despertar:
+                        trabajo += 1
+                    self._llamar(clave.data, ())
+                while self.pendientes:
+                    callback, args = self.pendientes.popleft()
+                    self._llamar(callback, args)
+                    trabajo += 1
+                trabajo += self._ejecutar_temporizadores()
+                if not trabajo and not self.detenido:
+                    self.despertares_vacios += 1
+        finally:
+            self.ejecutando = False
+            self.terminado.set()
+
+    def detener(self, esperar: float = 1.0):
+        """Detiene el bucle al instante; desde otro hilo espera hasta `esperar` s a que termine"""
+        self.detenido = True
+        self.despertar()
+        if self.ejecutando and not self.en_hilo_del_bucle():
+            self.terminado.wait(esperar)
+
+    def cerrar(self):
+        """Libera el selector y el descriptor de despertar"""
+        self.selector.close()
+        for fd in {self.fd_despertar, self.fd_escritura}:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def estado(self) -> dict:
+        return {
+            'bucle_despertares': self.despertares,
+            'bucle_despertares_vacios': self.despertares_vacios
+        }
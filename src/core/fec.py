@@ -0,0 +1,181 @@
+"""
+Corrección de errores hacia delante (FEC) para mensajes fragmentados
+
+Los fragmentos de datos se agrupan de K en K y tras cada grupo se envían
+M fragmentos de reparación (Tipo_Mensaje.reparacion). Con M = 1 la
+reparación es el XOR del grupo; con M > 1 es un código Reed-Solomon
+sistemático sobre GF(2^8) con matriz de Cauchy cuya primera fila es de
+unos, así que la primera reparación sigue siendo el XOR. El receptor
+recupera hasta M fragmentos perdidos por grupo sin pedir nada al emisor,
+lo que sirve en broadcast, donde un ACK por receptor no escala.
+
+Frame de reparación: fragmento = número de grupo, total = total de
+fragmentos de datos del mensaje, y el payload es
+
+    [1B tipo original][1B K][1B M][1B índice j][2B longitud del último fragmento del grupo][paridad]
+
+Las operaciones sobre los payloads se vectorizan sin dependencias:
+multiplicar por una constante es un bytes.translate con su tabla y la
+suma (XOR) se hace con enteros de int.from_bytes.
+"""
+
+import struct
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+CABECERA_REPARACION = struct.Struct('>BBBBH')
+MAX_SIMBOLOS = 256  # K + M no puede superar el tamaño del cuerpo
+
+# Tablas de GF(2^8) con el polinomio x^8 + x^4 + x^3 + x^2 + 1 (0x11d)
+_EXP = bytearray(512)
+_LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    _EXP[_i] = _x
+    _LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11d
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+del _x, _i
+
+
+def gf_mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def gf_inv(a: int) -> int:
+    if a == 0:
+        raise ZeroDivisionError("0 no tiene inverso en GF(256)")
+    return _EXP[255 - _LOG[a]]
+
+
+@lru_cache(maxsize=256)
+def _tabla(c: int) -> bytes:
+    """Tabla de bytes.translate que multiplica cada byte por `c`"""
+    return bytes(gf_mul(c, x) for x in range(256))
+
+
+@lru_cache(maxsize=None)
+def coeficiente(j: int, i: int, m: int) -> int:
+    """
+    Coeficiente del fragmento `i` del grupo en la reparación `j`: matriz de
+    Cauchy 1/(x_j + y_i) con x_j = j, y_i = m + i, con cada columna escalada
+    para que la fila 0 sea de unos. Cualquier submatriz cuadrada sigue siendo
+    invertible, así que bastan M reparaciones cualesquiera para M pérdidas.
+    """
+    y = m + i
+    return gf_mul(y, gf_inv(j ^ y))  # (x_0 + y_i) / (x_j + y_i), con x_0 = 0
+
+
+def _combinar(terminos: Iterable[Tuple[int, object]], longitud: int) -> bytes:
+    """Suma en GF(256) de coeficiente × payload; los payloads cortos se rellenan con ceros"""
+    acumulado = 0
+    for c, payload in terminos:
+        if c == 0:
+            continue
+        if c != 1:
+            payload = bytes(payload).translate(_tabla(c))
+        # Little endian: el relleno de un payload corto son los bytes altos, a cero
+        acumulado ^= int.from_bytes(payload, 'little')
+    return acumulado.to_bytes(longitud, 'little')
+
+
+def paridad(trozos: Sequence, m: int) -> List[bytes]:
+    """M payloads de reparación de un grupo (el primero es el XOR de todos)"""
+    longitud = max(len(trozo) for trozo in trozos)
+    return [_combinar([(coeficiente(j, i, m), trozo) for i, trozo in enumerate(trozos)], longitud)
+            for j in range(m)]
+
+
+def _invertir(matriz: List[List[int]]) -> List[List[int]]:
+    """Inversa por Gauss-Jordan en GF(256) (matrices de como mucho M×M)"""
+    n = len(matriz)
+    filas = [fila[:] + [1 if k == i else 0 for k in range(n)] for i, fila in enumerate(matriz)]
+    for columna in range(n):
+        pivote = next((f for f in range(columna, n) if filas[f][columna]), None)
+        if pivote is None:
+            raise ValueError("Matriz de reparación singular")
+        filas[columna], filas[pivote] = filas[pivote], filas[columna]
+        inverso = gf_inv(filas[columna][columna])
+        filas[columna] = [gf_mul(inverso, v) for v in filas[columna]]
+        for f in range(n):
+            factor = filas[f][columna]
+            if f != columna and factor:
+                filas[f] = [v ^ gf_mul(factor, p) for v, p in zip(filas[f], filas[columna])]
+    return [fila[n:] for fila in filas]
+
+
+def reconstruir(presentes: Dict[int, object], reparaciones: Dict[int, object], faltan: List[int],
+                m: int, longitud: int) -> Dict[int, bytes]:
+    """
+    Recupera los fragmentos perdidos de un grupo.
+
+    Args:
+        presentes: Índice dentro del grupo → payload, para todos los que llegaron
+        reparaciones: Índice j → paridad recibida (al menos len(faltan))
+        faltan: Índices dentro del grupo que se perdieron
+        m: Reparaciones por grupo con las que se codificó
+        longitud: Longitud de la paridad (los recuperados se devuelven con ese tamaño)
+
+    Returns:
+        Dict[int, bytes]: Índice dentro del grupo → payload recuperado
+    """
+    filas = sorted(reparaciones)[:len(faltan)]
+    if len(filas) < len(faltan):
+        raise ValueError("Reparaciones insuficientes")
+    # Síndromes: cada paridad menos la aportación de los fragmentos que sí llegaron
+    sindromes = [_combinar([(1, reparaciones[j])] +
+                           [(coeficiente(j, i, m), payload) for i, payload in presentes.items()], longitud)
+                 for j in filas]
+    inversa = _invertir([[coeficiente(j, i, m) for i in faltan] for j in filas])
+    return {i: _combinar(zip(inversa[f], sindromes), longitud) for f, i in enumerate(faltan)}
+
+
+class CodificadorFEC:
+    """Intercala M fragmentos de reparación tras cada grupo de K fragmentos de datos"""
+
+    def __init__(self, k: int = 16, m: int = 1):
+        """
+        Args:
+            k: Fragmentos de datos por grupo
+            m: Fragmentos de reparación por grupo (redundancia m/k)
+        """
+        if k < 1 or m < 1 or k + m > MAX_SIMBOLOS:
+            raise ValueError(f"FEC no válido: k={k}, m={m} (k, m >= 1 y k + m <= {MAX_SIMBOLOS})")
+        self.k = k
+        self.m = m
+
+    @property
+    def redundancia(self) -> float:
+        return self.m / self.k
+
+    def frames_totales(self, total_fragmentos: int) -> int:
+        """Frames que se envían para `total_fragmentos` de datos, reparaciones incluidas"""
+        return total_fragmentos + -(-total_fragmentos // self.k) * self.m
+
+    def intercalar(self, trozos: Iterable, tipo: int) -> Iterator[Tuple[int, bool, object]]:
+        """
+        Genera (número, es_reparación, payload): los fragmentos de datos tal
+        cual y, tras cada grupo, sus reparaciones con la cabecera ya puesta
+        (número = índice del grupo).
+        """
+        grupo = []
+        numero_grupo = 0
+        for numero, trozo in enumerate(trozos):
+            yield numero, False, trozo
+            grupo.append(trozo)
+            if len(grupo) == self.k:
+                yield from self._reparaciones(numero_grupo, grupo, tipo)
+                grupo = []
+                numero_grupo += 1
+        if grupo:
+            yield from self._reparaciones(numero_grupo, grupo, tipo)
+
+    def _reparaciones(self, numero_grupo: int, grupo: List, tipo: int) -> Iterator[Tuple[int, bool, bytes]]:
+        ultimo = len(grupo[-1])
+        for j, payload in enumerate(paridad(grupo, self.m)):
+            yield numero_grupo, True, CABECERA_REPARACION.pack(tipo, self.k, self.m, j, ultimo) + payload
@@ -0,0 +1,574 @@
+"""
+Transferencias fiables de Link-Chat: ventana deslizante con ACK selectivo
+
+Los fragmentos de datos son los de siempre (mismo tipo, ID y numeración);
+lo nuevo son los frames Tipo_Mensaje.control, con un único frame cada uno:
+
+    [1B clase][2B id mensaje][4B total fragmentos][4B base][4B testigo][bitmap]
+
+- CONSULTA (emisor → receptor): abre la transferencia y, tras un timeout,
+  pide el estado. `testigo` identifica la consulta.
+- SACK (receptor → emisor): todos los fragmentos < `base` han llegado; el
+  bitmap (mismo formato que MapaFragmentos) describe los siguientes. Se
+  envía cada `ack_cada` fragmentos, al detectar un hueco, al completar y
+  en respuesta a cada consulta (repitiendo su testigo).
+- REANUDAR (emisor → receptor): consulta inicial de una transferencia
+  reanudable; tras la cabecera van los 16 bytes de la huella del contenido
+  y 2 con el tamaño de fragmento. El receptor continúa desde su checkpoint
+  (ver FragmentManager.reanudar) y responde con MAPA y un SACK con el testigo.
+- MAPA (receptor → emisor): bitmap completo de lo que ya se tiene, en
+  trozos que empiezan en el fragmento `base`, para que el emisor no
+  reenvíe nada de lo recibido antes de la interrupción.
+
+Si el receptor rechaza un trozo corrupto (ver integridad.py) olvida sus
+fragmentos y envía en el acto un SACK cuya base y bitmap ya no los
+incluyen: el emisor retira la confirmación de todo fragmento que un SACK
+describe como ausente y lo retransmite. Como cada SACK posterior repite
+la ausencia, la petición no depende de que llegue un frame concreto.
+
+El emisor mantiene como mucho `ventana` fragmentos sin confirmar y solo
+retransmite los que faltan: un fragmento se da por perdido cuando se
+confirma otro enviado después que él (en un enlace Ethernet no hay
+reordenación) o cuando la respuesta a una consulta no lo incluye.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .codec import codificar, mac_a_bytes, bytes_a_mac
+from .fragmentation import MapaFragmentos
+from .frames import Frame, Tipo_Mensaje, PAYLOAD_MAXIMO
+from .integridad import fragmento_de_cabecera, longitud_cabecera
+from .paralelo import mapa_ordenado
+from .planificador import CLASE_INTERACTIVA, CLASE_MASIVA
+from .registro import obtener_logger, TRAZA
+
+log = obtener_logger(__name__)
+
+CONTROL = struct.Struct('>BHIII')  # clase, id mensaje (16 bits bajos: el id completo va en la cabecera), total, base, testigo
+CONSULTA = 1
+SACK = 2
+REANUDAR = 3
+MAPA = 4
+TAM_HUELLA = 16
+TAM_FRAGMENTO = struct.Struct('>H')  # Tras la huella de REANUDAR (sin él, PAYLOAD_MAXIMO)
+MAX_BITMAP = 1024  # Bytes de bitmap por SACK: 8192 fragmentos a partir de la base
+
+
+class FuenteFragmentos:
+    """
+    Acceso aleatorio a los payloads de un mensaje (prefijo + datos en
+    memoria o en un archivo), para poder reconstruir cualquier fragmento
+    al retransmitirlo sin guardar los frames enviados.
+    """
+
+    def __init__(self, prefijo: bytes = b"", datos=None, archivo=None, tamaño: Optional[int] = None,
+                 tamaño_fragmento: Optional[int] = None):
+        """
+        Args:
+            prefijo: Bytes al inicio del mensaje (p. ej. la metadata FILE_TRANSFER:)
+            datos: Contenido en memoria (bytes, bytearray o memoryview)
+            archivo: Archivo abierto en modo binario (alternativa a `datos`)
+            tamaño: Bytes del archivo (por defecto, su tamaño actual)
+            tamaño_fragmento: Payload por fragmento (None = el del destino, lo fija ControlFiable.enviar)
+        """
+        self.prefijo = prefijo
+        self.datos = memoryview(datos) if datos is not None else None
+        self.fd = archivo.fileno() if archivo is not None else None
+        if self.datos is not None:
+            tamaño = len(self.datos)
+        elif tamaño is None:
+            tamaño = os.fstat(self.fd).st_size if self.fd is not None else 0
+        self.longitud = len(prefijo) + tamaño
+        self.tamaño_fragmento = tamaño_fragmento
+
+    def trozo(self, indice: int) -> bytes:
+        """Payload del fragmento `indice`"""
+        inicio = indice * self.tamaño_fragmento
+        fin = min(inicio + self.tamaño_fragmento, self.longitud)
+        largo_prefijo = len(self.prefijo)
+        partes = []
+        if inicio < largo_prefijo:
+            partes.append(self.prefijo[inicio:min(fin, largo_prefijo)])
+        desde, hasta = max(inicio - largo_prefijo, 0), fin - largo_prefijo
+        if hasta > desde:
+            if self.datos is not None:
+                partes.append(self.datos[desde:hasta])
+            else:
+                partes.append(os.pread(self.fd, hasta - desde, desde))
+        return partes[0] if len(partes) == 1 else b"".join(partes)
+
+
+def huella_contenido(fuente: FuenteFragmentos, bloque: int = 1 << 20) -> bytes:
+    """
+    Huella de 16 bytes del mensaje completo: identifica una transferencia
+    reanudable. Es un BLAKE2b del prefijo y de los BLAKE2b de cada bloque,
+    que se calculan en paralelo (hashlib libera el GIL). Si el prefijo
+    empieza con una cabecera de integridad, basta con ella: ya resume todo
+    el contenido y no hay que releerlo.
+    """
+    cabecera = longitud_cabecera(fuente.prefijo)
+    if cabecera:
+        return hashlib.blake2b(fuente.prefijo[:cabecera], digest_size=TAM_HUELLA).digest()
+    tamaño = fuente.longitud - len(fuente.prefijo)
+
+    def resumen(inicio: int) -> bytes:
+        fin = min(inicio + bloque, tamaño)
+        if fuente.datos is not None:
+            return hashlib.blake2b(fuente.datos[inicio:fin]).digest()
+        return hashlib.blake2b(os.pread(fuente.fd, fin - inicio, inicio)).digest()
+
+    huella = hashlib.blake2b(fuente.prefijo, digest_size=TAM_HUELLA)
+    for digest in mapa_ordenado(resumen, range(0, tamaño, bloque)):
+        huella.update(digest)
+    return huella.digest()
+
+
+class TransferenciaSaliente:
+    """Estado del emisor para una transferencia fiable"""
+    __slots__ = ('destino', 'id_mensaje', 'total', 'confirmados', 'base', 'en_vuelo', 'perdidos', 'siguiente',
+                 'orden', 'cond', 'testigo', 'orden_consulta', 'instante_consulta', 'ultimo_progreso',
+                 'rto', 'reintentos', 'huella', 'tamaño_fragmento', 'respondida')
+
+    def __init__(self, destino: bytes, id_mensaje: int, total: int, rto: float):
+        self.destino = destino
+        self.id_mensaje = id_mensaje
+        self.total = total
+        self.confirmados = MapaFragmentos(total)
+        self.base = 0  # Todos los fragmentos anteriores están confirmados
+        self.en_vuelo: Dict[int, int] = {}  # índice -> orden de envío
+        self.perdidos = set()  # Pendientes de retransmitir
+        self.siguiente = 0  # Próximo fragmento nuevo
+        self.orden = 0
+        self.cond = threading.Condition()
+        self.testigo = 0
+        self.orden_consulta = 0
+        self.instante_consulta = 0.0
+        self.ultimo_progreso = time.monotonic()
+        self.rto = rto
+        self.reintentos = 0
+        self.huella: Optional[bytes] = None  # Solo en transferencias reanudables
+        self.tamaño_fragmento = PAYLOAD_MAXIMO
+        self.respondida = False  # El receptor contestó a alguna consulta
+
+
+class ControlFiable:
+    """
+    Emisor y receptor de transferencias fiables de un Envio_recibo_frames.
+    Los SACK y consultas se procesan en el hilo de recepción; enviar()
+    bloquea el hilo que lo llama hasta que el receptor lo confirma todo.
+    """
+
+    def __init__(self, comunicador, ventana: int = 512, ack_cada: int = 32, rto_inicial: float = 0.2,
+                 rto_minimo: float = 0.01, rto_maximo: float = 2.0, max_reintentos: int = 10):
+        self.com = comunicador
+        self.ventana = ventana
+        self.ack_cada = ack_cada
+        self.rto_inicial = rto_inicial
+        self.rto_minimo = rto_minimo
+        self.rto_maximo = rto_maximo
+        self.max_reintentos = max_reintentos
+        self.srtt: Optional[float] = None
+        self.salientes: Dict[Tuple[bytes, int], TransferenciaSaliente] = {}
+        self.entrantes: Dict[Tuple[bytes, int], dict] = {}
+        self.completados: OrderedDict = OrderedDict()  # (origen, id) -> total, para responder a consultas tardías
+
+        self.retransmisiones = 0
+        self.consultas_enviadas = 0
+        self.timeouts = 0
+        self.sacks_enviados = 0
+        self.sacks_recibidos = 0
+
+    # ---------------------------------------------------------------- emisor
+
+    def enviar(self, mac_destino: str, tipo_mensaje, fuente: FuenteFragmentos,
+               progress_callback: Optional[Callable] = None, archivo_nombre: Optional[str] = None,
+               huella: Optional[bytes] = None, clase: Optional[str] = None) -> int:
+        """
+        Envía un mensaje fragmentado y espera a que el receptor confirme
+        todos los fragmentos, retransmitiendo solo los que falten.
+
+        Args:
+            mac_destino: MAC destino
+            tipo_mensaje: Tipo del mensaje (texto o archivo)
+            fuente: Payload del mensaje
+            progress_callback: Callback (archivo_nombre, confirmados, total, bytes_enviados)
+            archivo_nombre: Nombre que se pasa al callback de progreso
+            huella: Huella del contenido (huella_contenido); la transferencia se
+                vuelve reanudable y no se reenvía lo que el receptor ya tenga
+            clase: Clase del planificador para los fragmentos (ver PlanificadorEnvio)
+
+        Returns:
+            int: Bytes enviados, retransmisiones incluidas
+
+        Raises:
+            TimeoutError: El receptor dejó de responder
+        """
+        com = self.com
+        if com.bucle.en_hilo_del_bucle():
+            raise RuntimeError("enviar() bloquearía el hilo que procesa los SACK")
+        if fuente.tamaño_fragmento is None:
+            # Con cabecera de integridad, el tamaño para el que se calcularon sus trozos
+            fuente.tamaño_fragmento = fragmento_de_cabecera(fuente.prefijo) or com.payload_maximo(mac_destino)
+        total = com.calcular_total_fragmentos(fuente.longitud, fuente.tamaño_fragmento)
+        if clase is None:
+            clase = CLASE_MASIVA if Tipo_Mensaje.from_value(tipo_mensaje) == Tipo_Mensaje.archivo else CLASE_INTERACTIVA
+        if total < 2:
+            # Un solo frame: no pasa por el reensamblado, se envía sin confirmación
+            return com.enviar_frame([Frame(mac_destino, com.mac_ori, tipo_mensaje, com.nuevo_id_mensaje(mac_destino),
+                                           0, 0, fuente.trozo(0)).hacia_bytes()], clase=clase)
+
+        destino = mac_a_bytes(mac_destino)
+        origen = mac_a_bytes(com.mac_ori)
+        tipo = tipo_mensaje.value if isinstance(tipo_mensaje, Tipo_Mensaje) else int(tipo_mensaje)
+        t = TransferenciaSaliente(destino, com.nuevo_id_mensaje(destino), total, self._rto())
+        t.huella = huella
+        t.tamaño_fragmento = fuente.tamaño_fragmento
+        self.salientes[(destino, t.id_mensaje)] = t
+        total_bytes = 0
+        log.info("📤 Transferencia fiable %d a %s: %d fragmentos de %d bytes, ventana %d", t.id_mensaje,
+                 mac_destino, total, fuente.tamaño_fragmento, self.ventana)
+        try:
+            self._consultar(t)  # Abre la transferencia en el receptor
+            if huella is not None:
+                # Antes de enviar nada, saber qué tiene ya el receptor
+                self._esperar_respuesta(t)
+                if t.confirmados.recibidos:
+                    log.info("🔁 Reanudando transferencia %d: el receptor ya tiene %d/%d fragmentos",
+                             t.id_mensaje, t.confirmados.recibidos, total)
+            while True:
+                consultar = False
+                with t.cond:
+                    if t.confirmados.completo:
+                        break
+                    lote = sorted(t.perdidos)
+                    t.perdidos.clear()
+                    libres = min(self.ventana - len(t.en_vuelo) - len(lote), total - t.siguiente)
+                    if libres > 0 and t.huella is not None and t.confirmados.recibidos:
+                        # Saltar lo que el receptor ya confirmó (transferencia reanudada)
+                        while libres > 0:
+                            indice = t.confirmados.primer_faltante(t.siguiente)
+                            if indice >= total:
+                                t.siguiente = total
+                                break
+                            lote.append(indice)
+                            t.siguiente = indice + 1
+                            libres -= 1
+                    elif libres > 0:
+                        lote.extend(range(t.siguiente, t.siguiente + libres))
+                        t.siguiente += libres
+                    if lote:
+                        for indice in lote:
+                            t.en_vuelo[indice] = t.orden
+                            t.orden += 1
+                    else:
+                        restante = t.rto - (time.monotonic() - t.ultimo_progreso)
+                        if restante > 0:
+                            t.cond.wait(restante)
+                            continue
+                        # Sin progreso en un RTO: preguntar al receptor qué le falta
+                        t.reintentos += 1
+                        self.timeouts += 1
+                        if t.reintentos > self.max_reintentos:
+                            raise TimeoutError(f"Transferencia fiable {t.id_mensaje}: el receptor no responde "
+                                               f"({t.confirmados.recibidos}/{total} fragmentos confirmados)")
+                        t.rto = min(t.rto * 2, self.rto_maximo)
+                        t.ultimo_progreso = time.monotonic()
+                        consultar = True
+                if consultar:
+                    com.pacer.registrar_perdida()
+                    self._consultar(t)
+                    continue
+
+                # El lote se intercala con el resto de envíos en curso (ver PlanificadorEnvio)
+                total_bytes += com.enviar_frame(
+                    (codificar(destino, origen, tipo, t.id_mensaje, indice, total, fuente.trozo(indice))
+                     for indice in lote), total_frames=len(lote), clase=clase)
+                if progress_callback and archivo_nombre:
+                    try:
+                        progress_callback(archivo_nombre, t.confirmados.recibidos, total, total_bytes)
+                    except Exception as e:
+                        log.error("❌ Error en progress_callback de envío: %s", e)
+        finally:
+            del self.salientes[(destino, t.id_mensaje)]
+        log.info("✅ Transferencia fiable %d confirmada", t.id_mensaje)
+        return total_bytes
+
+    def _esperar_respuesta(self, t: TransferenciaSaliente):
+        """Espera la respuesta a la consulta inicial, repitiéndola tras cada timeout"""
+        with t.cond:
+            while not t.respondida:
+                if t.cond.wait(t.rto):
+                    continue
+                t.reintentos += 1
+                self.timeouts += 1
+                if t.reintentos > self.max_reintentos:
+                    raise TimeoutError(f"Transferencia fiable {t.id_mensaje}: el receptor no responde")
+                t.rto = min(t.rto * 2, self.rto_maximo)
+                t.cond.release()
+                try:
+                    self.com.pacer.registrar_perdida()
+                    self._consultar(t)
+                finally:
+                    t.cond.acquire()
+            t.reintentos = 0
+            t.ultimo_progreso = time.monotonic()
+
+    def _rto(self) -> float:
+        if self.srtt is None:
+            return self.rto_inicial
+        return min(max(4 * self.srtt, self.rto_minimo), self.rto_maximo)
+
+    def _consultar(self, t: TransferenciaSaliente):
+        with t.cond:
+            t.testigo += 1
+            t.orden_consulta = t.orden
+            t.instante_consulta = time.monotonic()
+            testigo = t.testigo
+            reanudar = t.huella is not None and not t.respondida
+        self.consultas_enviadas += 1
+        if reanudar:
+            self._enviar_control(t.destino, REANUDAR, t.id_mensaje, t.total, 0, testigo,
+                                 t.huella + TAM_FRAGMENTO.pack(t.tamaño_fragmento))
+        else:
+            self._enviar_control(t.destino, CONSULTA, t.id_mensaje, t.total, 0, testigo)
+
+    def _aplicar_sack(self, t: TransferenciaSaliente, base: int, testigo: int, bitmap):
+        """Marca lo confirmado y da por perdido lo enviado antes que lo último confirmado"""
+        ahora = time.monotonic()
+        with t.cond:
+            confirmados, en_vuelo, perdidos = t.confirmados, t.en_vuelo, t.perdidos
+            nuevos = 0
+            retransmisiones = self.retransmisiones
+            max_orden = -1
+            base = min(base, t.total)
+            if base > t.base:
+                nuevos += confirmados.marcar_hasta(base)
+                for indice in [i for i in en_vuelo if i < base]:
+                    orden = en_vuelo.pop(indice)
+                    if orden > max_orden:
+                        max_orden = orden
+                perdidos.difference_update([i for i in perdidos if i < base])
+                t.base = base
+            bits_confirmados = confirmados.bits
+            alineado = not base & 7
+            rechazados = []
+            for desplazamiento, byte in enumerate(bitmap):
+                inicio = base + (desplazamiento << 3)
+                if alineado and inicio >> 3 < len(bits_confirmados):
+                    ausentes = bits_confirmados[inicio >> 3] & ~byte
+                    if ausentes:
+                        # Confirmados antes y ahora ausentes: el receptor rechazó su trozo
+                        rechazados.extend(inicio + bit for bit in range(8) if ausentes & (1 << bit))
+                    # Solo los bits que no estaban ya confirmados
+                    byte &= ~bits_confirmados[inicio >> 3]
+                if not byte:
+                    continue
+                for bit in range(8):
+                    if byte & (1 << bit) and confirmados.marcar(inicio + bit):
+                        nuevos += 1
+                        orden = en_vuelo.pop(inicio + bit, -1)
+                        if orden > max_orden:
+                            max_orden = orden
+                        perdidos.discard(inicio + bit)
+            if rechazados:
+                for indice in rechazados:
+                    confirmados.desmarcar(indice, indice + 1)
+                    en_vuelo.pop(indice, None)
+                    perdidos.add(indice)
+                t.base = min(t.base, base)
+                self.retransmisiones += len(rechazados)
+                log.debug("🔁 Transferencia %d: el receptor rechazó %d fragmento(s) desde el %d", t.id_mensaje,
+                          len(rechazados), rechazados[0])
+            if testigo and testigo == t.testigo:
+                t.respondida = True
+                # Respuesta a la última consulta: todo lo enviado antes (orden < orden_consulta),
+                # incluido el último frame, ya debería haber llegado
+                muestra = ahora - t.instante_consulta
+                self.srtt = muestra if self.srtt is None else 0.875 * self.srtt + 0.125 * muestra
+                max_orden = max(max_orden, t.orden_consulta)
+            if max_orden >= 0:
+                for indice in [i for i, orden in en_vuelo.items() if orden < max_orden]:
+                    del en_vuelo[indice]
+                    perdidos.add(indice)
+                    self.retransmisiones += 1
+            if nuevos:
+                t.ultimo_progreso = ahora
+                t.reintentos = 0
+                t.rto = self._rto()
+            t.cond.notify()
+        if self.retransmisiones > retransmisiones:
+            # Fragmentos perdidos o rechazados: el pacer en modo auto reduce la tasa
+            self.com.pacer.registrar_perdida()
+
+    def _aplicar_mapa(self, t: TransferenciaSaliente, inicio: int, bitmap):
+        """Fragmentos que el receptor ya tenía de antes (respuesta a REANUDAR)"""
+        with t.cond:
+            if t.confirmados.combinar(inicio, bitmap):
+                t.ultimo_progreso = time.monotonic()
+
+    # -------------------------------------------------------------- receptor
+
+    def descartar_fragmento(self, frame: Frame) -> bool:
+        """
+        True si el fragmento pertenece a una transferencia fiable ya
+        completada (retransmisión tardía): se reconfirma y no se reensambla.
+        """
+        if not self.completados:
+            return False
+        clave = (frame.origen, frame.id_mensaje)
+        total = self.completados.get(clave)
+        if total is None or total != frame.total_fragmentos:
+            return False
+        self._enviar_control(frame.origen, SACK, frame.id_mensaje, total, total, 0)
+        return True
+
+    def al_recibir_fragmento(self, frame: Frame, completo: bool):
+        """Tras reensamblar un fragmento: envía un SACK si toca"""
+        clave = (frame.origen, frame.id_mensaje)
+        entrada = self.entrantes.get(clave)
+        if entrada is None:
+            return
+        total = entrada['total']
+        if completo:
+            del self.entrantes[clave]
+            self._recordar_completado(clave, total)
+            self._enviar_control(frame.origen, SACK, frame.id_mensaje, total, total, 0)
+            return
+        entrada['desde_ack'] += 1
+        entrada['instante'] = time.monotonic()
+        hueco = frame.fragmento > entrada['maximo'] + 1
+        if frame.fragmento > entrada['maximo']:
+            entrada['maximo'] = frame.fragmento
+        if hueco or entrada['desde_ack'] >= self.ack_cada:
+            self._enviar_sack(frame.origen, frame.id_mensaje, entrada, 0)
+
+    def trozo_rechazado(self, mac_origen: str, id_mensaje: int, inicio: int, fin: int) -> bool:
+        """
+        FragmentManager.rechazo_callback: los fragmentos [inicio, fin) se han
+        olvidado por corruptos. Si la transferencia es fiable, se piden otra vez
+        con un SACK inmediato; si no, devuelve False.
+        """
+        origen = mac_a_bytes(mac_origen)
+        entrada = self.entrantes.get((origen, id_mensaje))
+        if entrada is None:
+            return False
+        entrada['base'] = min(entrada['base'], inicio & ~7)
+        self._enviar_sack(origen, id_mensaje, entrada, 0)
+        return True
+
+    def _recordar_completado(self, clave, total: int):
+        self.completados[clave] = total
+        while len(self.completados) > 256:
+            self.completados.popitem(last=False)
+
+    def _enviar_sack(self, origen: bytes, id_mensaje: int, entrada: dict, testigo: int):
+        mapa = self.com.fragment_manager.mapa(bytes_a_mac(origen), id_mensaje)
+        bitmap = b""
+        base = 0
+        if mapa is not None:
+            # Base alineada a byte: el bitmap se copia tal cual de MapaFragmentos
+            base = mapa.primer_faltante(entrada['base']) & ~7
+            entrada['base'] = base
+            fin = min(len(mapa.bits), (entrada['maximo'] >> 3) + 1, (base >> 3) + MAX_BITMAP)
+            if fin > base >> 3:
+                bitmap = bytes(mapa.bits[base >> 3:fin])
+        entrada['desde_ack'] = 0
+        self._enviar_control(origen, SACK, id_mensaje, entrada['total'], base, testigo, bitmap)
+
+    def _reanudar(self, origen: bytes, id_mensaje: int, entrada: dict, huella: bytes, tamaño_fragmento: int):
+        """Recupera el checkpoint de la huella y envía al emisor el bitmap de lo que ya hay"""
+        try:
+            mapa = self.com.fragment_manager.reanudar(bytes_a_mac(origen), id_mensaje, entrada['total'], huella.hex(),
+                                                      tamaño_fragmento)
+        except OSError as e:
+            log.error("❌ No se pudo preparar la recepción reanudable: %s", e)
+            return
+        if not mapa.recibidos:
+            return
+        bits = mapa.bits
+        ultimo = len(bits.rstrip(b"\x00")) - 1
+        entrada['maximo'] = min((ultimo << 3) + 7, mapa.total - 1)
+        for inicio_byte in range(0, ultimo + 1, MAX_BITMAP):
+            trozo = bytes(bits[inicio_byte:min(inicio_byte + MAX_BITMAP, ultimo + 1)])
+            if trozo.count(0) != len(trozo):
+                self._enviar_control(origen, MAPA, id_mensaje, entrada['total'], inicio_byte << 3, 0, trozo)
+
+    def _limpiar_entrantes(self):
+        limite = time.monotonic() - self.com.fragment_manager.timeout
+        for clave in [c for c, entrada in self.entrantes.items() if entrada['instante'] < limite]:
+            del self.entrantes[clave]
+
+    # ---------------------------------------------------------------- común
+
+    def procesar_control(self, frame: Frame):
+        """Procesa un frame Tipo_Mensaje.control recibido (hilo de recepción)"""
+        datos = frame.datos
+        if len(datos) < CONTROL.size:
+            log.warning("⚠️ Frame de control demasiado corto (%d bytes)", len(datos))
+            return
+        clase, _, total, base, testigo = CONTROL.unpack_from(datos)
+        id_mensaje = frame.id_mensaje
+        clave = (frame.origen, id_mensaje)
+        if clase == SACK:
+            self.sacks_recibidos += 1
+            t = self.salientes.get(clave)
+            if t is not None and t.total == total:
+                self._aplicar_sack(t, base, testigo, datos[CONTROL.size:])
+        elif clase == MAPA:
+            t = self.salientes.get(clave)
+            if t is not None and t.total == total and not base & 7:
+                self._aplicar_mapa(t, base, datos[CONTROL.size:])
+        elif clase == CONSULTA or clase == REANUDAR:
+            if log.isEnabledFor(TRAZA):
+                log.log(TRAZA, "📨 Consulta %d de %s para el mensaje %d", testigo, frame.mac_origen, id_mensaje)
+            if self.completados.get(clave) == total:
+                self._enviar_control(frame.origen, SACK, id_mensaje, total, total, testigo)
+                return
+            entrada = self.entrantes.get(clave)
+            if entrada is None or entrada['total'] != total:
+                self._limpiar_entrantes()
+                entrada = {'total': total, 'desde_ack': 0, 'maximo': -1, 'base': 0,
+                           'instante': time.monotonic()}
+                self.entrantes[clave] = entrada
+            if clase == REANUDAR and len(datos) >= CONTROL.size + TAM_HUELLA:
+                huella = bytes(datos[CONTROL.size:CONTROL.size + TAM_HUELLA])
+                tamaño_fragmento = PAYLOAD_MAXIMO
+                if len(datos) >= CONTROL.size + TAM_HUELLA + TAM_FRAGMENTO.size:
+                    tamaño_fragmento, = TAM_FRAGMENTO.unpack_from(datos, CONTROL.size + TAM_HUELLA)
+                self._reanudar(frame.origen, id_mensaje, entrada, huella, tamaño_fragmento)
+            self._enviar_sack(frame.origen, id_mensaje, entrada, testigo)
+        else:
+            log.warning("⚠️ Clase de control desconocida: %d", clase)
+
+    def _enviar_control(self, destino: bytes, clase: int, id_mensaje: int, total: int, base: int, testigo: int,
+                        bitmap: bytes = b""):
+        payload = CONTROL.pack(clase, id_mensaje & 0xFFFF, total, base, testigo) + bitmap
+        frame = codificar(destino, mac_a_bytes(self.com.mac_ori), Tipo_Mensaje.control.value, id_mensaje, 0, 0,
+                          payload)
+        try:
+            # Sin pasar por el pacer: son pocos frames y pequeños, y su retraso frena al emisor.
+            # Con el anillo TX, _transmitir solo ocupa una ranura: hay que vaciarlo para que salga ya
+            self.com._transmitir(frame)
+            self.com._vaciar_anillo_tx()
+        except OSError as e:
+            log.error("❌ Error enviando frame de control: %s", e)
+            return
+        self.com.estadisticas['frames_protocolo_enviados'] += 1
+        if clase == SACK:
+            self.sacks_enviados += 1
+
+    def estado(self) -> dict:
+        return {
+            'fiable_retransmisiones': self.retransmisiones,
+            'fiable_timeouts': self.timeouts,
+            'fiable_consultas_enviadas': self.consultas_enviadas,
+            'fiable_sacks_enviados': self.sacks_enviados,
+            'fiable_sacks_recibidos': self.sacks_recibidos,
+            'fiable_srtt_ms': self.srtt * 1000 if self.srtt is not None else None
+        }
@@ -1,114 +1,613 @@
+import os
 import time
 import struct
 import hashlib
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
 from threading import Lock
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
+from .frames import PAYLOAD_MAXIMO
+from .fec import reconstruir
+from .integridad import CABECERA as CABECERA_INTEGRIDAD, VerificadorTrozos
+from .registro import obtener_logger, TRAZA
+
+log = obtener_logger(__name__)
+
+# Checkpoint de una transferencia reanudable:
+# [4B 'LCK2'][4B total][4B longitud último (-1 = desconocida)][2B tamaño de fragmento][bitmap]
+CABECERA_CHECKPOINT = struct.Struct('>4sIiH')
+MAGIA_CHECKPOINT = b"LCK2"
+CABECERA_CHECKPOINT_V1 = struct.Struct('>4sIi')  # 'LCK1': sin tamaño de fragmento, siempre PAYLOAD_MAXIMO
+MAGIA_CHECKPOINT_V1 = b"LCK1"
+
+
+@dataclass
+class MensajeEnDisco:
+    """
+    Mensaje reensamblado que vive en un archivo temporal en lugar de en
+    memoria. El mensaje empieza en el byte `inicio` del archivo (antes va la
+    cabecera de integridad, si la llevaba).
+    """
+    ruta: str
+    longitud: int
+    inicio: int = 0
+
+    def __len__(self):
+        return self.longitud
+
+    def leer(self, inicio: int = 0, cantidad: int = -1) -> bytes:
+        """Lee una porción del mensaje (por defecto, todo)"""
+        if cantidad < 0:
+            cantidad = self.longitud - inicio
+        with open(self.ruta, 'rb') as f:
+            f.seek(self.inicio + inicio)
+            return f.read(cantidad)
+
+    def eliminar(self):
+        """Borra el archivo temporal si todavía existe"""
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+
+class MapaFragmentos:
+    """
+    Bitmap de fragmentos recibidos: un bit por fragmento y un contador,
+    de modo que marcar un fragmento y comprobar si el mensaje está
+    completo cuestan O(1).
+    """
+    __slots__ = ('bits', 'total', 'recibidos')
+
+    def __init__(self, total: int):
+        self.bits = bytearray((total + 7) >> 3)
+        self.total = total
+        self.recibidos = 0
+
+    def __contains__(self, indice: int) -> bool:
+        return 0 <= indice < self.total and bool(self.bits[indice >> 3] & (1 << (indice & 7)))
+
+    def __len__(self):
+        return self.recibidos
+
+    def marcar(self, indice: int) -> bool:
+        """Marca un fragmento como recibido; devuelve False si ya estaba o está fuera de rango"""
+        if not 0 <= indice < self.total:
+            return False
+        byte, bit = indice >> 3, 1 << (indice & 7)
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        self.recibidos += 1
+        return True
+
+    def ampliar(self, total: int):
+        """Aumenta el total de fragmentos conservando los ya marcados"""
+        if total > self.total:
+            self.bits.extend(bytes(((total + 7) >> 3) - len(self.bits)))
+            self.total = total
+
+    @property
+    def completo(self) -> bool:
+        return self.recibidos >= self.total
+
+    @property
+    def faltantes(self) -> int:
+        return self.total - self.recibidos
+
+    def combinar(self, inicio: int, bitmap) -> int:
+        """
+        Marca los fragmentos de `bitmap` (mismo formato, a partir del índice
+        `inicio`, múltiplo de 8) y devuelve cuántos no estaban marcados.
+        """
+        byte_inicio = inicio >> 3
+        nuevos = 0
+        for desplazamiento, byte in enumerate(bitmap):
+            idx = byte_inicio + desplazamiento
+            if idx >= len(self.bits):
+                break
+            if idx == len(self.bits) - 1 and self.total & 7:
+                byte &= (1 << (self.total & 7)) - 1  # Sin bits más allá del total
+            nuevo = byte & ~self.bits[idx]
+            if nuevo:
+                self.bits[idx] |= nuevo
+                nuevos += bin(nuevo).count("1")
+        self.recibidos += nuevos
+        return nuevos
+
+    def desmarcar(self, inicio: int, fin: int) -> int:
+        """Olvida los fragmentos [inicio, fin); devuelve cuántos estaban marcados"""
+        quitados = 0
+        for indice in range(max(inicio, 0), min(fin, self.total)):
+            byte, bit = indice >> 3, 1 << (indice & 7)
+            if self.bits[byte] & bit:
+                self.bits[byte] &= ~bit
+                quitados += 1
+        self.recibidos -= quitados
+        return quitados
+
+    def contar(self, inicio: int, fin: int) -> int:
+        """Fragmentos marcados en [inicio, fin)"""
+        fin = min(fin, self.total)
+        if fin <= inicio:
+            return 0
+        primero, ultimo = inicio >> 3, (fin - 1) >> 3
+        valor = int.from_bytes(self.bits[primero:ultimo + 1], 'little')
+        valor >>= inicio & 7
+        valor &= (1 << (fin - inicio)) - 1
+        return bin(valor).count("1")
+
+    def marcar_hasta(self, fin: int) -> int:
+        """Marca todos los fragmentos anteriores a `fin`; devuelve cuántos no estaban marcados"""
+        fin = min(fin, self.total)
+        completos = fin >> 3
+        nuevos = self.combinar(0, b"\xff" * completos)
+        for indice in range(completos << 3, fin):
+            nuevos += self.marcar(indice)
+        return nuevos
+
+    def primer_faltante(self, desde: int = 0) -> int:
+        """Índice del primer fragmento que falta a partir de `desde` (total si no falta ninguno)"""
+        bits = self.bits
+        for byte_idx in range(desde >> 3, len(bits)):
+            byte = bits[byte_idx]
+            if byte != 0xFF:
+                for bit in range(8):
+                    if not byte & (1 << bit):
+                        indice = (byte_idx << 3) + bit
+                        if indice >= desde:
+                            return min(indice, self.total)
+        return self.total
+
+    def indices_faltantes(self, limite: Optional[int] = None) -> List[int]:
+        """Lista (opcionalmente acotada) de los fragmentos que aún faltan"""
+        resultado = []
+        for byte_idx, byte in enumerate(self.bits):
+            if byte == 0xFF:
+                continue
+            for bit in range(8):
+                indice = (byte_idx << 3) + bit
+                if indice >= self.total:
+                    return resultado
+                if not byte & (1 << bit):
+                    resultado.append(indice)
+                    if limite is not None and len(resultado) >= limite:
+                        return resultado
+        return resultado
+
 
 class FragmentManager:
-    def __init__(self, progress_callback=None):
+    def __init__(self, progress_callback=None, umbral_disco: int = 16 * 1024 * 1024, directorio_temporal: str = "downloads"):
         self.fragmentos_pendientes: Dict[str, Dict] = {}
         self.timeout = 1800  # 30 minutos para archivos grandes
         self.lock = Lock()  # Para thread safety
         self.progress_callback = progress_callback  # Callback para mostrar progreso
+        # Mensajes de al menos este tamaño se reensamblan directamente en disco
+        self.umbral_disco = umbral_disco
+        self.directorio_temporal = directorio_temporal
+        self.bytes_copiados = 0  # Bytes de payload copiados a su destino (buffer o archivo)
+        self.checkpoint_cada = 4096  # Fragmentos nuevos entre checkpoints de una transferencia reanudable
+        self.reparaciones_recibidas = 0  # Frames de reparación FEC guardados (ver agregar_reparacion)
+        self.fragmentos_reparados = 0  # Fragmentos perdidos recuperados con FEC
+        self.trozos_verificados = 0  # Trozos con cabecera de integridad comprobados (ver integridad.py)
+        self.trozos_corruptos = 0
+        # (mac_origen, id_mensaje, inicio, fin) -> bool: se llama al rechazar los fragmentos
+        # [inicio, fin) de un trozo corrupto; True si se han vuelto a pedir, si no el mensaje se descarta
+        self.rechazo_callback = None
+        self.descartados = OrderedDict()  # Claves de mensajes descartados: sus fragmentos tardíos se ignoran
+        # Último fragmento llegado antes que cualquier otro de su mensaje: hasta ver uno
+        # completo no se sabe el tamaño de fragmento (ver agregar_fragmento)
+        self.adelantados = OrderedDict()
+        
+    def _abrir_archivo_temporal(self, total_fragmentos: int, tamaño_fragmento: int):
+        """Crea y preasigna el archivo donde se escriben los fragmentos en su offset"""
+        os.makedirs(self.directorio_temporal, exist_ok=True)
+        fd, ruta = tempfile.mkstemp(prefix="linkchat_", suffix=".part", dir=self.directorio_temporal)
+        tamaño = total_fragmentos * tamaño_fragmento
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, tamaño)
+            else:
+                os.ftruncate(fd, tamaño)
+        except OSError:
+            # Sistemas de archivos sin fallocate: el archivo crece al escribir
+            pass
+        return os.fdopen(fd, 'r+b'), ruta
+    
+    def _cerrar_archivo_temporal(self, mensaje: Dict, eliminar: bool = True):
+        """Cierra (y opcionalmente borra) el archivo temporal de un mensaje en disco"""
+        archivo = mensaje.get('archivo')
+        if archivo is None:
+            return
+        try:
+            archivo.close()
+        except OSError:
+            pass
+        mensaje['archivo'] = None
+        if eliminar:
+            MensajeEnDisco(mensaje['ruta'], 0).eliminar()
         
-    def agregar_fragmento(self, id_mensaje: int, num_fragmento: int, total_fragmentos: int, datos: bytes, mac_origen: str) -> Optional[bytes]:
-        #Agrega un fragmento y devuelve el mensaje completo si está listo
+    def cubierto_por_integridad(self, id_mensaje: int, total_fragmentos: int, mac_origen: str) -> bool:
+        """
+        True si el mensaje ya tiene cargada su cabecera de integridad: un
+        payload corrupto se detectará al comprobar su trozo, así que el CRC
+        de cada frame sobra. Sin lock (leer del dict es atómico); en el peor
+        caso se comprueba un CRC de más.
+        """
+        mensaje = self.fragmentos_pendientes.get(f"{mac_origen}_{id_mensaje}")
+        if mensaje is None or mensaje['total_fragmentos'] != total_fragmentos:
+            return False
+        verificador = mensaje.get('integridad')
+        return bool(verificador) and verificador.cargado
+
+    def agregar_fragmento(self, id_mensaje: int, num_fragmento: int, total_fragmentos: int, datos, mac_origen: str) -> Optional[Union[bytearray, MensajeEnDisco]]:
+        #Agrega un fragmento y devuelve el mensaje completo si está listo.
+        #`datos` puede ser una memoryview sobre el buffer de recepción: se copia
+        #una sola vez, directamente a su offset en el buffer o archivo del mensaje.
+        #Los mensajes grandes se devuelven como MensajeEnDisco en lugar de bytearray.
+        #El tamaño de fragmento depende de la MTU del emisor: es el de cualquier
+        #fragmento salvo el último, así que se toma del primero que llega
         with self.lock:
             clave = f"{mac_origen}_{id_mensaje}"
+            traza = log.isEnabledFor(TRAZA)
             
-            print(f"🔧 FragmentManager: Agregando fragmento {num_fragmento} (total: {total_fragmentos})")
-            print(f"🔧 FragmentManager: Clave: {clave}")
-            print(f"🔧 FragmentManager: Tamaño datos: {len(datos)} bytes")
+            if self.descartados and self.descartados.get(clave) == total_fragmentos:
+                return None
             
             if clave not in self.fragmentos_pendientes:
+                if num_fragmento < total_fragmentos - 1:
+                    tamaño_fragmento = len(datos)
+                elif total_fragmentos == 1:
+                    tamaño_fragmento = max(len(datos), PAYLOAD_MAXIMO)
+                else:
+                    # El último no dice el tamaño de los demás: se guarda hasta que llegue otro
+                    self.adelantados[clave] = (total_fragmentos, num_fragmento, bytes(datos))
+                    while len(self.adelantados) > 256:
+                        self.adelantados.popitem(last=False)
+                    return None
                 # NUEVO: Inicializar con diccionario para manejar fragmentos fuera de orden
                 self.fragmentos_pendientes[clave] = {
                     'total_fragmentos': total_fragmentos,
-                    'fragmentos_recibidos': {},  # Usar diccionario en lugar de lista
+                    'tamaño_fragmento': tamaño_fragmento,  # Offset de cada fragmento = número × tamaño
+                    'buffer': None,  # Mensaje preasignado (solo en memoria)
                     'timestamp': time.time(),
                     'mac_origen': mac_origen,
                     'id_mensaje': id_mensaje,
                     'bytes_totales': 0,
-                    'fragmentos_esperados': set(range(total_fragmentos))  # NUEVO: saber qué fragmentos esperamos
+                    'mapa': MapaFragmentos(total_fragmentos),  # Un bit por fragmento esperado
+                    'archivo': None,
+                    'ruta': None,
+                    'longitud_ultimo': None
                 }
-                print(f"🔧 FragmentManager: Nuevo mensaje {clave} con {total_fragmentos} fragmentos")
+                if total_fragmentos * tamaño_fragmento >= self.umbral_disco:
+                    # Mensaje grande: cada fragmento va directo a su offset en disco
+                    mensaje_nuevo = self.fragmentos_pendientes[clave]
+                    mensaje_nuevo['archivo'], mensaje_nuevo['ruta'] = self._abrir_archivo_temporal(
+                        total_fragmentos, tamaño_fragmento)
+                    log.info("💾 FragmentManager: Reensamblando %s en disco (%s)", clave, mensaje_nuevo['ruta'])
+                else:
+                    self.fragmentos_pendientes[clave]['buffer'] = bytearray(total_fragmentos * tamaño_fragmento)
+                log.debug("🔧 FragmentManager: Nuevo mensaje %s con %d fragmentos de %d bytes", clave,
+                          total_fragmentos, tamaño_fragmento)
+                adelantado = self.adelantados.pop(clave, None) if self.adelantados else None
+                if adelantado is not None and adelantado[0] == total_fragmentos and len(adelantado[2]) <= tamaño_fragmento:
+                    self._almacenar(self.fragmentos_pendientes[clave], adelantado[1], adelantado[2])
             
             mensaje = self.fragmentos_pendientes[clave]
+            tamaño_fragmento = mensaje['tamaño_fragmento']
             
             # NUEVO: Actualizar total_fragmentos si recibimos uno mayor
             if total_fragmentos > mensaje['total_fragmentos']:
-                print(f"🔧 FragmentManager: Actualizando total de {mensaje['total_fragmentos']} a {total_fragmentos}")
+                log.debug("🔧 FragmentManager: Actualizando total de %d a %d", mensaje['total_fragmentos'], total_fragmentos)
                 mensaje['total_fragmentos'] = total_fragmentos
                 # Actualizar fragmentos esperados
-                mensaje['fragmentos_esperados'] = set(range(total_fragmentos))
-            
-            # Almacenar el fragmento en el diccionario
-            if num_fragmento not in mensaje['fragmentos_recibidos']:
-                mensaje['fragmentos_recibidos'][num_fragmento] = datos
-                mensaje['bytes_totales'] += len(datos)
-                mensaje['timestamp'] = time.time()
-                print(f" FragmentManager: Fragmento {num_fragmento} almacenado")
-            else:
-                print(f"  FragmentManager: Fragmento {num_fragmento} ya estaba almacenado")
+                mensaje['mapa'].ampliar(total_fragmentos)
+                if mensaje['buffer'] is not None:
+                    mensaje['buffer'].extend(bytes(total_fragmentos * tamaño_fragmento - len(mensaje['buffer'])))
             
-            # VERIFICACIÓN CORREGIDA: Comprobar si tenemos todos los fragmentos esperados
-            fragmentos_recibidos = set(mensaje['fragmentos_recibidos'].keys())
-            fragmentos_faltantes = mensaje['fragmentos_esperados'] - fragmentos_recibidos
+            mapa = mensaje['mapa']
+            longitud = len(datos)
+            if longitud > tamaño_fragmento:
+                log.warning("⚠️ FragmentManager: Fragmento %d de %s demasiado grande (%d bytes), descartado",
+                            num_fragmento, clave, longitud)
+                return None
             
-            print(f" FragmentManager: Fragmentos recibidos: {len(fragmentos_recibidos)}/{mensaje['total_fragmentos']}")
-            print(f" FragmentManager: Fragmentos faltantes: {sorted(fragmentos_faltantes)}")
-            
-            if not fragmentos_faltantes:
-                # ¡Todos los fragmentos recibidos!
-                print(f"🎉 FragmentManager: TODOS los fragmentos recibidos para {clave}")
-                
-                try:
-                    # Reensamblar en orden
-                    print(f"🔧 Reensamblando {mensaje['total_fragmentos']} fragmentos...")
-                    fragmentos_ordenados = []
-                    bytes_totales = 0
-                    for i in range(mensaje['total_fragmentos']):
-                        fragmento = mensaje['fragmentos_recibidos'][i]
-                        fragmentos_ordenados.append(fragmento)
-                        bytes_totales += len(fragmento)
-                    
-                    mensaje_completo = b''.join(fragmentos_ordenados)
-                    print(f"✅ FragmentManager: Mensaje reensamblado - {len(mensaje_completo)} bytes ({len(mensaje_completo) / (1024*1024):.1f} MB)")
-                    
-                    # Limpiar
-                    del self.fragmentos_pendientes[clave]
-                    return mensaje_completo
-                    
-                except Exception as e:
-                    print(f"❌ FragmentManager: Error reensamblando mensaje: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    del self.fragmentos_pendientes[clave]
+            # Copiar el fragmento a su offset (en disco o en el buffer del mensaje)
+            if self._almacenar(mensaje, num_fragmento, datos):
+                if traza:
+                    log.log(TRAZA, " FragmentManager: Fragmento %d de %s almacenado (%d/%d)", num_fragmento,
+                            clave, mapa.recibidos, mensaje['total_fragmentos'])
+                if mensaje.get('fec'):
+                    # Llegó tarde un fragmento de un grupo con reparaciones guardadas
+                    self._reparar(clave, mensaje, num_fragmento // mensaje['fec_k'])
+                if mensaje.get('descartar'):
+                    self._descartar(clave, mensaje)
                     return None
+            elif traza:
+                log.log(TRAZA, "  FragmentManager: Fragmento %d ya estaba almacenado o fuera de rango", num_fragmento)
+            
+            # Comprobar si tenemos todos los fragmentos esperados (O(1) con el bitmap)
+            if mapa.completo:
+                return self._entregar(clave, mensaje)
             else:
                 # Mostrar progreso detallado cada 100 fragmentos o 10%
-                progreso = len(fragmentos_recibidos) / mensaje['total_fragmentos'] * 100
-                if len(fragmentos_recibidos) % 100 == 0 or progreso % 10 < 1:
+                progreso = mapa.recibidos / mensaje['total_fragmentos'] * 100
+                if mapa.recibidos % 100 == 0 or progreso % 10 < 1:
                     mb_recibidos = mensaje['bytes_totales'] / (1024 * 1024)
-                    print(f"📊 FragmentManager: Progreso: {progreso:.1f}% ({len(fragmentos_recibidos)}/{mensaje['total_fragmentos']}) - {mb_recibidos:.1f} MB recibidos")
+                    log.debug("📊 FragmentManager: Progreso: %.1f%% (%d/%d) - %.1f MB recibidos", progreso,
+                              mapa.recibidos, mensaje['total_fragmentos'], mb_recibidos)
                     
                     # Llamar callback de progreso si está disponible
                     if self.progress_callback:
                         try:
                             self.progress_callback(
                                 mac_origen, 
-                                len(fragmentos_recibidos), 
+                                mapa.recibidos, 
                                 mensaje['total_fragmentos'], 
                                 mensaje['bytes_totales']
                             )
                         except Exception as e:
-                            print(f"❌ Error en progress_callback: {e}")
+                            log.error("❌ Error en progress_callback: %s", e)
             
             # Limpiar mensajes antiguos
             self._limpiar_antiguos()
         
             return None
     
+    def _almacenar(self, mensaje: Dict, num_fragmento: int, datos) -> bool:
+        """Copia un fragmento nuevo a su offset; False si ya estaba o está fuera de rango"""
+        mapa = mensaje['mapa']
+        if not mapa.marcar(num_fragmento):
+            return False
+        longitud = len(datos)
+        offset = num_fragmento * mensaje['tamaño_fragmento']
+        if mensaje['archivo'] is not None:
+            os.pwrite(mensaje['archivo'].fileno(), datos, offset)
+        else:
+            mensaje['buffer'][offset:offset + longitud] = datos
+        if num_fragmento == mensaje['total_fragmentos'] - 1:
+            mensaje['longitud_ultimo'] = longitud
+        self.bytes_copiados += longitud
+        mensaje['bytes_totales'] += longitud
+        mensaje['timestamp'] = time.time()
+        if mensaje.get('integridad') is not False:
+            self._comprobar_integridad(mensaje, num_fragmento)
+        if mensaje.get('checkpoint') is not None:
+            mensaje['desde_checkpoint'] += 1
+            if mensaje['desde_checkpoint'] >= self.checkpoint_cada and not mapa.completo:
+                self._guardar_checkpoint(mensaje)
+        return True
+
+    def _comprobar_integridad(self, mensaje: Dict, num_fragmento: int):
+        """
+        Tras almacenar un fragmento: lee la cabecera de integridad cuando está
+        completa y comprueba cada trozo en cuanto tiene todos sus fragmentos.
+        """
+        mapa = mensaje['mapa']
+        verificador = mensaje.get('integridad')
+        if verificador is None:
+            if 0 not in mapa:
+                return  # Sin el fragmento 0 aún no se sabe si lleva cabecera
+            try:
+                verificador = VerificadorTrozos.desde_inicio(
+                    self._leer_fragmento(mensaje, 0, CABECERA_INTEGRIDAD.size), mensaje['total_fragmentos'],
+                    mensaje['tamaño_fragmento'])
+            except ValueError as e:
+                log.warning("⚠️ FragmentManager: Cabecera de integridad no válida en %s_%s: %s",
+                            mensaje['mac_origen'], mensaje['id_mensaje'], e)
+                self.trozos_corruptos += 1
+                self._rechazar(mensaje, 0, 1)
+                return
+            mensaje['integridad'] = verificador if verificador is not None else False
+            if verificador is None:
+                return
+        if not verificador.cargado:
+            if mapa.primer_faltante() < verificador.fragmentos_cabecera:
+                return
+            try:
+                verificador.cargar(self._leer_fragmento(mensaje, 0, verificador.longitud))
+            except ValueError as e:
+                log.warning("⚠️ FragmentManager: Cabecera de integridad corrupta en %s_%s: %s",
+                            mensaje['mac_origen'], mensaje['id_mensaje'], e)
+                mensaje['integridad'] = None
+                self.trozos_corruptos += 1
+                self._rechazar(mensaje, 0, verificador.fragmentos_cabecera)
+                return
+            total = mensaje['total_fragmentos']
+            verificador.faltan = [0] * verificador.trozos
+            for trozo in range(verificador.trozos):
+                inicio, fin = verificador.fragmentos(trozo, total)
+                verificador.faltan[trozo] = (fin - inicio) - mapa.contar(inicio, fin)
+            for trozo, faltan in enumerate(verificador.faltan):
+                if faltan == 0:
+                    if mensaje.get('reanudado'):
+                        self.trozos_verificados += 1  # Del checkpoint: ya se escribió y se confirmó
+                    else:
+                        self._verificar_trozo(mensaje, verificador, trozo)
+            return
+        trozo = verificador.trozo(num_fragmento)
+        verificador.faltan[trozo] -= 1
+        if verificador.faltan[trozo] == 0:
+            self._verificar_trozo(mensaje, verificador, trozo)
+
+    def _verificar_trozo(self, mensaje: Dict, verificador: VerificadorTrozos, trozo: int):
+        """Compara un trozo completo con su digest; si no coincide, se rechazan sus fragmentos"""
+        inicio, fin = verificador.bytes_de(trozo, self._longitud_final(mensaje))
+        if mensaje['archivo'] is not None:
+            correcto = verificador.comprobar(trozo, os.pread(mensaje['archivo'].fileno(), fin - inicio, inicio))
+        else:
+            with memoryview(mensaje['buffer']) as vista:
+                correcto = verificador.comprobar(trozo, vista[inicio:fin])
+        if correcto:
+            self.trozos_verificados += 1
+            return
+        self.trozos_corruptos += 1
+        primero, ultimo = verificador.fragmentos(trozo, mensaje['total_fragmentos'])
+        log.warning("⚠️ FragmentManager: Trozo %d de %s_%s corrupto (fragmentos %d-%d)", trozo,
+                    mensaje['mac_origen'], mensaje['id_mensaje'], primero, ultimo - 1)
+        self._rechazar(mensaje, primero, ultimo)
+        verificador.faltan[trozo] = ultimo - primero
+
+    def _rechazar(self, mensaje: Dict, inicio: int, fin: int):
+        """Olvida los fragmentos [inicio, fin) y los vuelve a pedir; si no se puede, el mensaje se descarta"""
+        quitados = mensaje['mapa'].desmarcar(inicio, fin)
+        mensaje['bytes_totales'] = max(0, mensaje['bytes_totales'] - quitados * mensaje['tamaño_fragmento'])
+        if mensaje.get('checkpoint') is not None:
+            self._guardar_checkpoint(mensaje)  # Que un checkpoint viejo no dé por buenos estos fragmentos
+        pedido = False
+        if self.rechazo_callback is not None:
+            try:
+                pedido = self.rechazo_callback(mensaje['mac_origen'], mensaje['id_mensaje'], inicio, fin)
+            except Exception as e:
+                log.error("❌ Error en rechazo_callback: %s", e)
+        if not pedido:
+            mensaje['descartar'] = True
+
+    def _descartar(self, clave: str, mensaje: Dict):
+        """Abandona un mensaje con datos corruptos que nadie va a reenviar"""
+        log.error("❌ FragmentManager: %s descartado: datos corruptos y el emisor no reenvía", clave)
+        del self.fragmentos_pendientes[clave]
+        self.descartados[clave] = mensaje['total_fragmentos']
+        while len(self.descartados) > 256:
+            self.descartados.popitem(last=False)
+        self._cerrar_archivo_temporal(mensaje)
+        if mensaje.get('checkpoint') is not None:
+            MensajeEnDisco(mensaje['checkpoint'], 0).eliminar()
+
+    def _entregar(self, clave: str, mensaje: Dict) -> Optional[Union[bytearray, MensajeEnDisco]]:
+        """Mensaje con todos sus fragmentos: lo saca de pendientes y lo devuelve"""
+        log.debug("🎉 FragmentManager: TODOS los fragmentos recibidos para %s", clave)
+
+        if mensaje['archivo'] is not None:
+            return self._finalizar_en_disco(clave, mensaje)
+
+        try:
+            # Los fragmentos ya están en su sitio: solo recortar el último hueco (y la cabecera de integridad)
+            mensaje_completo = mensaje['buffer']
+            del mensaje_completo[self._longitud_final(mensaje):]
+            if mensaje.get('integridad'):
+                del mensaje_completo[:mensaje['integridad'].longitud]
+            log.info("✅ FragmentManager: Mensaje reensamblado - %d bytes (%.1f MB)",
+                     len(mensaje_completo), len(mensaje_completo) / (1024 * 1024))
+
+            # Limpiar
+            del self.fragmentos_pendientes[clave]
+            return mensaje_completo
+
+        except Exception as e:
+            log.exception("❌ FragmentManager: Error reensamblando mensaje: %s", e)
+            del self.fragmentos_pendientes[clave]
+            return None
+
+    def agregar_reparacion(self, id_mensaje: int, grupo: int, total_fragmentos: int, k: int, m: int, indice: int,
+                           longitud_ultimo: int, paridad, mac_origen: str) -> Optional[Union[bytearray, MensajeEnDisco]]:
+        """
+        Agrega un fragmento de reparación FEC (ver fec.py) y recupera los
+        fragmentos perdidos de su grupo en cuanto hay suficientes.
+
+        Args:
+            id_mensaje: ID del mensaje
+            grupo: Número de grupo (fragmentos grupo*k .. grupo*k + k - 1)
+            total_fragmentos: Total de fragmentos de datos del mensaje
+            k: Fragmentos de datos por grupo
+            m: Reparaciones por grupo
+            indice: Índice de esta reparación (0..m-1)
+            longitud_ultimo: Longitud del último fragmento del grupo
+            paridad: Payload de reparación (puede ser una memoryview; se copia)
+            mac_origen: MAC del emisor
+
+        Returns:
+            El mensaje completo si la reparación lo completa, None en otro caso
+        """
+        with self.lock:
+            clave = f"{mac_origen}_{id_mensaje}"
+            mensaje = self.fragmentos_pendientes.get(clave)
+            # Sin mensaje pendiente ya se completó (o se perdió el grupo entero): nada que reparar
+            if mensaje is None or mensaje['total_fragmentos'] != total_fragmentos or indice >= m or k < 1:
+                return None
+            inicio = grupo * k
+            fin = min(inicio + k, total_fragmentos)
+            mapa = mensaje['mapa']
+            if inicio >= fin or all(i in mapa for i in range(inicio, fin)):
+                return None
+            fec = mensaje.setdefault('fec', {})
+            mensaje['fec_k'] = k
+            reparaciones = fec.setdefault(grupo, {'m': m, 'ultimo': longitud_ultimo, 'paridad': {}})
+            reparaciones['paridad'][indice] = bytes(paridad)
+            self.reparaciones_recibidas += 1
+            self._reparar(clave, mensaje, grupo)
+            if mensaje.get('descartar'):
+                self._descartar(clave, mensaje)
+                return None
+            if mapa.completo:
+                return self._entregar(clave, mensaje)
+            return None
+
+    def _reparar(self, clave: str, mensaje: Dict, grupo: int):
+        """Recupera los fragmentos que faltan en `grupo` si hay tantas reparaciones como pérdidas"""
+        reparaciones = mensaje['fec'].get(grupo)
+        if reparaciones is None:
+            return
+        mapa = mensaje['mapa']
+        inicio = grupo * mensaje['fec_k']
+        fin = min(inicio + mensaje['fec_k'], mensaje['total_fragmentos'])
+        faltan = [i for i in range(inicio, fin) if i not in mapa]
+        paridad = reparaciones['paridad']
+        if faltan and len(faltan) > len(paridad):
+            return  # Aún no se puede: esperar más reparaciones
+        del mensaje['fec'][grupo]
+        if not faltan:
+            return
+        longitud = len(next(iter(paridad.values())))
+        presentes = {i - inicio: self._leer_fragmento(mensaje, i, longitud) for i in range(inicio, fin) if i in mapa}
+        try:
+            recuperados = reconstruir(presentes, paridad, [i - inicio for i in faltan], reparaciones['m'], longitud)
+        except ValueError as e:
+            log.warning("⚠️ FragmentManager: Reparación FEC de %s (grupo %d) imposible: %s", clave, grupo, e)
+            return
+        for relativo, payload in recuperados.items():
+            indice = inicio + relativo
+            largo = reparaciones['ultimo'] if indice == fin - 1 else longitud
+            self._almacenar(mensaje, indice, memoryview(payload)[:largo])
+        self.fragmentos_reparados += len(recuperados)
+        log.debug("🩹 FragmentManager: %d fragmento(s) de %s recuperados con FEC (grupo %d)", len(recuperados),
+                  clave, grupo)
+
+    @staticmethod
+    def _leer_fragmento(mensaje: Dict, indice: int, longitud: int) -> bytes:
+        """Payload ya almacenado de un fragmento (con el relleno a cero hasta `longitud`)"""
+        offset = indice * mensaje['tamaño_fragmento']
+        if mensaje['archivo'] is not None:
+            return os.pread(mensaje['archivo'].fileno(), longitud, offset)
+        return bytes(mensaje['buffer'][offset:offset + longitud])
+
+    @staticmethod
+    def _longitud_final(mensaje: Dict) -> int:
+        """Longitud del mensaje completo: todos los fragmentos llenos salvo el último"""
+        tamaño_fragmento = mensaje['tamaño_fragmento']
+        ultimo = mensaje['longitud_ultimo'] if mensaje['longitud_ultimo'] is not None else tamaño_fragmento
+        return (mensaje['total_fragmentos'] - 1) * tamaño_fragmento + ultimo
+
+    def _finalizar_en_disco(self, clave: str, mensaje: Dict) -> Optional[MensajeEnDisco]:
+        """Ajusta el tamaño final del archivo temporal y lo entrega como MensajeEnDisco"""
+        try:
+            longitud = self._longitud_final(mensaje)
+            mensaje['archivo'].truncate(longitud)
+            self._cerrar_archivo_temporal(mensaje, eliminar=False)
+            if mensaje.get('checkpoint') is not None:
+                MensajeEnDisco(mensaje['checkpoint'], 0).eliminar()
+            log.info("✅ FragmentManager: Mensaje reensamblado en disco - %d bytes (%.1f MB)",
+                     longitud, longitud / (1024 * 1024))
+            inicio = mensaje['integridad'].longitud if mensaje.get('integridad') else 0
+            return MensajeEnDisco(mensaje['ruta'], longitud - inicio, inicio)
+        except Exception as e:
+            log.error("❌ FragmentManager: Error finalizando mensaje en disco: %s", e)
+            self._cerrar_archivo_temporal(mensaje)
+            return None
+        finally:
+            del self.fragmentos_pendientes[clave]
+    
     def _limpiar_antiguos(self):
         """Elimina mensajes fragmentados antiguos"""
         ahora = time.time()
@@ -118,19 +617,164 @@ class FragmentManager:
             tiempo_transcurrido = ahora - mensaje['timestamp']
             if tiempo_transcurrido > self.timeout:
                 claves_a_eliminar.append(clave)
-                fragmentos_recibidos = len(mensaje['fragmentos_recibidos'])
+                fragmentos_recibidos = mensaje['mapa'].recibidos
                 minutos_transcurridos = tiempo_transcurrido / 60
-                print(f"⏰ FragmentManager: Timeout para {clave} - {fragmentos_recibidos}/{mensaje['total_fragmentos']} fragmentos después de {minutos_transcurridos:.1f} minutos")
+                log.warning("⏰ FragmentManager: Timeout para %s - %d/%d fragmentos después de %.1f minutos",
+                            clave, fragmentos_recibidos, mensaje['total_fragmentos'], minutos_transcurridos)
         
         for clave in claves_a_eliminar:
-            del self.fragmentos_pendientes[clave]
+            mensaje = self.fragmentos_pendientes.pop(clave)
+            if mensaje.get('checkpoint') is not None:
+                # Reanudable: se conserva en disco para cuando el emisor vuelva
+                self._guardar_checkpoint(mensaje)
+                self._cerrar_archivo_temporal(mensaje, eliminar=False)
+            else:
+                self._cerrar_archivo_temporal(mensaje)
     
+    def reanudar(self, mac_origen: str, id_mensaje: int, total_fragmentos: int, nombre: str,
+                 tamaño_fragmento: int = PAYLOAD_MAXIMO) -> MapaFragmentos:
+        """
+        Prepara la recepción reanudable de un mensaje identificado por `nombre`
+        (la huella de su contenido): se reensambla en disco en
+        linkchat_<nombre>.part y su bitmap se guarda en linkchat_<nombre>.mapa.
+        Si existe un checkpoint compatible (mismo total y tamaño de fragmento)
+        se continúa desde él.
+
+        Returns:
+            MapaFragmentos: Fragmentos que ya se tienen
+        """
+        with self.lock:
+            clave = f"{mac_origen}_{id_mensaje}"
+            if clave in self.fragmentos_pendientes:
+                return self.fragmentos_pendientes[clave]['mapa']
+            ruta = os.path.join(self.directorio_temporal, f"linkchat_{nombre}.part")
+            ruta_checkpoint = os.path.join(self.directorio_temporal, f"linkchat_{nombre}.mapa")
+
+            # El emisor reintenta con otro ID de mensaje: la recepción en curso cambia de clave
+            for otra, mensaje in self.fragmentos_pendientes.items():
+                if (mensaje.get('checkpoint') == ruta_checkpoint and mensaje['total_fragmentos'] == total_fragmentos
+                        and mensaje['tamaño_fragmento'] == tamaño_fragmento):
+                    del self.fragmentos_pendientes[otra]
+                    mensaje['id_mensaje'] = id_mensaje
+                    mensaje['timestamp'] = time.time()
+                    self.fragmentos_pendientes[clave] = mensaje
+                    log.info("🔁 FragmentManager: %s continúa como %s", otra, clave)
+                    return mensaje['mapa']
+
+            os.makedirs(self.directorio_temporal, exist_ok=True)
+            mapa, longitud_ultimo = self._leer_checkpoint(ruta_checkpoint, total_fragmentos, tamaño_fragmento)
+            if mapa is not None and os.path.exists(ruta):
+                archivo = open(ruta, 'r+b')
+                log.info("🔁 FragmentManager: Reanudando %s desde checkpoint (%d/%d fragmentos)", clave,
+                         mapa.recibidos, total_fragmentos)
+            else:
+                mapa, longitud_ultimo = MapaFragmentos(total_fragmentos), None
+                archivo = open(ruta, 'w+b')
+                try:
+                    if hasattr(os, 'posix_fallocate'):
+                        os.posix_fallocate(archivo.fileno(), 0, total_fragmentos * tamaño_fragmento)
+                except OSError:
+                    pass
+            self.fragmentos_pendientes[clave] = {
+                'total_fragmentos': total_fragmentos,
+                'tamaño_fragmento': tamaño_fragmento,
+                'buffer': None,
+                'timestamp': time.time(),
+                'mac_origen': mac_origen,
+                'id_mensaje': id_mensaje,
+                'bytes_totales': mapa.recibidos * tamaño_fragmento,
+                'mapa': mapa,
+                'archivo': archivo,
+                'ruta': ruta,
+                'longitud_ultimo': longitud_ultimo,
+                'checkpoint': ruta_checkpoint,
+                'desde_checkpoint': 0,
+                'reanudado': mapa.recibidos > 0
+            }
+            return mapa
+
+    @staticmethod
+    def _leer_checkpoint(ruta: str, total_fragmentos: int,
+                         tamaño_fragmento: int) -> Tuple[Optional[MapaFragmentos], Optional[int]]:
+        """Bitmap y longitud del último fragmento de un checkpoint; (None, None) si no sirve"""
+        try:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            if contenido[:4] == MAGIA_CHECKPOINT_V1:
+                magia, total, longitud_ultimo = CABECERA_CHECKPOINT_V1.unpack_from(contenido)
+                tamaño, inicio = PAYLOAD_MAXIMO, CABECERA_CHECKPOINT_V1.size
+            else:
+                magia, total, longitud_ultimo, tamaño = CABECERA_CHECKPOINT.unpack_from(contenido)
+                inicio = CABECERA_CHECKPOINT.size
+        except (OSError, struct.error):
+            return None, None
+        bits = contenido[inicio:]
+        if (magia not in (MAGIA_CHECKPOINT, MAGIA_CHECKPOINT_V1) or total != total_fragmentos
+                or tamaño != tamaño_fragmento or len(bits) != (total + 7) >> 3):
+            log.warning("⚠️ FragmentManager: Checkpoint %s no válido, se descarta", ruta)
+            return None, None
+        mapa = MapaFragmentos(total)
+        mapa.combinar(0, bits)
+        return mapa, (longitud_ultimo if longitud_ultimo >= 0 else None)
+
+    def _guardar_checkpoint(self, mensaje: Dict):
+        """
+        Persiste el bitmap de un mensaje reanudable. Los datos se llevan a
+        disco antes que el bitmap, para que nunca anuncie fragmentos que no
+        están escritos; el reemplazo es atómico.
+        """
+        ruta = mensaje['checkpoint']
+        try:
+            if mensaje['archivo'] is not None:
+                os.fdatasync(mensaje['archivo'].fileno())
+            longitud_ultimo = mensaje['longitud_ultimo'] if mensaje['longitud_ultimo'] is not None else -1
+            temporal = ruta + ".tmp"
+            with open(temporal, 'wb') as f:
+                f.write(CABECERA_CHECKPOINT.pack(MAGIA_CHECKPOINT, mensaje['total_fragmentos'], longitud_ultimo,
+                                                 mensaje['tamaño_fragmento']))
+                f.write(mensaje['mapa'].bits)
+            os.replace(temporal, ruta)
+            mensaje['desde_checkpoint'] = 0
+        except OSError as e:
+            log.error("❌ FragmentManager: Error guardando checkpoint %s: %s", ruta, e)
+
+    def guardar_checkpoints(self):
+        """Guarda y cierra las recepciones reanudables en curso (al detener la comunicación)"""
+        with self.lock:
+            for clave in [c for c, m in self.fragmentos_pendientes.items() if m.get('checkpoint') is not None]:
+                mensaje = self.fragmentos_pendientes.pop(clave)
+                self._guardar_checkpoint(mensaje)
+                self._cerrar_archivo_temporal(mensaje, eliminar=False)
+                log.info("💾 FragmentManager: Checkpoint de %s guardado (%d/%d fragmentos)", clave,
+                         mensaje['mapa'].recibidos, mensaje['total_fragmentos'])
+
+    def cerrar(self):
+        """
+        Cierra las recepciones en curso (al detener la comunicación): las
+        reanudables guardan su checkpoint y el resto se descarta, borrando su
+        archivo temporal. Nadie más lo limpiaría: _limpiar_antiguos solo corre
+        al llegar fragmentos.
+        """
+        self.guardar_checkpoints()
+        with self.lock:
+            for clave, mensaje in self.fragmentos_pendientes.items():
+                self._cerrar_archivo_temporal(mensaje)
+                log.debug("🗑️ FragmentManager: Descartado %s sin completar (%d/%d fragmentos)", clave,
+                          mensaje['mapa'].recibidos, mensaje['total_fragmentos'])
+            self.fragmentos_pendientes.clear()
+            self.adelantados.clear()
+
+    def mapa(self, mac_origen: str, id_mensaje: int) -> Optional[MapaFragmentos]:
+        """Bitmap de recepción de un mensaje pendiente (None si no existe o ya se completó)"""
+        mensaje = self.fragmentos_pendientes.get(f"{mac_origen}_{id_mensaje}")
+        return mensaje['mapa'] if mensaje is not None else None
+
     def obtener_estado_ensamblaje(self):
         """Retorna estadísticas de ensamblaje"""
         with self.lock:
             total_mensajes = len(self.fragmentos_pendientes)
             total_fragmentos_esperados = sum(msg['total_fragmentos'] for msg in self.fragmentos_pendientes.values())
-            fragmentos_recibidos = sum(len(msg['fragmentos_recibidos']) for msg in self.fragmentos_pendientes.values())
+            fragmentos_recibidos = sum(msg['mapa'].recibidos for msg in self.fragmentos_pendientes.values())
             
             return {
                 'mensajes_pendientes': total_mensajes,
@@ -0,0 +1,191 @@
+"""
+Integridad por trozos de mensajes fragmentados
+
+Un mensaje puede empezar con una cabecera de integridad:
+
+    [4B magia][1B algoritmo][1B tamaño digest][2B tamaño de fragmento]
+    [4B fragmentos por trozo][4B trozos][raíz][digest de cada trozo]
+
+El trozo i son los fragmentos [i·F, (i+1)·F) y su digest cubre esos bytes
+del mensaje salvo los de la propia cabecera. La raíz es el digest de la
+parte fija y de la lista de digests: resume el mensaje entero y protege la
+lista. El receptor (FragmentManager) comprueba cada trozo en cuanto tiene
+todos sus fragmentos, así que un trozo corrupto se detecta (y se vuelve a
+pedir) sin esperar a tener el archivo completo.
+
+La magia empieza por 0x89, que no puede abrir un texto UTF-8 ni un
+FILE_TRANSFER:, así que los mensajes sin cabecera se distinguen sin ambigüedad.
+"""
+
+import functools
+import hashlib
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+from .frames import PAYLOAD_MAXIMO
+from .paralelo import mapa_ordenado
+
+MAGIA = b"\x89LCI"
+CABECERA = struct.Struct('>4sBBHII')  # magia, algoritmo, tamaño digest, tamaño fragmento, fragmentos/trozo, trozos
+ALGORITMOS = {'blake2b': 1, 'sha256': 2}
+TAM_DIGEST = 32
+FRAGMENTOS_POR_TROZO = 256  # ~370 KB por trozo con fragmentos de 1475 bytes
+
+
+def _digest(algoritmo: int, datos) -> bytes:
+    if algoritmo == 1:
+        return hashlib.blake2b(datos, digest_size=TAM_DIGEST).digest()
+    if algoritmo == 2:
+        return hashlib.sha256(datos).digest()
+    raise ValueError(f"Algoritmo de integridad desconocido: {algoritmo}")
+
+
+def dimensiones(longitud_cuerpo: int, tamaño_fragmento: int = PAYLOAD_MAXIMO,
+                fragmentos_por_trozo: int = FRAGMENTOS_POR_TROZO) -> Tuple[int, int]:
+    """
+    Trozos y longitud de la cabecera para un cuerpo de `longitud_cuerpo`
+    bytes (la cabecera también ocupa fragmentos, de ahí el punto fijo).
+
+    Returns:
+        (trozos, bytes de cabecera)
+    """
+    trozos = 1
+    while True:
+        longitud = CABECERA.size + TAM_DIGEST * (trozos + 1)
+        fragmentos = -(-(longitud + longitud_cuerpo) // tamaño_fragmento)
+        necesarios = -(-fragmentos // fragmentos_por_trozo)
+        if necesarios <= trozos:
+            return trozos, longitud
+        trozos = necesarios
+
+
+def cabecera_integridad(prefijo: bytes, archivo: BinaryIO, tamaño: int, algoritmo: str = "blake2b",
+                        fragmentos_por_trozo: int = FRAGMENTOS_POR_TROZO,
+                        tamaño_fragmento: int = PAYLOAD_MAXIMO) -> bytes:
+    """
+    Cabecera de integridad para un mensaje cuyo cuerpo es `prefijo` seguido
+    de `tamaño` bytes de `archivo` (desde su posición actual, que queda al
+    final). Los trozos se leen en orden y sus digests se calculan en el pool.
+
+    Returns:
+        bytes: Cabecera a anteponer al cuerpo
+    """
+    if algoritmo not in ALGORITMOS:
+        raise ValueError(f"Algoritmo no soportado: {algoritmo} (opciones: {', '.join(ALGORITMOS)})")
+    if fragmentos_por_trozo < 8 or fragmentos_por_trozo & 7:
+        raise ValueError("fragmentos_por_trozo debe ser un múltiplo de 8")
+    codigo = ALGORITMOS[algoritmo]
+    longitud_cuerpo = len(prefijo) + tamaño
+    trozos, longitud = dimensiones(longitud_cuerpo, tamaño_fragmento, fragmentos_por_trozo)
+    bytes_trozo = fragmentos_por_trozo * tamaño_fragmento
+
+    def leer(cantidad: int) -> bytes:
+        nonlocal prefijo
+        parte, prefijo = prefijo[:cantidad], prefijo[cantidad:]
+        if len(parte) < cantidad:
+            parte += archivo.read(cantidad - len(parte))
+        return parte
+
+    # Bytes de cuerpo de cada trozo (el primero pierde los que ocupa la cabecera)
+    tamaños = (max(0, min((i + 1) * bytes_trozo, longitud + longitud_cuerpo) - max(i * bytes_trozo, longitud))
+               for i in range(trozos))
+    digests = b"".join(mapa_ordenado(functools.partial(_digest, codigo), map(leer, tamaños)))
+    fija = CABECERA.pack(MAGIA, codigo, TAM_DIGEST, tamaño_fragmento, fragmentos_por_trozo, trozos)
+    return fija + _digest(codigo, fija + digests) + digests
+
+
+def longitud_cabecera(datos) -> int:
+    """Bytes de cabecera de integridad al inicio de `datos` (0 si no la lleva)"""
+    if len(datos) < CABECERA.size or bytes(datos[:4]) != MAGIA:
+        return 0
+    _, _, tamaño_digest, _, _, trozos = CABECERA.unpack_from(datos)
+    return CABECERA.size + tamaño_digest * (trozos + 1)
+
+
+def fragmento_de_cabecera(datos) -> Optional[int]:
+    """Tamaño de fragmento para el que se calculó la cabecera al inicio de `datos` (None si no la lleva)"""
+    if len(datos) < CABECERA.size or bytes(datos[:4]) != MAGIA:
+        return None
+    return CABECERA.unpack_from(datos)[3]
+
+
+class VerificadorTrozos:
+    """
+    Estado del receptor para un mensaje con cabecera de integridad: digests
+    esperados y fragmentos que le faltan a cada trozo para poder comprobarlo.
+    """
+    __slots__ = ('algoritmo', 'tamaño_fragmento', 'fragmentos_por_trozo', 'trozos', 'longitud',
+                 'fragmentos_cabecera', 'digests', 'faltan')
+
+    def __init__(self, algoritmo: int, tamaño_fragmento: int, fragmentos_por_trozo: int, trozos: int):
+        self.algoritmo = algoritmo
+        self.tamaño_fragmento = tamaño_fragmento
+        self.fragmentos_por_trozo = fragmentos_por_trozo
+        self.trozos = trozos
+        self.longitud = CABECERA.size + TAM_DIGEST * (trozos + 1)
+        self.fragmentos_cabecera = -(-self.longitud // tamaño_fragmento)
+        self.digests: Optional[bytes] = None  # Hasta tener la cabecera completa
+        self.faltan = []
+
+    @classmethod
+    def desde_inicio(cls, inicio, total_fragmentos: int,
+                     tamaño_fragmento: int = PAYLOAD_MAXIMO) -> Optional['VerificadorTrozos']:
+        """
+        Lee la parte fija de la cabecera al inicio del fragmento 0.
+
+        Returns:
+            None si el mensaje no lleva cabecera de integridad
+
+        Raises:
+            ValueError: Lleva la magia pero los campos no cuadran con el mensaje
+        """
+        if len(inicio) < CABECERA.size or bytes(inicio[:4]) != MAGIA:
+            return None
+        _, algoritmo, tamaño_digest, fragmento, por_trozo, trozos = CABECERA.unpack_from(inicio)
+        if algoritmo not in ALGORITMOS.values() or tamaño_digest != TAM_DIGEST:
+            raise ValueError(f"algoritmo {algoritmo} con digest de {tamaño_digest} bytes")
+        if fragmento != tamaño_fragmento:
+            raise ValueError(f"fragmentos de {fragmento} bytes, se esperaban {tamaño_fragmento}")
+        if por_trozo < 8 or por_trozo & 7 or trozos != -(-total_fragmentos // por_trozo):
+            raise ValueError(f"{trozos} trozos de {por_trozo} fragmentos para {total_fragmentos} fragmentos")
+        verificador = cls(algoritmo, fragmento, por_trozo, trozos)
+        if verificador.fragmentos_cabecera > total_fragmentos:
+            raise ValueError("la cabecera no cabe en el mensaje")
+        return verificador
+
+    @property
+    def cargado(self) -> bool:
+        return self.digests is not None
+
+    def cargar(self, cabecera: bytes):
+        """
+        Guarda los digests de la cabecera completa tras comprobar la raíz.
+
+        Raises:
+            ValueError: La raíz no coincide (cabecera corrupta)
+        """
+        fija = cabecera[:CABECERA.size]
+        raiz = cabecera[CABECERA.size:CABECERA.size + TAM_DIGEST]
+        digests = cabecera[CABECERA.size + TAM_DIGEST:self.longitud]
+        if _digest(self.algoritmo, fija + digests) != raiz:
+            raise ValueError("la raíz no coincide con los digests")
+        self.digests = digests
+
+    def trozo(self, fragmento: int) -> int:
+        return fragmento // self.fragmentos_por_trozo
+
+    def fragmentos(self, trozo: int, total_fragmentos: int) -> Tuple[int, int]:
+        """Rango [inicio, fin) de fragmentos del trozo"""
+        inicio = trozo * self.fragmentos_por_trozo
+        return inicio, min(inicio + self.fragmentos_por_trozo, total_fragmentos)
+
+    def bytes_de(self, trozo: int, longitud_mensaje: int) -> Tuple[int, int]:
+        """Rango [inicio, fin) de bytes del mensaje que cubre el digest del trozo"""
+        bytes_trozo = self.fragmentos_por_trozo * self.tamaño_fragmento
+        inicio = max(trozo * bytes_trozo, self.longitud)
+        return inicio, max(inicio, min((trozo + 1) * bytes_trozo, longitud_mensaje))
+
+    def comprobar(self, trozo: int, datos) -> bool:
+        """True si `datos` (los bytes de bytes_de) coinciden con el digest del trozo"""
+        esperado = self.digests[trozo * TAM_DIGEST:(trozo + 1) * TAM_DIGEST]
+        return _digest(self.algoritmo, datos) == esperado
@@ -0,0 +1,129 @@
+import time
+from threading import Lock
+from typing import Optional
+
+
+class Pacer:
+    """
+    Regulador de envío por token bucket en bytes/s y frames/s.
+
+    Cada frame consume tokens; si el cubo queda en deuda se duerme hasta el
+    instante (monotónico) en que la deuda se salda. Solo se duerme cuando la
+    espera acumulada supera `espera_minima`, y lo que se duerma de más se
+    recupera como crédito (hasta el tamaño de ráfaga), de modo que la
+    granularidad de time.sleep no limita el caudal medio.
+
+    Modos:
+        "fijo":        tasas constantes
+        "auto":        AIMD; sube la tasa de bytes mientras no se notifiquen
+                       pérdidas y la reduce a la mitad ante cada pérdida/NACK
+        "desactivado": sin regulación
+    """
+
+    def __init__(self, modo: str = "fijo", bytes_por_segundo: Optional[float] = None,
+                 frames_por_segundo: Optional[float] = 10000, rafaga_bytes: int = 256 * 1024,
+                 rafaga_frames: int = 64, espera_minima: float = 0.001,
+                 tasa_minima: float = 256 * 1024, tasa_maxima: float = 1.25e9,
+                 incremento_auto: float = 0.1, intervalo_auto: float = 0.1):
+        if modo not in ("fijo", "auto", "desactivado"):
+            raise ValueError(f"Modo de pacing no válido: {modo}")
+        self.modo = modo
+        self.bytes_por_segundo = bytes_por_segundo
+        self.frames_por_segundo = frames_por_segundo
+        self.rafaga_bytes = rafaga_bytes
+        self.rafaga_frames = rafaga_frames
+        self.espera_minima = espera_minima
+        self.tasa_minima = tasa_minima
+        self.tasa_maxima = tasa_maxima
+        self.incremento_auto = incremento_auto
+        self.intervalo_auto = intervalo_auto
+        self.lock = Lock()
+
+        if modo == "auto" and self.bytes_por_segundo is None:
+            self.bytes_por_segundo = 8 * 1024 * 1024  # Punto de partida conservador
+        self.tokens_bytes = float(rafaga_bytes)
+        self.tokens_frames = float(rafaga_frames)
+        self.ultimo = time.monotonic()
+        self.ultimo_ajuste = self.ultimo
+        self.ultimo_recorte = float("-inf")
+        self.perdidas = 0
+        self.recortes = 0
+
+    def esperar(self, num_bytes: int):
+        """Consume los tokens de un frame de `num_bytes` y duerme si hay deuda suficiente"""
+        espera = self.reservar(num_bytes)
+        if espera >= self.espera_minima:
+            # Dormir hasta la fecha límite; el exceso se recupera al rellenar
+            limite = time.monotonic() + espera
+            while True:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                time.sleep(restante)
+
+    def reservar(self, num_bytes: int) -> float:
+        """
+        Consume los tokens de un frame sin dormir y retorna los segundos que
+        habría que esperar antes de enviarlo (0 si no hay deuda). Lo usa el
+        bucle de eventos para programar un temporizador en lugar de bloquear.
+        """
+        if self.modo == "desactivado":
+            return 0.0
+        with self.lock:
+            ahora = time.monotonic()
+            self._rellenar(ahora)
+            if self.modo == "auto":
+                self._ajustar_auto(ahora)
+            espera = 0.0
+            if self.bytes_por_segundo:
+                self.tokens_bytes -= num_bytes
+                if self.tokens_bytes < 0:
+                    espera = -self.tokens_bytes / self.bytes_por_segundo
+            if self.frames_por_segundo:
+                self.tokens_frames -= 1
+                if self.tokens_frames < 0:
+                    espera = max(espera, -self.tokens_frames / self.frames_por_segundo)
+        return espera
+
+    def _rellenar(self, ahora: float):
+        transcurrido = ahora - self.ultimo
+        self.ultimo = ahora
+        if self.bytes_por_segundo:
+            self.tokens_bytes = min(self.rafaga_bytes, self.tokens_bytes + transcurrido * self.bytes_por_segundo)
+        if self.frames_por_segundo:
+            self.tokens_frames = min(self.rafaga_frames, self.tokens_frames + transcurrido * self.frames_por_segundo)
+
+    def _ajustar_auto(self, ahora: float):
+        """Aumento aditivo: sin pérdidas, sube la tasa un porcentaje cada intervalo"""
+        if ahora - self.ultimo_ajuste >= self.intervalo_auto:
+            self.ultimo_ajuste = ahora
+            self.bytes_por_segundo = min(self.tasa_maxima, self.bytes_por_segundo * (1 + self.incremento_auto))
+
+    def registrar_perdida(self):
+        """
+        Notifica pérdida en el receptor (NACK, timeout...); en modo auto reduce
+        la tasa a la mitad. Las pérdidas de una misma ráfaga llegan en varios
+        SACK seguidos, así que tras un recorte las siguientes no vuelven a
+        reducirla hasta pasado `intervalo_auto`.
+        """
+        with self.lock:
+            self.perdidas += 1
+            if self.modo != "auto":
+                return
+            ahora = time.monotonic()
+            if ahora - self.ultimo_recorte < self.intervalo_auto:
+                return
+            self.bytes_por_segundo = max(self.tasa_minima, self.bytes_por_segundo / 2)
+            self.ultimo_ajuste = self.ultimo_recorte = ahora
+            self.tokens_bytes = min(self.tokens_bytes, 0.0)
+            self.recortes += 1
+
+    def estado(self) -> dict:
+        """Retorna la configuración y tasa actuales"""
+        return {
+            'pacing_modo': self.modo,
+            'pacing_bytes_por_segundo': self.bytes_por_segundo,
+            'pacing_frames_por_segundo': self.frames_por_segundo,
+            'pacing_perdidas': self.perdidas,
+            'pacing_recortes': self.recortes
+        }
@@ -0,0 +1,204 @@
+import mmap
+import select
+import socket
+import struct
+import threading
+from typing import Iterator, Optional
+
+# Constantes de Linux para PACKET_MMAP (linux/if_packet.h)
+SOL_PACKET = getattr(socket, 'SOL_PACKET', 263)
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+PACKET_TX_RING = 13
+TPACKET_V2 = 1
+TPACKET_V3 = 2
+
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+TP_STATUS_AVAILABLE = 0
+TP_STATUS_SEND_REQUEST = 1
+TP_STATUS_WRONG_FORMAT = 4
+
+# struct tpacket_req: block_size, block_nr, frame_size, frame_nr
+TPACKET_REQ = struct.Struct('4I')
+# En TX con TPACKET_V2 los datos van tras la cabecera: TPACKET2_HDRLEN - sizeof(sockaddr_ll)
+TPACKET2_OFFSET_DATOS = 32
+
+# struct tpacket_req3: block_size, block_nr, frame_size, frame_nr, retire_blk_tov, sizeof_priv, feature_req_word
+TPACKET_REQ3 = struct.Struct('7I')
+# Campos de tpacket_block_desc que se usan (offsets dentro del bloque)
+OFFSET_BLOCK_STATUS = 8
+OFFSET_NUM_PKTS = 12
+OFFSET_FIRST_PKT = 16
+# struct tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net
+TPACKET3_HDR = struct.Struct('IIIIIIHH')
+
+
+class AnilloRecepcion:
+    """
+    Backend de recepción PACKET_RX_RING (TPACKET_V3).
+
+    El kernel escribe los frames en bloques de un anillo compartido mapeado
+    con mmap; un único poll() entrega bloques completos que se recorren con
+    memoryviews, sin una llamada al sistema ni una copia por frame.
+    """
+
+    def __init__(self, sock: socket.socket, tamaño_bloque: int = 1 << 20, num_bloques: int = 32,
+                 tamaño_frame: int = 2048, timeout_bloque_ms: int = 10):
+        self.sock = sock
+        self.tamaño_bloque = tamaño_bloque
+        self.num_bloques = num_bloques
+        self.bloque_actual = 0
+
+        sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        req = TPACKET_REQ3.pack(tamaño_bloque, num_bloques, tamaño_frame,
+                                (tamaño_bloque // tamaño_frame) * num_bloques,
+                                timeout_bloque_ms, 0, 0)
+        sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+        self.mapa = mmap.mmap(sock.fileno(), tamaño_bloque * num_bloques,
+                              mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.vista = memoryview(self.mapa)
+        self.poller = select.poll()
+        self.poller.register(sock.fileno(), select.POLLIN | select.POLLERR)
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que el kernel entregue un bloque; True si hay datos listos"""
+        if self._bloque_listo(self.bloque_actual):
+            return True
+        eventos = self.poller.poll(None if timeout is None else int(timeout * 1000))
+        return bool(eventos) and self._bloque_listo(self.bloque_actual)
+
+    def _bloque_listo(self, indice: int) -> bool:
+        base = indice * self.tamaño_bloque
+        estado, = struct.unpack_from('I', self.mapa, base + OFFSET_BLOCK_STATUS)
+        return bool(estado & TP_STATUS_USER)
+
+    def frames(self) -> Iterator[memoryview]:
+        """
+        Recorre todos los bloques listos y entrega cada frame como memoryview
+        sobre el anillo. Cada vista solo es válida hasta pedir el siguiente
+        frame del bloque siguiente: quien la use debe copiarla o consumirla antes.
+        """
+        while self._bloque_listo(self.bloque_actual):
+            base = self.bloque_actual * self.tamaño_bloque
+            num_paquetes, offset = struct.unpack_from('II', self.mapa, base + OFFSET_NUM_PKTS)
+            offset += base
+            for _ in range(num_paquetes):
+                siguiente, _, _, snaplen, _, _, mac, _ = TPACKET3_HDR.unpack_from(self.mapa, offset)
+                inicio = offset + mac
+                yield self.vista[inicio:inicio + snaplen]
+                offset += siguiente
+            # Devolver el bloque al kernel y avanzar
+            struct.pack_into('I', self.mapa, base + OFFSET_BLOCK_STATUS, TP_STATUS_KERNEL)
+            self.bloque_actual = (self.bloque_actual + 1) % self.num_bloques
+
+    def cerrar(self):
+        """Libera el mapeo del anillo"""
+        try:
+            self.poller.unregister(self.sock.fileno())
+        except (KeyError, ValueError, OSError):
+            pass
+        try:
+            self.vista.release()
+            self.mapa.close()
+        except BufferError:
+            # Aún hay vistas vivas sobre el anillo; se libera al recolectarlas
+            pass
+
+
+class AnilloTransmision:
+    """
+    Backend de envío PACKET_TX_RING (TPACKET_V2).
+
+    Los frames se copian en las ranuras de un anillo mapeado con mmap y se
+    marcan como listos; un único send() vacío pide al kernel que transmita
+    todas las ranuras pendientes. Usa su propio socket (protocolo 0, no
+    recibe nada) para no interferir con el socket de recepción.
+    """
+
+    def __init__(self, interfaz: str, tamaño_frame: int = 2048, num_frames: int = 1024,
+                 tamaño_bloque: int = 1 << 16, frames_por_lote: int = 256):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        self.sock.bind((interfaz, 0))
+        self.tamaño_frame = tamaño_frame
+        self.num_frames = num_frames
+        self.frames_por_lote = frames_por_lote
+        self.max_datos = tamaño_frame - TPACKET2_OFFSET_DATOS
+        self.indice = 0
+        self.pendientes = 0
+        self.lock = threading.Lock()
+
+        try:
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+            num_bloques = (tamaño_frame * num_frames) // tamaño_bloque
+            req = TPACKET_REQ.pack(tamaño_bloque, num_bloques, tamaño_frame, num_frames)
+            self.sock.setsockopt(SOL_PACKET, PACKET_TX_RING, req)
+            self.mapa = mmap.mmap(self.sock.fileno(), tamaño_frame * num_frames,
+                                  mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except OSError:
+            self.sock.close()
+            raise
+        self.vista = memoryview(self.mapa)
+        # Vista en palabras de 32 bits: tp_status, tp_len y tp_snaplen de cada ranura
+        self.palabras = self.vista.cast('I')
+        self.palabras_por_frame = tamaño_frame // 4
+
+    def encolar(self, frame: bytes) -> int:
+        """Copia un frame en la siguiente ranura libre; vacía el lote si está lleno"""
+        with self.lock:
+            return self._encolar_sin_lock(frame)
+
+    def encolar_lote(self, frames) -> int:
+        """Encola varios frames tomando el lock una sola vez; retorna los bytes encolados"""
+        total = 0
+        with self.lock:
+            for frame in frames:
+                total += self._encolar_sin_lock(frame)
+        return total
+
+    def _encolar_sin_lock(self, frame: bytes) -> int:
+        longitud = len(frame)
+        if longitud > self.max_datos:
+            raise ValueError(f"Frame de {longitud} bytes no cabe en una ranura de {self.max_datos}")
+        palabras = self.palabras
+        palabra = self.indice * self.palabras_por_frame
+        while palabras[palabra] != TP_STATUS_AVAILABLE:
+            if palabras[palabra] & TP_STATUS_WRONG_FORMAT:
+                palabras[palabra] = TP_STATUS_AVAILABLE
+                break
+            # Anillo lleno: pedir transmisión y esperar a que se libere la ranura
+            self._vaciar_sin_lock()
+        inicio = self.indice * self.tamaño_frame + TPACKET2_OFFSET_DATOS
+        self.vista[inicio:inicio + longitud] = frame
+        palabras[palabra + 1] = longitud
+        palabras[palabra + 2] = longitud
+        # El estado se escribe al final: cede la ranura al kernel
+        palabras[palabra] = TP_STATUS_SEND_REQUEST
+        self.indice += 1
+        if self.indice == self.num_frames:
+            self.indice = 0
+        self.pendientes += 1
+        if self.pendientes >= self.frames_por_lote:
+            self._vaciar_sin_lock()
+        return longitud
+
+    def vaciar(self):
+        """Transmite todas las ranuras pendientes con una sola llamada al sistema"""
+        with self.lock:
+            self._vaciar_sin_lock()
+
+    def _vaciar_sin_lock(self):
+        # Bloqueante: retorna cuando el kernel ha procesado todas las ranuras
+        self.sock.send(b"")
+        self.pendientes = 0
+
+    def cerrar(self):
+        """Envía lo pendiente y libera el anillo"""
+        try:
+            self.vaciar()
+        except OSError:
+            pass
+        self.palabras.release()
+        self.vista.release()
+        self.mapa.close()
+        self.sock.close()
@@ -0,0 +1,82 @@
+"""
+Trabajo de CPU por trozos en paralelo (compresión, hashes)
+
+zlib, bz2, lzma y hashlib liberan el GIL con bloques grandes, así que un
+pool de hilos escala con los núcleos sin copiar los datos a otro proceso.
+Para trabajo en Python puro (que no suelta el GIL) se puede pedir un pool
+de procesos; entonces la función y sus argumentos deben ser picklables.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+from .registro import obtener_logger
+
+log = obtener_logger(__name__)
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def trabajadores_por_defecto() -> int:
+    """Núcleos utilizables por el proceso"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def pool_compartido(procesos: bool = False) -> Executor:
+    """
+    Pool del proceso (uno de hilos y otro de procesos), creado la primera vez
+    que se pide, con un trabajador por núcleo.
+    """
+    with _lock:
+        pool = _pools.get(procesos)
+        if pool is None:
+            trabajadores = trabajadores_por_defecto()
+            pool = ProcessPoolExecutor(trabajadores) if procesos else ThreadPoolExecutor(
+                trabajadores, thread_name_prefix="linkchat-cpu")
+            _pools[procesos] = pool
+            log.debug("⚙️ Pool de %s con %d trabajador(es)", "procesos" if procesos else "hilos", trabajadores)
+        return pool
+
+
+def mapa_ordenado(funcion: Callable, entradas: Iterable, pool: Optional[Executor] = None,
+                  en_vuelo: Optional[int] = None) -> Iterator:
+    """
+    Como map(funcion, entradas), pero repartiendo las llamadas en `pool`.
+
+    Los resultados salen en el orden de las entradas y nunca hay más de
+    `en_vuelo` entradas leídas sin entregar, así que la memoria queda acotada
+    aunque `entradas` sea un archivo de varios GB. Sin pool, o con un único
+    núcleo, se llama en el propio hilo.
+
+    Args:
+        funcion: Trabajo por entrada; no debe esperar a otras tareas del mismo pool
+        entradas: Iterable (se consume a medida que hay hueco)
+        pool: Executor; por defecto, el pool compartido de hilos
+        en_vuelo: Máximo de tareas pendientes (por defecto, 2 por trabajador)
+    """
+    if pool is None:
+        if trabajadores_por_defecto() == 1:
+            yield from map(funcion, entradas)
+            return
+        pool = pool_compartido()
+    if en_vuelo is None:
+        en_vuelo = 2 * trabajadores_por_defecto()
+    pendientes = deque()
+    try:
+        for entrada in entradas:
+            if len(pendientes) >= en_vuelo:
+                yield pendientes.popleft().result()
+            pendientes.append(pool.submit(funcion, entrada))
+        while pendientes:
+            yield pendientes.popleft().result()
+    finally:
+        # Si el consumidor abandona (excepción o close()), no dejar trabajo colgado
+        for futuro in pendientes:
+            futuro.cancel()
@@ -0,0 +1,289 @@
+"""
+Planificador de envío por deficit round robin (DRR)
+
+Cada envío (un mensaje, un archivo, un lote de protocolo) registra su
+secuencia de frames como un FlujoEnvio. Un único "conductor" transmite a la
+vez: el hilo que llama a enviar_frame o el bucle de E/S para lo encolado en
+segundo plano. El conductor no vacía su flujo de principio a fin, sino que
+pide a turno() los frames siguientes y el planificador reparte el enlace
+entre todos los flujos activos por turnos de `quantum × peso` bytes. Así un
+mensaje de chat o un archivo pequeño salen tras, como mucho, un turno de
+cada transferencia en curso, aunque delante haya una de 10 GB.
+
+El peso de un flujo es el de su clase multiplicado por el de su par
+destino (la MAC del primer frame). El conductor cede el turno en cuanto
+termina su flujo y otro hilo con envíos pendientes lo recoge.
+
+Con prioridad estricta (por defecto) las clases no se reparten el enlace:
+mientras haya frames de control no sale nada interactivo, y mientras haya
+interactivos no sale nada masivo; el DRR solo reparte dentro de cada clase.
+Un flujo que llega con más prioridad que el turno en curso lo interrumpe
+(interrumpir), y los frames no enviados vuelven a su flujo. Así un
+heartbeat o una línea de chat esperan como mucho un frame de la
+transferencia en curso, no su cola entera.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .registro import obtener_logger
+
+log = obtener_logger(__name__)
+
+CLASE_CONTROL = "control"          # Discovery, seguridad y demás frames de protocolo
+CLASE_INTERACTIVA = "interactivo"  # Mensajes de chat del usuario
+CLASE_MASIVA = "masivo"            # Archivos y carpetas
+
+PRIORIDADES = (CLASE_CONTROL, CLASE_INTERACTIVA, CLASE_MASIVA)  # De más a menos prioritaria
+PRIORIDAD = {clase: i for i, clase in enumerate(PRIORIDADES)}
+PESOS_CLASE = {CLASE_CONTROL: 4, CLASE_INTERACTIVA: 4, CLASE_MASIVA: 1}
+QUANTUM = 4 * 1518  # Bytes por turno con peso 1: unos 4 frames completos
+RONDAS_SOLO = 16  # Quantums por turno cuando solo hay un flujo activo
+
+
+class FlujoEnvio:
+    """Frames de un envío registrados en el planificador"""
+    __slots__ = ('frames', 'clase', 'prioridad', 'peso', 'deficit', 'pendientes', 'agotado', 'bytes', 'enviados',
+                 'terminado', 'error', 'al_enviar', 'al_terminar')
+
+    def __init__(self, frames, clase: str, al_enviar: Optional[Callable[['FlujoEnvio'], None]] = None,
+                 al_terminar: Optional[Callable[[int], None]] = None):
+        self.frames = iter(frames)
+        self.clase = clase
+        self.prioridad = PRIORIDAD[clase]
+        self.peso = None  # Se fija con el primer frame, que da el par destino
+        self.deficit = 0
+        self.pendientes = deque()  # Frames sacados del iterador que aún no han salido
+        self.agotado = False  # El iterador ya no tiene más frames
+        self.bytes = 0
+        self.enviados = 0
+        self.terminado = False
+        self.error: Optional[BaseException] = None
+        self.al_enviar = al_enviar
+        self.al_terminar = al_terminar
+
+
+class PlanificadorEnvio:
+    """
+    Reparte el enlace entre los flujos activos por deficit round robin.
+
+    turno() solo lo llama el conductor (quien tiene el turno, ver
+    tomar_turno); registrar() se puede llamar desde cualquier hilo.
+    """
+
+    def __init__(self, quantum: int = QUANTUM, pesos_clase: Optional[Dict[str, int]] = None,
+                 prioridad_estricta: bool = True, vaciar: Optional[Callable[[], None]] = None,
+                 despertar: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            quantum: Bytes por turno de un flujo de peso 1 (al menos un frame completo)
+            pesos_clase: Pesos por clase que sustituyen a los de PESOS_CLASE
+            prioridad_estricta: Atender siempre antes la clase más prioritaria; si
+                es False todas las clases se reparten el enlace según su peso
+            vaciar: Se llama al terminar cada flujo para que lo encolado salga ya (anillo TX)
+            despertar: Se llama al soltar el turno si quedan flujos sin ningún hilo que los conduzca
+        """
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.activos = deque()  # Orden de la ronda: el primero tiene el turno DRR
+        self.conductor = None  # Hilo que transmite ahora
+        self.esperando = set()  # Flujos cuyos hilos esperan el turno
+        self.quantum = quantum
+        self.pesos_clase = {**PESOS_CLASE, **(pesos_clase or {})}
+        self.pesos_par: Dict[bytes, int] = {}
+        self.prioridad_estricta = prioridad_estricta
+        self.activos_clase = dict.fromkeys(PRIORIDADES, 0)
+        self.prioridad_en_curso = len(PRIORIDADES)  # Del turno que se está transmitiendo
+        self.interrumpir = False  # Llegó un flujo más prioritario: el conductor debe cortar el turno
+        self.vaciar = vaciar
+        self.despertar = despertar
+        self.flujos_registrados = 0
+        self.rondas = 0
+        self.interrupciones = 0
+
+    def registrar(self, frames, clase: str = CLASE_MASIVA,
+                  al_enviar: Optional[Callable[[FlujoEnvio], None]] = None,
+                  al_terminar: Optional[Callable[[int], None]] = None) -> FlujoEnvio:
+        """
+        Añade un flujo a la ronda.
+
+        Args:
+            frames: Lista o generador de frames ya codificados
+            clase: CLASE_CONTROL, CLASE_INTERACTIVA o CLASE_MASIVA
+            al_enviar: Callback tras cada frame transmitido (desde el conductor)
+            al_terminar: Callback con los bytes enviados al terminar el flujo (desde el conductor)
+
+        Returns:
+            FlujoEnvio: El flujo; `terminado` pasa a True cuando sale el último frame
+        """
+        if clase not in self.pesos_clase:
+            raise ValueError(f"Clase de envío no válida: {clase}")
+        flujo = FlujoEnvio(frames, clase, al_enviar, al_terminar)
+        with self.lock:
+            self.activos.append(flujo)
+            self.activos_clase[clase] += 1
+            self.flujos_registrados += 1
+            if self.prioridad_estricta and flujo.prioridad < self.prioridad_en_curso:
+                self.interrumpir = True
+        return flujo
+
+    def tomar_turno(self, flujo: Optional[FlujoEnvio] = None, bloquear: bool = True) -> bool:
+        """
+        Convierte al hilo actual en conductor.
+
+        Args:
+            flujo: Flujo propio; la espera acaba también cuando otro conductor lo termina
+            bloquear: Si False, retorna al momento cuando otro hilo conduce
+
+        Returns:
+            bool: True si el hilo es ahora el conductor
+        """
+        actual = threading.current_thread()
+        with self.cond:
+            while self.conductor is not None and self.conductor is not actual:
+                if not bloquear or (flujo is not None and flujo.terminado):
+                    return False
+                self.esperando.add(flujo)
+                try:
+                    self.cond.wait()
+                finally:
+                    self.esperando.discard(flujo)
+            if flujo is not None and flujo.terminado:
+                return False
+            self.conductor = actual
+            return True
+
+    def soltar_turno(self):
+        """Deja de conducir; si quedan flujos y nadie espera para conducirlos, llama a `despertar`"""
+        with self.cond:
+            self.conductor = None
+            huerfanos = bool(self.activos) and not self.hay_esperando()
+            self.cond.notify_all()
+        if huerfanos and self.despertar is not None:
+            self.despertar()
+
+    def hay_esperando(self) -> bool:
+        """Algún hilo con un flujo sin terminar espera el turno"""
+        return any(flujo is not None and not flujo.terminado for flujo in self.esperando)
+
+    def configurar_peso_par(self, destino: bytes, peso: int):
+        """Peso de un par destino (6 bytes); se aplica a los flujos que empiecen después"""
+        if peso < 1:
+            raise ValueError(f"Peso no válido: {peso}")
+        self.pesos_par[destino] = peso
+
+    def _elegir(self) -> Optional[FlujoEnvio]:
+        """Flujo al que le toca turno (con el lock tomado)"""
+        if not self.activos:
+            self.prioridad_en_curso = len(PRIORIDADES)
+            return None
+        flujo = self.activos[0]
+        if self.prioridad_estricta and self.activos_clase[flujo.clase] < len(self.activos):
+            # El primero en la ronda de la clase más prioritaria con flujos activos
+            clase = next(clase for clase in PRIORIDADES if self.activos_clase[clase])
+            if flujo.clase != clase:
+                flujo = next(flujo for flujo in self.activos if flujo.clase == clase)
+        self.prioridad_en_curso = flujo.prioridad
+        self.interrumpir = False
+        return flujo
+
+    def turno(self) -> Optional[Tuple[FlujoEnvio, List[bytes], bool]]:
+        """
+        Próximo turno DRR: el flujo elegido suma su quantum al déficit y
+        entrega los frames que quepan. Los frames se sacan del iterador aquí,
+        fuera del lock.
+
+        Returns:
+            (flujo, frames, agotado) o None si no quedan flujos. Con `agotado`
+            el flujo no tiene más frames: el conductor lo termina tras transmitirlos
+        """
+        while True:
+            with self.lock:
+                flujo = self._elegir()
+                if flujo is None:
+                    return None
+                solo = len(self.activos) == 1
+            pendientes = flujo.pendientes
+            lote = []
+            try:
+                frame = pendientes.popleft() if pendientes else self._sacar(flujo)
+                if frame is None:
+                    self.terminar(flujo)
+                    continue
+                if flujo.peso is None:
+                    flujo.peso = self.pesos_clase[flujo.clase] * self.pesos_par.get(bytes(frame[:6]), 1)
+                # Sin nadie con quien repartir, el turno se alarga y se ahorran rondas
+                deficit = flujo.deficit + self.quantum * flujo.peso * (RONDAS_SOLO if solo else 1)
+                while len(frame) <= deficit:
+                    deficit -= len(frame)
+                    lote.append(frame)
+                    frame = pendientes.popleft() if pendientes else self._sacar(flujo)
+                    if frame is None:
+                        break
+            except Exception as e:
+                log.error("❌ Error generando frames de un envío: %s", e)
+                self.terminar(flujo, e)
+                continue
+            if frame is None:
+                flujo.deficit = 0
+                return flujo, lote, True
+            # El frame que no cabe espera a la próxima ronda con el déficit sobrante
+            pendientes.appendleft(frame)
+            flujo.deficit = deficit
+            with self.lock:
+                if self.activos and self.activos[0] is flujo:
+                    self.activos.rotate(-1)
+                elif flujo in self.activos:
+                    self.activos.remove(flujo)
+                    self.activos.append(flujo)
+                self.rondas += 1
+            if lote:
+                return flujo, lote, False
+
+    @staticmethod
+    def _sacar(flujo: FlujoEnvio):
+        """Siguiente frame del iterador del flujo, o None si se agotó"""
+        if flujo.agotado:
+            return None
+        frame = next(flujo.frames, None)
+        if frame is None:
+            flujo.agotado = True
+        return frame
+
+    def devolver(self, flujo: FlujoEnvio, frames):
+        """
+        Devuelve a su flujo los frames de un turno interrumpido, por delante
+        de los que ya tuviera, y le abona su déficit para la próxima ronda.
+        """
+        flujo.pendientes.extendleft(reversed(frames))
+        flujo.deficit += sum(len(frame) for frame in frames)
+        self.interrupciones += 1
+
+    def terminar(self, flujo: FlujoEnvio, error: Optional[BaseException] = None):
+        """Saca un flujo de la ronda (agotado o con error) y despierta a quien lo espere"""
+        if self.vaciar is not None:
+            self.vaciar()
+        with self.cond:
+            try:
+                self.activos.remove(flujo)
+            except ValueError:
+                return  # Ya estaba terminado
+            self.activos_clase[flujo.clase] -= 1
+            flujo.terminado = True
+            flujo.error = error
+            flujo.pendientes.clear()
+            self.cond.notify_all()
+        if flujo.al_terminar is not None:
+            try:
+                flujo.al_terminar(flujo.bytes)
+            except Exception as e:
+                log.error("❌ Error en al_terminar de un envío: %s", e)
+
+    def estado(self) -> dict:
+        return {
+            'planificador_flujos_activos': len(self.activos),
+            'planificador_flujos_registrados': self.flujos_registrados,
+            'planificador_rondas': self.rondas,
+            'planificador_interrupciones': self.interrupciones
+        }
@@ -0,0 +1,109 @@
+import fcntl
+import select
+import socket
+import struct
+from typing import List, Optional
+
+MSG_TRUNC = getattr(socket, 'MSG_TRUNC', 0x20)
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+CABECERA_ETHERNET = 14
+MARGEN_VLAN = 4
+SIOCGIFMTU = 0x8921
+
+
+def mtu_interfaz(interfaz: str, defecto: int = 1500) -> int:
+    """MTU de la interfaz según /sys/class/net o, sin sysfs, con SIOCGIFMTU; `defecto` si no se puede leer"""
+    try:
+        with open(f"/sys/class/net/{interfaz}/mtu") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        pass
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            ifreq = struct.pack('16si12x', interfaz.encode()[:15], 0)
+            return struct.unpack_from('16si', fcntl.ioctl(sock.fileno(), SIOCGIFMTU, ifreq))[1]
+    except (OSError, ValueError, UnicodeError):
+        return defecto
+
+
+class ReceptorLotes:
+    """
+    Backend de recepción por lotes sobre el socket AF_PACKET.
+
+    Tras cada despertar de poll() se drena el socket con recv_into sobre un
+    pool fijo de buffers del tamaño de un frame (MTU + cabecera Ethernet),
+    sin reservar memoria por frame, y los frames se entregan en lotes de
+    memoryviews. Cada vista solo es válida hasta la siguiente llamada a
+    recibir_lote(): el pool se reutiliza. Las lecturas usan MSG_DONTWAIT en
+    lugar de poner el socket en modo no bloqueante, para que los send() del
+    mismo socket sigan bloqueando cuando la cola de transmisión está llena.
+    """
+
+    def __init__(self, sock: socket.socket, tamaño_buffer: int = 1500 + CABECERA_ETHERNET + MARGEN_VLAN,
+                 tamaño_lote: int = 64):
+        self.sock = sock
+        self.tamaño_buffer = tamaño_buffer
+        self.tamaño_lote = tamaño_lote
+        self.buffers = [bytearray(tamaño_buffer) for _ in range(tamaño_lote)]
+        self.vistas = [memoryview(buffer) for buffer in self.buffers]
+        self.agotado = True  # True cuando la última lectura vació la cola del socket
+        self.flags = MSG_TRUNC | MSG_DONTWAIT
+        self.poller = select.poll()
+        self.poller.register(sock.fileno(), select.POLLIN | select.POLLERR)
+
+        # Contadores para medir llamadas al sistema por frame
+        self.llamadas_recv = 0
+        self.llamadas_poll = 0
+        self.lotes = 0
+        self.frames = 0
+        self.frames_truncados = 0
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que el socket tenga datos; True si los hay"""
+        self.llamadas_poll += 1
+        eventos = self.poller.poll(None if timeout is None else int(timeout * 1000))
+        return bool(eventos)
+
+    def recibir_lote(self) -> List[memoryview]:
+        """
+        Lee sin bloquear hasta llenar el lote o vaciar el socket (self.agotado).
+        Los frames que no caben en un buffer se descartan y se cuentan.
+        """
+        lote = []
+        recv_into = self.sock.recv_into
+        flags = self.flags
+        self.agotado = False
+        for vista in self.vistas:
+            self.llamadas_recv += 1
+            try:
+                # Con MSG_TRUNC el kernel devuelve la longitud real aunque no quepa
+                n = recv_into(vista, 0, flags)
+            except (BlockingIOError, InterruptedError):
+                self.agotado = True
+                break
+            if n > self.tamaño_buffer:
+                self.frames_truncados += 1
+                continue
+            lote.append(vista[:n])
+        if lote:
+            self.lotes += 1
+            self.frames += len(lote)
+        return lote
+
+    def estado(self) -> dict:
+        """Contadores de recepción por lotes"""
+        frames = self.frames or 1
+        return {
+            'recepcion_lotes': self.lotes,
+            'recepcion_frames_por_lote': self.frames / (self.lotes or 1),
+            'recepcion_recv_por_frame': self.llamadas_recv / frames,
+            'recepcion_poll_por_frame': self.llamadas_poll / frames,
+            'recepcion_frames_truncados': self.frames_truncados
+        }
+
+    def cerrar(self):
+        """Deja de vigilar el socket"""
+        try:
+            self.poller.unregister(self.sock.fileno())
+        except (KeyError, ValueError, OSError):
+            pass
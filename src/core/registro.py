@@ -0,0 +1,102 @@
+"""
+Logging de Link-Chat
+
+Todos los módulos de src.core y src.features obtienen su logger con
+obtener_logger(__name__). Los eventos por frame se emiten con el nivel
+TRAZA y siempre detrás de `if log.isEnabledFor(TRAZA)`, de modo que con
+el nivel por defecto no cuestan ni el formateo de los argumentos.
+Cuando TRAZA está activo, FiltroFrecuencia limita cuántos de esos
+mensajes por segundo llegan a la salida.
+
+Nivel por defecto: variable de entorno LINKCHAT_LOG (TRAZA, DEBUG, INFO,
+WARNING, ERROR) o INFO.
+"""
+
+import logging
+import os
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+TRAZA = 5  # Eventos por frame/fragmento: más detallado que DEBUG
+logging.addLevelName(TRAZA, "TRAZA")
+
+LOGGER_RAIZ = "src"
+_configurado = False
+
+
+class FiltroFrecuencia(logging.Filter):
+    """
+    Limita los registros de nivel TRAZA a `max_por_segundo` por cada
+    (logger, plantilla de mensaje); al reabrirse la ventana informa
+    cuántos se omitieron. Los niveles superiores pasan siempre.
+    """
+
+    def __init__(self, max_por_segundo: int = 20):
+        super().__init__()
+        self.max_por_segundo = max_por_segundo
+        self.ventanas: Dict[Tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > TRAZA or self.max_por_segundo <= 0:
+            return True
+        clave = (record.name, str(record.msg))
+        ahora = time.monotonic()
+        ventana = self.ventanas.get(clave)
+        if ventana is None or ahora - ventana[0] >= 1.0:
+            omitidos = ventana[2] if ventana else 0
+            self.ventanas[clave] = [ahora, 1, 0]
+            if omitidos:
+                record.msg = f"{record.msg} (+{omitidos} omitidos)"
+            return True
+        if ventana[1] < self.max_por_segundo:
+            ventana[1] += 1
+            return True
+        ventana[2] += 1
+        return False
+
+
+def _nivel(nivel) -> int:
+    if isinstance(nivel, int):
+        return nivel
+    nivel = str(nivel).upper()
+    if nivel == "TRAZA":
+        return TRAZA
+    return logging.getLevelName(nivel) if isinstance(logging.getLevelName(nivel), int) else logging.INFO
+
+
+def configurar_logging(nivel=None, max_trazas_por_segundo: int = 20, salida=None,
+                       formato: str = "%(message)s"):
+    """
+    (Re)configura el logger raíz de Link-Chat.
+
+    Args:
+        nivel: Nivel mínimo (nombre o número); por defecto LINKCHAT_LOG o INFO
+        max_trazas_por_segundo: Límite de mensajes TRAZA por plantilla y segundo (0 = sin límite)
+        salida: Stream de salida (por defecto stdout, como los print anteriores)
+        formato: Formato de logging
+    """
+    global _configurado
+    raiz = logging.getLogger(LOGGER_RAIZ)
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    handler = logging.StreamHandler(salida if salida is not None else sys.stdout)
+    handler.setFormatter(logging.Formatter(formato))
+    handler.addFilter(FiltroFrecuencia(max_trazas_por_segundo))
+    raiz.addHandler(handler)
+    raiz.setLevel(_nivel(nivel if nivel is not None else os.environ.get("LINKCHAT_LOG", "INFO")))
+    raiz.propagate = False
+    _configurado = True
+    return raiz
+
+
+def obtener_logger(nombre: str) -> logging.Logger:
+    """Logger del módulo; configura la salida por defecto la primera vez"""
+    if not _configurado:
+        configurar_logging()
+    return logging.getLogger(nombre)
+
+
+def nivel_logging(nivel: Optional[str] = None):
+    """Cambia el nivel del logger raíz en caliente (p. ej. 'TRAZA' para depurar frames)"""
+    logging.getLogger(LOGGER_RAIZ).setLevel(_nivel(nivel or "INFO"))
@@ -8,6 +8,9 @@ import threading
 import time
 import json
 from typing import Dict, Callable, Optional
+from ..core.registro import obtener_logger
+
+log = obtener_logger(__name__)
 
 class DiscoveryManager:
     def __init__(self, comunicador, callback_device_found: Optional[Callable] = None):
@@ -23,6 +26,7 @@ class DiscoveryManager:
         self.discovered_devices: Dict[str, dict] = {}
         self.running = False
         self.discovery_thread = None
+        self.temporizador = None  # Heartbeat periódico en el bucle de E/S del comunicador
         self.heartbeat_interval = 30  # segundos
         self.device_timeout = 90  # segundos
         
@@ -31,7 +35,10 @@ class DiscoveryManager:
             'hostname': self._get_hostname(),
             'mac': self.com.mac_ori,
             'timestamp': time.time(),
-            'capabilities': ['text', 'file', 'broadcast']
+            # id32: cabecera v2 (ver codec.py); lotes: entiende frames agrupados (ver agrupacion.py)
+            'capabilities': ['text', 'file', 'broadcast', 'id32', 'lotes'],
+            # MTU de la interfaz: con jumbo frames en ambos extremos se fragmenta en trozos más grandes
+            'mtu': getattr(self.com, 'mtu', 1500)
         }
     
     def _get_hostname(self) -> str:
@@ -43,22 +50,46 @@ class DiscoveryManager:
             return "LinkChat-Device"
     
     def start_discovery(self):
-        """Inicia el proceso de discovery automático"""
+        """
+        Inicia el proceso de discovery automático.
+
+        El heartbeat es un temporizador en el bucle de E/S del comunicador, que
+        empieza a correr cuando se lanza receive_thread o se abre el
+        LinkChatTransport que lo usa (antes o después de esta llamada).
+        """
         if self.running:
             return
         
         self.running = True
-        self.discovery_thread = threading.Thread(target=self._discovery_loop, daemon=True)
-        self.discovery_thread.start()
-        print("🔍 Discovery automático iniciado")
+        bucle = getattr(self.com, 'bucle', None)
+        if bucle is not None:
+            # Temporizador en el bucle de E/S: sin hilo propio ni ticks de 1 s
+            bucle.llamar_desde_hilo(self._programar_heartbeat, bucle)
+        else:
+            self.discovery_thread = threading.Thread(target=self._discovery_loop, daemon=True)
+            self.discovery_thread.start()
+        log.info("🔍 Discovery automático iniciado")
     
     def stop_discovery(self):
         """Detiene el proceso de discovery"""
         self.running = False
+        if self.temporizador is not None:
+            self.temporizador.cancelar()
+            self.temporizador = None
         if self.discovery_thread and self.discovery_thread.is_alive():
             self.discovery_thread.join(timeout=2)
-        print("🔍 Discovery automático detenido")
+        log.info("🔍 Discovery automático detenido")
     
+    def _programar_heartbeat(self, bucle):
+        """Programa el heartbeat periódico (se ejecuta en el hilo del bucle)"""
+        if self.running and self.temporizador is None:
+            self.temporizador = bucle.llamar_cada(self.heartbeat_interval, self._tick_discovery)
+
+    def _tick_discovery(self):
+        """Heartbeat y limpieza de dispositivos en cada intervalo"""
+        self._send_heartbeat()
+        self._cleanup_old_devices()
+
     def _discovery_loop(self):
         """Loop principal del discovery"""
         while self.running:
@@ -76,7 +107,7 @@ class DiscoveryManager:
                     time.sleep(1)
                     
             except Exception as e:
-                print(f"❌ Error en discovery loop: {e}")
+                log.error("❌ Error en discovery loop: %s", e)
                 time.sleep(5)
     
     def _send_heartbeat(self):
@@ -88,7 +119,8 @@ class DiscoveryManager:
                 'hostname': self.local_info['hostname'],
                 'mac': self.local_info['mac'],
                 'timestamp': time.time(),
-                'capabilities': self.local_info['capabilities']
+                'capabilities': self.local_info['capabilities'],
+                'mtu': self.local_info['mtu']
             }
             
             mensaje = f"DISCOVERY:{json.dumps(heartbeat_data)}"
@@ -101,10 +133,10 @@ class DiscoveryManager:
             )
             
             self.com.enviar_protocolo(frames)
-            print(f"📡 Heartbeat enviado: {self.local_info['hostname']}")
+            log.debug("📡 Heartbeat enviado: %s", self.local_info["hostname"])
             
         except Exception as e:
-            print(f"❌ Error enviando heartbeat: {e}")
+            log.error("❌ Error enviando heartbeat: %s", e)
     
     def process_discovery_message(self, mac_origen: str, mensaje: str) -> bool:
         """
@@ -139,9 +171,23 @@ class DiscoveryManager:
                 'mac': mac_origen.upper(),
                 'last_seen': time.time(),
                 'capabilities': data.get('capabilities', []),
+                'mtu': data.get('mtu'),
                 'status': 'active'
             }
             
+            # Con 'id32' se le envía la cabecera v2: IDs de 32 bits, sin colisiones entre transferencias
+            registrar_version = getattr(self.com, 'registrar_version_par', None)
+            if registrar_version is not None:
+                registrar_version(mac_origen, 'id32' in device_info['capabilities'])
+            # Con 'lotes' se le pueden agrupar mensajes cortos en un frame
+            registrar_agrupacion = getattr(self.com, 'registrar_agrupacion_par', None)
+            if registrar_agrupacion is not None:
+                registrar_agrupacion(mac_origen, 'lotes' in device_info['capabilities'])
+            # Sin 'mtu' (versiones anteriores) se le envían fragmentos de Ethernet estándar
+            registrar_mtu = getattr(self.com, 'registrar_mtu_par', None)
+            if registrar_mtu is not None:
+                registrar_mtu(mac_origen, device_info['mtu'])
+
             # Verificar si es un dispositivo nuevo
             is_new_device = mac_origen.upper() not in self.discovered_devices
             
@@ -152,11 +198,11 @@ class DiscoveryManager:
             if is_new_device and self.callback_device_found:
                 self.callback_device_found(device_info)
             
-            print(f"📱 Dispositivo actualizado: {device_info['hostname']} ({mac_origen})")
+            log.debug("📱 Dispositivo actualizado: %s (%s)", device_info["hostname"], mac_origen)
             return True
             
         except Exception as e:
-            print(f"❌ Error procesando mensaje de discovery: {e}")
+            log.error("❌ Error procesando mensaje de discovery: %s", e)
             return False
     
     def _cleanup_old_devices(self):
@@ -170,7 +216,7 @@ class DiscoveryManager:
         
         for mac in devices_to_remove:
             device_info = self.discovered_devices[mac]
-            print(f"⏰ Dispositivo desconectado: {device_info['hostname']} ({mac})")
+            log.warning("⏰ Dispositivo desconectado: %s (%s)", device_info["hostname"], mac)
             del self.discovered_devices[mac]
     
     def get_discovered_devices(self) -> Dict[str, dict]:
@@ -195,10 +241,10 @@ class DiscoveryManager:
             )
             
             self.com.enviar_protocolo(frames)
-            print("🔍 Solicitud de discovery enviada")
+            log.info("🔍 Solicitud de discovery enviada")
             
         except Exception as e:
-            print(f"❌ Error enviando solicitud de discovery: {e}")
+            log.error("❌ Error enviando solicitud de discovery: %s", e)
     
     def get_device_count(self) -> int:
         """Retorna el número de dispositivos activos"""
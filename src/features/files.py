@@ -1,28 +1,129 @@
 import os
 import time
+from concurrent.futures import Future
 from typing import Dict, Optional
-from ..core.frames import Frame, Tipo_Mensaje
+from ..core.frames import Frame, Tipo_Mensaje, PAYLOAD_MAXIMO
+from ..core.fragmentation import MensajeEnDisco
+from ..core.fiable import FuenteFragmentos, huella_contenido
+from ..core.compresion import CompresorTrozos, descomprimir
+from ..core.integridad import ALGORITMOS, cabecera_integridad, fragmento_de_cabecera
+from ..core.registro import obtener_logger
+
+log = obtener_logger(__name__)
+
+ARCHIVO_GRANDE = 100 * 1024 * 1024  # A partir de aquí la GUI pide confirmación
+
+
+def descartar_preparado(preparado: Future):
+    """Cierra el contenido de un preparar_envio adelantado que ya no se va a enviar"""
+    def cerrar(futuro: Future):
+        if not futuro.cancelled() and futuro.exception() is None:
+            futuro.result()[1].close()
+
+    if not preparado.cancel():
+        preparado.add_done_callback(cerrar)
+
+
 class FileTransfer:
     def __init__(self, chat_app):
         self.chat_app = chat_app
         self.archivos_en_progreso: Dict[str, dict] = {}
         self.archivos_recibiendo: Dict[str, dict] = {}
+        self.compresion: Optional[CompresorTrozos] = None  # Ver configurar_compresion
+        self.integridad: Optional[str] = "blake2b"  # Ver configurar_integridad
     
-    def send_file(self, file_path, dest_mac):
-        """Envía un archivo usando el sistema unificado de fragmentación"""
+    def configurar_compresion(self, codec: Optional[str] = "zlib", **opciones):
+        """
+        Comprime por trozos los archivos que se envíen (también los de
+        FolderTransfer, que pasa por send_file). None la desactiva.
+
+        Args:
+            codec: "zlib", "lzma", "bz2" o None
+            **opciones: nivel, tamaño_trozo, muestra, umbral (ver CompresorTrozos)
+        """
+        self.compresion = CompresorTrozos(codec, **opciones) if codec else None
+
+    def configurar_integridad(self, algoritmo: Optional[str] = "blake2b"):
+        """
+        Algoritmo de la cabecera de integridad con la que se envían los
+        archivos de más de un fragmento: digest del contenido completo y de
+        cada trozo, que el receptor comprueba a medida que llegan. None la quita.
+
+        Args:
+            algoritmo: "blake2b", "sha256" o None
+        """
+        if algoritmo is not None and algoritmo not in ALGORITMOS:
+            raise ValueError(f"Algoritmo no soportado: {algoritmo} (opciones: {', '.join(ALGORITMOS)})")
+        self.integridad = algoritmo
+
+    def preparar_envio(self, file_path, comprimir: Optional[bool] = None, tamaño_fragmento: int = PAYLOAD_MAXIMO):
+        """
+        Prefijo y contenido a enviar de un archivo, comprimido si procede y
+        con su cabecera de integridad (sus trozos dependen del tamaño de
+        fragmento hacia el destino, ver payload_maximo). Es la parte de CPU de
+        send_file: FolderTransfer la adelanta para el siguiente archivo
+        mientras se envía el actual.
+
+        Returns:
+            (prefijo: cabecera de integridad + metadata, contenido abierto en binario, bytes de contenido)
+        """
+        metadata, contenido, tamaño_contenido = self._contenido_a_enviar(file_path, comprimir)
+        if self.integridad is None or len(metadata) + tamaño_contenido <= tamaño_fragmento:
+            return metadata, contenido, tamaño_contenido
+        try:
+            cabecera = cabecera_integridad(metadata, contenido, tamaño_contenido, self.integridad,
+                                           tamaño_fragmento=tamaño_fragmento)
+            contenido.seek(0)
+        except BaseException:
+            contenido.close()
+            raise
+        return cabecera + metadata, contenido, tamaño_contenido
+
+    def _contenido_a_enviar(self, file_path, comprimir: Optional[bool]):
+        """(metadata, contenido abierto, bytes de contenido), comprimido si procede"""
+        nombre_archivo = os.path.basename(file_path)
+        tamaño_archivo = os.path.getsize(file_path)
+        metadata = f"FILE_TRANSFER:{nombre_archivo}:{tamaño_archivo}:".encode('utf-8')
+        usar_compresion = self.compresion is not None if comprimir is None else comprimir
+        if usar_compresion:
+            compresor = self.compresion or CompresorTrozos()
+            comprimido, _, tamaño_comprimido = compresor.comprimir_a_temporal(file_path)
+            if tamaño_comprimido < tamaño_archivo:
+                # El códec va junto al tamaño: un receptor sin compresión lo rechaza en lugar de guardar basura
+                metadata = f"FILE_TRANSFER:{nombre_archivo}:{tamaño_archivo};{compresor.codec}:".encode('utf-8')
+                log.info("🗜️ %s comprimido con %s: %d → %d bytes (%.1f%%)", nombre_archivo, compresor.codec,
+                         tamaño_archivo, tamaño_comprimido, tamaño_comprimido / max(tamaño_archivo, 1) * 100)
+                return metadata, comprimido, tamaño_comprimido
+            comprimido.close()
+            log.info("🗜️ %s no se deja comprimir: se envía tal cual", nombre_archivo)
+        return metadata, open(file_path, 'rb'), tamaño_archivo
+
+    def send_file(self, file_path, dest_mac, fiable: bool = False, comprimir: Optional[bool] = None,
+                  preparado: Optional[Future] = None):
+        """
+        Envía un archivo usando el sistema unificado de fragmentación.
+        Con `fiable` el receptor confirma con SACK y se retransmite lo perdido;
+        si la transferencia se interrumpe, el siguiente envío del mismo archivo
+        continúa desde lo que el receptor ya tenía. `comprimir` fuerza o evita
+        la compresión configurada (por defecto, se usa si está configurada).
+        `preparado` es un futuro ya lanzado de preparar_envio(file_path).
+        """
         try:
             if not os.path.exists(file_path):
                 return False, "Archivo no encontrado"
             
             nombre_archivo = os.path.basename(file_path)
             tamaño_archivo = os.path.getsize(file_path)
+            com = self.chat_app.com
+            # Con jumbo frames en ambos extremos, fragmentos más grandes (ver payload_maximo)
+            tamaño_fragmento = com.payload_maximo(dest_mac)
             
-            print(f"📤 Iniciando envío de archivo {nombre_archivo} ({tamaño_archivo} bytes)")
+            log.info("📤 Iniciando envío de archivo %s (%s bytes)", nombre_archivo, tamaño_archivo)
             
             # Verificar si es un archivo muy grande (> 100MB)
-            if tamaño_archivo > 100 * 1024 * 1024:
-                print(f"⚠️ Archivo grande detectado ({tamaño_archivo / (1024*1024):.1f} MB)")
-                print(f"📊 Se generarán aproximadamente {tamaño_archivo // 1475} fragmentos")
+            if tamaño_archivo > ARCHIVO_GRANDE:
+                log.warning("⚠️ Archivo grande detectado (%.1f MB)", tamaño_archivo / (1024*1024))
+                log.debug("📊 Se generarán aproximadamente %s fragmentos", tamaño_archivo // tamaño_fragmento)
                 
                 # Para archivos muy grandes, mostrar advertencia
                 if hasattr(self.chat_app, 'root'):
@@ -34,51 +135,95 @@ class FileTransfer:
                         f"¿Desea continuar?"
                     )
                     if not respuesta:
+                        if preparado is not None:
+                            descartar_preparado(preparado)
                         return False, "Transferencia cancelada por el usuario"
             
-            # Leer archivo completo en memoria
-            with open(file_path, 'rb') as f:
-                contenido_archivo = f.read()
-            
-            # Crear mensaje con metadata del archivo incluida
-            metadata = f"FILE_TRANSFER:{nombre_archivo}:{tamaño_archivo}:".encode('utf-8')
-            mensaje_completo = metadata + contenido_archivo
-            
-            print(f"📤 Creando frames para archivo {nombre_archivo}...")
-            
-            # Usar el sistema unificado de fragmentación de frames
-            frames = self.chat_app.com.crear_frame(
-                dest_mac,
-                Tipo_Mensaje.archivo.value,
-                mensaje_completo
-            )
+            # Cabecera de integridad y metadata del archivo al inicio del mensaje
+            if preparado is not None:
+                prefijo, contenido, tamaño_contenido = preparado.result()
+                # Sus trozos de integridad fijan el tamaño de fragmento, aunque la MTU del par haya cambiado
+                tamaño_fragmento = fragmento_de_cabecera(prefijo) or tamaño_fragmento
+            else:
+                prefijo, contenido, tamaño_contenido = self.preparar_envio(file_path, comprimir, tamaño_fragmento)
+            longitud_total = len(prefijo) + tamaño_contenido
             
-            print(f"📤 Enviando {len(frames)} frames...")
+            total_frames = max(1, com.calcular_total_fragmentos(longitud_total, tamaño_fragmento))
+            log.info("📤 Enviando %s en streaming (%s frames)...", nombre_archivo, total_frames)
             
-            # Enviar todos los frames con callback de progreso
             progress_callback = lambda archivo, enviados, total, bytes_env: self.chat_app.mostrar_progreso_envio(archivo, enviados, total, bytes_env)
-            self.chat_app.com.enviar_archivo(frames, progress_callback=progress_callback, archivo_nombre=nombre_archivo)
-            print(f"✅ Archivo {nombre_archivo} enviado en {len(frames)} frame(s)")
+            if fiable:
+                # Cada fragmento se lee del archivo cuando se (re)envía
+                with contenido as f:
+                    fuente = FuenteFragmentos(prefijo, archivo=f, tamaño=tamaño_contenido,
+                                              tamaño_fragmento=tamaño_fragmento)
+                    com.enviar_fiable(dest_mac, Tipo_Mensaje.archivo, fuente,
+                                      progress_callback=progress_callback, archivo_nombre=nombre_archivo,
+                                      huella=huella_contenido(fuente))
+                log.info("✅ Archivo %s enviado y confirmado en %s frame(s)", nombre_archivo, total_frames)
+                return True, f"Archivo {nombre_archivo} enviado exitosamente"
+
+            # Los frames se construyen y envían uno a uno: la memoria no crece con el archivo
+            with contenido as f:
+                frames = com.crear_frames_stream(
+                    dest_mac,
+                    Tipo_Mensaje.archivo.value,
+                    self._leer_trozos(f, prefijo, tamaño_fragmento),
+                    longitud_total,
+                    tamaño_fragmento=tamaño_fragmento
+                )
+                
+                # Enviar todos los frames con callback de progreso (con FEC hay además reparaciones)
+                total_frames = com.calcular_total_frames(dest_mac, longitud_total)
+                com.enviar_archivo(frames, progress_callback=progress_callback, archivo_nombre=nombre_archivo,
+                                   total_frames=total_frames)
+            log.info("✅ Archivo %s enviado en %s frame(s)", nombre_archivo, total_frames)
             
             return True, f"Archivo {nombre_archivo} enviado exitosamente"
             
         except Exception as e:
             import traceback
             error_detail = traceback.format_exc()
-            print(f"❌ Error detallado enviando archivo: {error_detail}")
+            log.error("❌ Error detallado enviando archivo: %s", error_detail)
             return False, f"Error enviando archivo: {str(e)}"
     
+    @staticmethod
+    def _leer_trozos(archivo, prefijo: bytes, tamaño_trozo: int):
+        """
+        Genera payloads de `tamaño_trozo` bytes: primero el prefijo (metadata)
+        y a continuación el contenido del archivo, leído por bloques.
+        """
+        pendiente = prefijo
+        while len(pendiente) >= tamaño_trozo:
+            yield pendiente[:tamaño_trozo]
+            pendiente = pendiente[tamaño_trozo:]
+        
+        primero = pendiente + archivo.read(tamaño_trozo - len(pendiente))
+        if primero:
+            yield primero
+        
+        while True:
+            bloque = archivo.read(tamaño_trozo)
+            if not bloque:
+                return
+            yield bloque
+    
     def receive_file(self, mensaje, source_mac):
         """Procesa la recepción de un archivo usando el sistema unificado"""
         
         try:
-            print(f"FileTransfer.receive_file llamado: {len(mensaje)} bytes recibidos")
+            log.debug("FileTransfer.receive_file llamado: %s bytes recibidos", len(mensaje))
             
             # El mensaje ya viene reensamblado por el FragmentManager
             # Solo necesitamos procesar el contenido del archivo
             
+            # Archivo grande reensamblado en disco por el FragmentManager
+            if isinstance(mensaje, MensajeEnDisco):
+                self._procesar_archivo_unificado_disco(mensaje, source_mac)
+                return
+            
             # Verificar si es un archivo con el nuevo formato
-            if isinstance(mensaje, bytes) and mensaje.startswith(b"FILE_TRANSFER:"):
+            if isinstance(mensaje, (bytes, bytearray)) and mensaje.startswith(b"FILE_TRANSFER:"):
                 # Manejar como bytes para preservar datos binarios
                 self._procesar_archivo_unificado_bytes(mensaje, source_mac)
                 return
@@ -89,14 +234,14 @@ class FileTransfer:
 
             else:
                 #  Formato no reconocido - solo logging, no procesamiento complejo
-                print(f" Formato no reconocido. Primeros 50 bytes: {mensaje[:50]}")
+                log.warning(" Formato no reconocido. Primeros 50 bytes: %s", mensaje[:50])
                     #Limpiar
                     # del self.archivos_recibiendo[source_mac]
                     # print(f"Procesamiento completado para: {nombre}")
         except Exception as e:
             error_msg = f" Error guardando archivo: {str(e)}"
             self.chat_app.mostrar_mensaje("Error", error_msg)
-            print(error_msg)
+            log.error(error_msg)
 
     def _guardar_archivo(self, archivo: dict, mac_origen: str):
         try:
@@ -133,12 +278,12 @@ class FileTransfer:
             if hasattr(self.chat_app, 'root'):
                 self.chat_app.root.after(100, lambda: self.chat_app.mostrar_mensaje("Sistema", mensaje))
                 
-            print(f"Archivo guardado exitosamente: {nombre_archivo}")
+            log.info("Archivo guardado exitosamente: %s", nombre_archivo)
             
         except Exception as e:
             error_msg = f"Error guardando archivo: {str(e)}"
             self.chat_app.mostrar_mensaje("Error", error_msg)
-            print(error_msg)
+            log.error(error_msg)
 
     def _guardar_archivo_directo(self, nombre_archivo: str, contenido: bytes, mac_origen: str):
         """Guarda un archivo directamente usando el nuevo sistema unificado"""
@@ -178,69 +323,215 @@ class FileTransfer:
                 self.chat_app.root.after(100, 
                     lambda: self.chat_app.mostrar_mensaje("Sistema", mensaje))
                 
-            print(f"✅ Archivo guardado exitosamente: {ruta_archivo}")
+            log.info("✅ Archivo guardado exitosamente: %s", ruta_archivo)
             
         except Exception as e:
             error_msg = f"❌ Error guardando archivo {nombre_archivo}: {str(e)}"
             if hasattr(self.chat_app, 'root'):
                 self.chat_app.root.after(100, 
                     lambda: self.chat_app.mostrar_mensaje("Error", error_msg))
-            print(error_msg)
+            log.error(error_msg)
             import traceback
             traceback.print_exc()
 
     def _procesar_archivo_unificado_bytes(self, mensaje: bytes, source_mac: str):
         """Procesa archivo con formato FILE_TRANSFER: desde bytes (preserva datos binarios)"""
         try:
-            print(f"📥 Procesando archivo unificado desde {source_mac}")
-            print(f"📊 Tamaño total del mensaje: {len(mensaje)} bytes")
+            log.info("📥 Procesando archivo unificado desde %s", source_mac)
+            log.debug("📊 Tamaño total del mensaje: %s bytes", len(mensaje))
             
             # Buscar el fin del header para extraer metadatos
             header_end = mensaje.find(b':', 14)  # Buscar después de "FILE_TRANSFER:"
             if header_end == -1:
-                print("❌ Error: Formato FILE_TRANSFER inválido - no se encontró separador de nombre")
+                log.error("❌ Error: Formato FILE_TRANSFER inválido - no se encontró separador de nombre")
                 return
             
             # Extraer nombre del archivo
             nombre_archivo = mensaje[14:header_end].decode('utf-8')
-            print(f"📁 Nombre del archivo: {nombre_archivo}")
+            log.debug("📁 Nombre del archivo: %s", nombre_archivo)
             
             # Buscar el siguiente ':'
             size_start = header_end + 1
             size_end = mensaje.find(b':', size_start)
             if size_end == -1:
-                print("❌ Error: Formato FILE_TRANSFER inválido - no se encontró separador de tamaño")
+                log.error("❌ Error: Formato FILE_TRANSFER inválido - no se encontró separador de tamaño")
                 return
             
-            # Extraer tamaño del archivo
-            tamaño_archivo = int(mensaje[size_start:size_end].decode('utf-8'))
-            print(f"📏 Tamaño esperado: {tamaño_archivo} bytes ({tamaño_archivo / (1024*1024):.1f} MB)")
+            # Extraer tamaño del archivo (y el códec, si viene comprimido: "tamaño;códec")
+            tamaño_texto, _, codec = mensaje[size_start:size_end].decode('utf-8').partition(';')
+            tamaño_archivo = int(tamaño_texto)
+            log.debug("📏 Tamaño esperado: %s bytes (%.1f MB)", tamaño_archivo, tamaño_archivo / (1024*1024))
             
             # El contenido empieza después del último ':'
             contenido_inicio = size_end + 1
+            if codec:
+                with memoryview(mensaje) as vista:
+                    contenido = vista[contenido_inicio:]
+                    self._guardar_descomprimido(self._lector_memoria(contenido), len(contenido), nombre_archivo,
+                                                tamaño_archivo, codec, source_mac)
+                return
             contenido_archivo = mensaje[contenido_inicio:]
             
-            print(f"📏 Tamaño recibido: {len(contenido_archivo)} bytes ({len(contenido_archivo) / (1024*1024):.1f} MB)")
-            print(f"📊 Metadata ocupa: {contenido_inicio} bytes")
+            log.debug("📏 Tamaño recibido: %s bytes (%.1f MB)", len(contenido_archivo), len(contenido_archivo) / (1024*1024))
+            log.debug("📊 Metadata ocupa: %s bytes", contenido_inicio)
             
             # Verificar integridad del tamaño
             if len(contenido_archivo) == tamaño_archivo:
-                print(f"✅ Integridad verificada - guardando archivo")
+                log.info("✅ Integridad verificada - guardando archivo")
                 # Guardar archivo directamente
                 self._guardar_archivo_directo(nombre_archivo, contenido_archivo, source_mac)
             else:
                 diferencia = len(contenido_archivo) - tamaño_archivo
                 error_msg = f"❌ Tamaño incorrecto. Esperado: {tamaño_archivo}, Recibido: {len(contenido_archivo)} (diferencia: {diferencia} bytes)"
-                print(error_msg)
+                log.error(error_msg)
+                if hasattr(self.chat_app, 'root'):
+                    self.chat_app.root.after(100, 
+                        lambda: self.chat_app.mostrar_mensaje("Error", error_msg))
+        
+        except Exception as e:
+            log.error("❌ Error procesando archivo desde bytes: %s", e)
+            import traceback
+            traceback.print_exc()
+
+    def _procesar_archivo_unificado_disco(self, mensaje: MensajeEnDisco, source_mac: str):
+        """Procesa archivo FILE_TRANSFER: reensamblado en disco sin cargarlo en memoria"""
+        try:
+            log.info("📥 Procesando archivo unificado en disco desde %s: %s", source_mac, mensaje.ruta)
+            
+            cabecera = mensaje.leer(0, 4096)
+            if not cabecera.startswith(b"FILE_TRANSFER:"):
+                log.warning(" Formato no reconocido en disco. Primeros 50 bytes: %s", cabecera[:50])
+                mensaje.eliminar()
+                return
+            
+            header_end = cabecera.find(b':', 14)
+            size_end = cabecera.find(b':', header_end + 1) if header_end != -1 else -1
+            if size_end == -1:
+                log.error("❌ Error: Formato FILE_TRANSFER inválido en la cabecera")
+                mensaje.eliminar()
+                return
+            
+            nombre_archivo = cabecera[14:header_end].decode('utf-8')
+            tamaño_texto, _, codec = cabecera[header_end + 1:size_end].decode('utf-8').partition(';')
+            tamaño_archivo = int(tamaño_texto)
+            contenido_inicio = size_end + 1
+            tamaño_recibido = mensaje.longitud - contenido_inicio
+            
+            if codec:
+                # Se descomprime en streaming desde el archivo reensamblado
+                with open(mensaje.ruta, 'rb') as f:
+                    f.seek(mensaje.inicio + contenido_inicio)
+                    self._guardar_descomprimido(f.read, tamaño_recibido, nombre_archivo, tamaño_archivo, codec,
+                                                source_mac)
+                mensaje.eliminar()
+                return
+            
+            if tamaño_recibido != tamaño_archivo:
+                mensaje.eliminar()
+                error_msg = f"❌ Tamaño incorrecto. Esperado: {tamaño_archivo}, Recibido: {tamaño_recibido}"
+                log.error(error_msg)
                 if hasattr(self.chat_app, 'root'):
                     self.chat_app.root.after(100, 
                         lambda: self.chat_app.mostrar_mensaje("Error", error_msg))
+                return
+            
+            log.info("✅ Integridad verificada - moviendo %s a downloads", nombre_archivo)
+            ruta_archivo = self._ruta_destino_unica(nombre_archivo)
+            self._extraer_contenido(mensaje.ruta, ruta_archivo, mensaje.inicio + contenido_inicio, tamaño_archivo)
+            mensaje.eliminar()
+            self._archivo_guardado(ruta_archivo, tamaño_archivo, source_mac)
         
         except Exception as e:
-            print(f"❌ Error procesando archivo desde bytes: {e}")
+            log.error("❌ Error procesando archivo desde disco: %s", e)
+            mensaje.eliminar()
             import traceback
             traceback.print_exc()
 
+    def _archivo_guardado(self, ruta_archivo: str, tamaño_archivo: int, source_mac: str):
+        """Avisa de un archivo ya escrito en downloads (o lo entrega a la carpeta en curso)"""
+        # Verificar si es parte de una transferencia de carpeta
+        if hasattr(self.chat_app, 'folder_transfer') and self.chat_app.folder_transfer:
+            if self.chat_app.folder_transfer.check_folder_file_received(ruta_archivo, source_mac):
+                return
+        
+        aviso = f"Archivo recibido: {os.path.basename(ruta_archivo)} ({tamaño_archivo} bytes)"
+        if hasattr(self.chat_app, 'root'):
+            self.chat_app.root.after(100, 
+                lambda: self.chat_app.mostrar_mensaje("Sistema", aviso))
+        log.info("✅ Archivo guardado exitosamente: %s", ruta_archivo)
+
+    def _guardar_descomprimido(self, leer, longitud: int, nombre_archivo: str, tamaño_archivo: int, codec: str,
+                               source_mac: str):
+        """Descomprime registro a registro directamente al archivo de destino"""
+        ruta_archivo = self._ruta_destino_unica(nombre_archivo)
+        try:
+            with open(ruta_archivo, 'wb') as destino:
+                escritos = descomprimir(leer, destino.write, longitud)
+            if escritos != tamaño_archivo:
+                raise ValueError(f"Tamaño incorrecto. Esperado: {tamaño_archivo}, Recibido: {escritos}")
+        except (ValueError, OSError) as e:
+            MensajeEnDisco(ruta_archivo, 0).eliminar()
+            error_msg = f"❌ Error descomprimiendo {nombre_archivo} ({codec}): {e}"
+            log.error(error_msg)
+            if hasattr(self.chat_app, 'root'):
+                self.chat_app.root.after(100, 
+                    lambda: self.chat_app.mostrar_mensaje("Error", error_msg))
+            return
+        log.info("🗜️ %s descomprimido (%s): %d → %d bytes", nombre_archivo, codec, longitud, escritos)
+        self._archivo_guardado(ruta_archivo, tamaño_archivo, source_mac)
+
+    @staticmethod
+    def _lector_memoria(vista: memoryview):
+        """Función leer(n) sobre una memoryview, sin copiar"""
+        posicion = 0
+
+        def leer(n: int) -> memoryview:
+            nonlocal posicion
+            trozo = vista[posicion:posicion + n]
+            posicion += len(trozo)
+            return trozo
+        return leer
+
+    @staticmethod
+    def _ruta_destino_unica(nombre_base: str, download_dir: str = "downloads") -> str:
+        """Ruta libre dentro de downloads, agregando un número si el archivo ya existe"""
+        os.makedirs(download_dir, exist_ok=True)
+        ruta_archivo = os.path.join(download_dir, nombre_base)
+        contador = 1
+        while os.path.exists(ruta_archivo):
+            nombre, extension = os.path.splitext(nombre_base)
+            ruta_archivo = os.path.join(download_dir, f"{nombre}_{contador}{extension}")
+            contador += 1
+        return ruta_archivo
+
+    @staticmethod
+    def _extraer_contenido(origen: str, destino: str, inicio: int, tamaño: int):
+        """Copia `tamaño` bytes desde `inicio` sin pasar por memoria cuando el kernel lo permite"""
+        with open(origen, 'rb') as f_origen, open(destino, 'wb') as f_destino:
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    copiados = 0
+                    while copiados < tamaño:
+                        n = os.copy_file_range(f_origen.fileno(), f_destino.fileno(), tamaño - copiados,
+                                               inicio + copiados, copiados)
+                        if n == 0:
+                            break
+                        copiados += n
+                    if copiados == tamaño:
+                        return
+                except OSError:
+                    pass
+                f_destino.seek(0)
+                f_destino.truncate()
+            f_origen.seek(inicio)
+            restante = tamaño
+            while restante > 0:
+                bloque = f_origen.read(min(restante, 1024 * 1024))
+                if not bloque:
+                    break
+                f_destino.write(bloque)
+                restante -= len(bloque)
+
     def _procesar_archivo_unificado_str(self, mensaje: str, source_mac: str):
         """Procesa archivo con formato FILE_TRANSFER: desde string (solo archivos de texto)"""
         try:
@@ -251,9 +542,9 @@ class FileTransfer:
                 tamaño_archivo = int(parts[2])
                 contenido_archivo = parts[3].encode('utf-8')  # Convertir a bytes
                 
-                print(f"Archivo de texto recibido: {nombre_archivo}")
-                print(f"   → Tamaño esperado: {tamaño_archivo} bytes")
-                print(f"   → Tamaño recibido: {len(contenido_archivo)} bytes")
+                log.info("Archivo de texto recibido: %s", nombre_archivo)
+                log.info("   → Tamaño esperado: %s bytes", tamaño_archivo)
+                log.info("   → Tamaño recibido: %s bytes", len(contenido_archivo))
                 
                 # Verificar integridad del tamaño
                 if len(contenido_archivo) == tamaño_archivo:
@@ -261,12 +552,12 @@ class FileTransfer:
                     self._guardar_archivo_directo(nombre_archivo, contenido_archivo, source_mac)
                 else:
                     error_msg = f"Error: Tamaño de archivo incorrecto. Esperado: {tamaño_archivo}, Recibido: {len(contenido_archivo)}"
-                    print(f"❌ {error_msg}")
+                    log.error("❌ %s", error_msg)
                     if hasattr(self.chat_app, 'root'):
                         self.chat_app.root.after(100, 
                             lambda: self.chat_app.mostrar_mensaje("Error", error_msg))
         
         except Exception as e:
-            print(f"❌ Error procesando archivo desde string: {e}")
+            log.error("❌ Error procesando archivo desde string: %s", e)
             import traceback
             traceback.print_exc()
\ No newline at end of file
@@ -7,11 +7,16 @@ MÉTODO: Envío recursivo de archivos individuales (sin ZIP)
 
 import os
 import shutil
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from typing import List, Dict, Optional, Callable
 import time
 import json
 from pathlib import Path
 from ..core.frames import Tipo_Mensaje
+from ..core.registro import obtener_logger
+from .files import ARCHIVO_GRANDE, descartar_preparado
+
+log = obtener_logger(__name__)
 
 class FolderTransfer:
     def __init__(self, chat_app):
@@ -24,6 +29,7 @@ class FolderTransfer:
         self.chat_app = chat_app
         self.carpetas_en_progreso: Dict[str, dict] = {}
         self.transferencias_activas: Dict[str, dict] = {}  # Transfer ID -> metadata
+        self.adelantar_preparacion = True  # Comprimir el siguiente archivo mientras se envía el actual
         
         # Configurar directorio de recepción
         self.receive_dir = "downloads"
@@ -76,35 +82,50 @@ class FolderTransfer:
             
             # Enviar cada archivo individualmente con su ruta relativa
             files_sent = 0
-            for relative_path, full_path in file_list:
-                # Enviar información del archivo (ruta relativa)
-                file_info = {
-                    'type': 'folder_file',
-                    'transfer_id': transfer_id,
-                    'relative_path': relative_path,
-                    'file_size': os.path.getsize(full_path)
-                }
-                
-                file_info_json = json.dumps(file_info)
-                file_info_frames = self.chat_app.com.crear_frame(
-                    dest_mac,
-                    Tipo_Mensaje.texto.value,
-                    f"FOLDER_FILE:{file_info_json}"
-                )
-                
-                self.chat_app.com.enviar_archivo(file_info_frames)
-                
-                # Enviar el archivo usando el sistema existente
-                success, message = self.chat_app.file_transfer.send_file(full_path, dest_mac)
-                
-                if not success:
-                    return False, f"Error enviando archivo {relative_path}: {message}"
-                
-                files_sent += 1
-                
-                if progress_callback:
-                    progress = (files_sent / total_files) * 100
-                    progress_callback(progress, f"Enviando: {relative_path}")
+            file_transfer = self.chat_app.file_transfer
+            # Con compresión, el siguiente archivo se comprime mientras se envía el actual
+            adelantar = self.adelantar_preparacion and getattr(file_transfer, 'compresion', None) is not None
+            with ThreadPoolExecutor(1, thread_name_prefix="linkchat-carpeta") as preparacion:
+                siguiente = self._adelantar(preparacion, file_list, 0, dest_mac) if adelantar else None
+                try:
+                    for indice, (relative_path, full_path) in enumerate(file_list):
+                        preparado = siguiente
+                        if adelantar:
+                            siguiente = self._adelantar(preparacion, file_list, indice + 1, dest_mac)
+
+                        # Enviar información del archivo (ruta relativa)
+                        file_info = {
+                            'type': 'folder_file',
+                            'transfer_id': transfer_id,
+                            'relative_path': relative_path,
+                            'file_size': os.path.getsize(full_path)
+                        }
+                        
+                        file_info_json = json.dumps(file_info)
+                        file_info_frames = self.chat_app.com.crear_frame(
+                            dest_mac,
+                            Tipo_Mensaje.texto.value,
+                            f"FOLDER_FILE:{file_info_json}"
+                        )
+                        
+                        self.chat_app.com.enviar_archivo(file_info_frames)
+                        
+                        # Enviar el archivo usando el sistema existente
+                        success, message = file_transfer.send_file(full_path, dest_mac, preparado=preparado)
+                        if preparado is not None:
+                            descartar_preparado(preparado)  # Por si send_file salió antes de usarlo
+                        
+                        if not success:
+                            return False, f"Error enviando archivo {relative_path}: {message}"
+                        
+                        files_sent += 1
+                        
+                        if progress_callback:
+                            progress = (files_sent / total_files) * 100
+                            progress_callback(progress, f"Enviando: {relative_path}")
+                finally:
+                    if siguiente is not None:
+                        descartar_preparado(siguiente)
             
             # Enviar metadata de finalización
             folder_end_metadata = {
@@ -130,6 +151,16 @@ class FolderTransfer:
         except Exception as e:
             return False, f"Error procesando carpeta: {str(e)}"
     
+    def _adelantar(self, preparacion: Executor, file_list: list, indice: int, dest_mac: str) -> Optional[Future]:
+        """Lanza preparar_envio del archivo `indice` (los grandes no: la GUI pide confirmación antes)"""
+        if indice >= len(file_list):
+            return None
+        full_path = file_list[indice][1]
+        if os.path.getsize(full_path) > ARCHIVO_GRANDE:
+            return None
+        return preparacion.submit(self.chat_app.file_transfer.preparar_envio, full_path, None,
+                                  self.chat_app.com.payload_maximo(dest_mac))
+
     def _scan_folder_recursive(self, folder_path: str) -> list:
         """
         Escanea una carpeta recursivamente y retorna lista de archivos
@@ -170,7 +201,7 @@ class FolderTransfer:
             return False
             
         except Exception as e:
-            print(f"❌ Error procesando mensaje de carpeta: {e}")
+            log.error("❌ Error procesando mensaje de carpeta: %s", e)
             return False
     
     def _handle_folder_start(self, json_data: str, source_mac: str) -> bool:
@@ -205,7 +236,7 @@ class FolderTransfer:
             return True
             
         except Exception as e:
-            print(f"❌ Error iniciando recepción de carpeta: {e}")
+            log.error("❌ Error iniciando recepción de carpeta: %s", e)
             return False
     
     def _handle_folder_file(self, json_data: str, source_mac: str) -> bool:
@@ -236,7 +267,7 @@ class FolderTransfer:
             return True
             
         except Exception as e:
-            print(f"❌ Error procesando info de archivo: {e}")
+            log.error("❌ Error procesando info de archivo: %s", e)
             return False
     
     def _handle_folder_end(self, json_data: str, source_mac: str) -> bool:
@@ -260,7 +291,7 @@ class FolderTransfer:
             return True
             
         except Exception as e:
-            print(f"❌ Error finalizando recepción de carpeta: {e}")
+            log.error("❌ Error finalizando recepción de carpeta: %s", e)
             return False
     
     def check_folder_file_received(self, file_path: str, source_mac: str) -> bool:
@@ -289,7 +320,7 @@ class FolderTransfer:
             return False
             
         except Exception as e:
-            print(f"❌ Error verificando archivo de carpeta: {e}")
+            log.error("❌ Error verificando archivo de carpeta: %s", e)
             return False
     
     def _process_folder_file(self, file_path: str, transfer_id: str, folder_info: dict, expected_info: dict) -> bool:
@@ -328,7 +359,7 @@ class FolderTransfer:
             return True
             
         except Exception as e:
-            print(f"❌ Error procesando archivo de carpeta: {e}")
+            log.error("❌ Error procesando archivo de carpeta: %s", e)
             return False
     
     def get_folder_size(self, folder_path: str) -> tuple:
@@ -355,7 +386,7 @@ class FolderTransfer:
             return total_size, file_count
             
         except Exception as e:
-            print(f"❌ Error calculando tamaño de carpeta: {e}")
+            log.error("❌ Error calculando tamaño de carpeta: %s", e)
             return 0, 0
     
     def cleanup_temp_files(self):
@@ -372,7 +403,7 @@ class FolderTransfer:
             
             for transfer_id in expired_transfers:
                 del self.carpetas_en_progreso[transfer_id]
-                print(f"🗑️ Transferencia de carpeta expirada eliminada: {transfer_id}")
+                log.info("🗑️ Transferencia de carpeta expirada eliminada: %s", transfer_id)
                     
         except Exception as e:
-            print(f"❌ Error limpiando archivos temporales: {e}")
\ No newline at end of file
+            log.error("❌ Error limpiando archivos temporales: %s", e)
\ No newline at end of file
@@ -12,6 +12,9 @@ import time
 import secrets
 import base64
 from typing import Optional, Dict, Tuple, Union
+from ..core.registro import obtener_logger
+
+log = obtener_logger(__name__)
 
 class SimpleSecurityManager:
     """
@@ -49,10 +52,10 @@ class SimpleSecurityManager:
         """
         try:
             self.security_enabled = True
-            print("🔒 Seguridad básica habilitada")
+            log.info("🔒 Seguridad básica habilitada")
             return True
         except Exception as e:
-            print(f"❌ Error habilitando seguridad: {e}")
+            log.error("❌ Error habilitando seguridad: %s", e)
             return False
     
     def disable_security(self):
@@ -60,7 +63,7 @@ class SimpleSecurityManager:
         self.security_enabled = False
         self.session_keys.clear()
         self.key_exchanges.clear()
-        print("🔓 Seguridad deshabilitada")
+        log.info("🔓 Seguridad deshabilitada")
     
     def initiate_key_exchange(self, target_mac: str) -> bool:
         """
@@ -106,11 +109,11 @@ class SimpleSecurityManager:
             )
             
             self.chat_app.com.enviar_protocolo(frames)
-            print(f"🔑 Solicitud de intercambio de claves enviada a {target_mac}")
+            log.info("🔑 Solicitud de intercambio de claves enviada a %s", target_mac)
             return True
             
         except Exception as e:
-            print(f"❌ Error iniciando intercambio de claves: {e}")
+            log.error("❌ Error iniciando intercambio de claves: %s", e)
             return False
     
     def process_security_message(self, mac_origen: str, mensaje: str) -> bool:
@@ -129,7 +132,7 @@ class SimpleSecurityManager:
                 return False
             
             if not self.security_enabled:
-                print("⚠️ Mensaje de seguridad recibido pero seguridad deshabilitada")
+                log.warning("⚠️ Mensaje de seguridad recibido pero seguridad deshabilitada")
                 return True
             
             # Extraer datos JSON
@@ -145,12 +148,12 @@ class SimpleSecurityManager:
             elif msg_type == 'SECURE_MESSAGE':
                 self._handle_secure_message(mac_origen, data)
             else:
-                print(f"❓ Tipo de mensaje de seguridad desconocido: {msg_type}")
+                log.warning("❓ Tipo de mensaje de seguridad desconocido: %s", msg_type)
             
             return True
             
         except Exception as e:
-            print(f"❌ Error procesando mensaje de seguridad: {e}")
+            log.error("❌ Error procesando mensaje de seguridad: %s", e)
             return False
     
     def _handle_simple_key_request(self, mac_origen: str, data: dict):
@@ -185,20 +188,20 @@ class SimpleSecurityManager:
             
             self.chat_app.com.enviar_protocolo(frames)
             
-            print(f"🔑 Clave de sesión establecida con {mac_origen}")
+            log.info("🔑 Clave de sesión establecida con %s", mac_origen)
             
             # Notificar al usuario
             if hasattr(self.chat_app, 'mostrar_mensaje'):
                 self.chat_app.mostrar_mensaje("Seguridad", f"Canal seguro establecido con {mac_origen}")
             
         except Exception as e:
-            print(f"❌ Error manejando solicitud de clave: {e}")
+            log.error("❌ Error manejando solicitud de clave: %s", e)
     
     def _handle_simple_key_response(self, mac_origen: str, data: dict):
         """Maneja respuestas de intercambio de claves"""
         try:
             if mac_origen not in self.key_exchanges:
-                print(f"⚠️ Respuesta de clave no solicitada desde {mac_origen}")
+                log.warning("⚠️ Respuesta de clave no solicitada desde %s", mac_origen)
                 return
             
             remote_token = data['public_token']
@@ -207,7 +210,7 @@ class SimpleSecurityManager:
             
             # Verificar token de intercambio
             if exchange_token != exchange_info['exchange_token']:
-                print(f"❌ Token de intercambio inválido desde {mac_origen}")
+                log.error("❌ Token de intercambio inválido desde %s", mac_origen)
                 return
             
             # Crear clave de sesión
@@ -220,14 +223,14 @@ class SimpleSecurityManager:
             # Limpiar intercambio
             del self.key_exchanges[mac_origen]
             
-            print(f"🔑 Clave de sesión establecida con {mac_origen}")
+            log.info("🔑 Clave de sesión establecida con %s", mac_origen)
             
             # Notificar al usuario
             if hasattr(self.chat_app, 'mostrar_mensaje'):
                 self.chat_app.mostrar_mensaje("Seguridad", f"Canal seguro establecido con {mac_origen}")
             
         except Exception as e:
-            print(f"❌ Error manejando respuesta de clave: {e}")
+            log.error("❌ Error manejando respuesta de clave: %s", e)
     
     def encrypt_message(self, mensaje: str, target_mac: str) -> Optional[str]:
         """
@@ -275,7 +278,7 @@ class SimpleSecurityManager:
             return f"SECURITY:{json.dumps(secure_data)}"
             
         except Exception as e:
-            print(f"❌ Error cifrando mensaje: {e}")
+            log.error("❌ Error cifrando mensaje: %s", e)
             return None
     
     def _handle_secure_message(self, mac_origen: str, data: dict) -> bool:
@@ -291,7 +294,7 @@ class SimpleSecurityManager:
         """
         try:
             if mac_origen not in self.session_keys:
-                print(f"⚠️ Mensaje seguro recibido sin clave de sesión desde {mac_origen}")
+                log.warning("⚠️ Mensaje seguro recibido sin clave de sesión desde %s", mac_origen)
                 return False
             
             session_key = self.session_keys[mac_origen]
@@ -306,7 +309,7 @@ class SimpleSecurityManager:
             calculated_mac = hmac.new(hmac_key, nonce + encrypted, hashlib.sha256).digest()
             
             if not hmac.compare_digest(received_mac, calculated_mac):
-                print(f"❌ HMAC inválido en mensaje de {mac_origen}")
+                log.error("❌ HMAC inválido en mensaje de %s", mac_origen)
                 return False
             
             # Derivar clave de descifrado
@@ -327,7 +330,7 @@ class SimpleSecurityManager:
             return True
             
         except Exception as e:
-            print(f"❌ Error descifrando mensaje: {e}")
+            log.error("❌ Error descifrando mensaje: %s", e)
             if hasattr(self.chat_app, 'mostrar_mensaje'):
                 self.chat_app.mostrar_mensaje("Error", f"No se pudo descifrar mensaje de {mac_origen}")
             return False
@@ -370,4 +373,4 @@ class SimpleSecurityManager:
         
         for mac in exchanges_to_remove:
             del self.key_exchanges[mac]
-            print(f"⏰ Intercambio de clave expirado con {mac}")
\ No newline at end of file
+            log.warning("⏰ Intercambio de clave expirado con %s", mac)
\ No newline at end of file
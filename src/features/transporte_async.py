@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Transporte asyncio para Link-Chat
+Recepción, envíos y transferencias concurrentes en un solo hilo
+"""
+
+import asyncio
+import functools
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, Union
+
+from ..core.env_recb import Envio_recibo_frames
+from ..core.eventos import Temporizador
+from ..core.fiable import FuenteFragmentos, huella_contenido
+from ..core.frames import Frame, Tipo_Mensaje
+from ..core.integridad import cabecera_integridad
+from ..core.planificador import CLASE_INTERACTIVA, CLASE_MASIVA
+from ..core.registro import obtener_logger
+from .files import FileTransfer
+
+log = obtener_logger(__name__)
+
+_FIN = object()  # Marca de cierre en la cola de recibidos
+TROZOS_POR_LECTURA = 256  # Fragmentos de archivo leídos en cada llamada al executor
+
+
+class _BucleAsyncio:
+    """
+    Sustituye al BucleEventos del comunicador: la misma interfaz sobre el
+    loop de asyncio, para que los envíos encolados (planificador, pacer con
+    temporizadores, agrupador) y los temporizadores de discovery corran en él.
+    Lo programado antes de iniciar() se ejecuta al abrir el transporte.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.hilo = None
+        self.ejecutando = False
+        self.pendientes = deque()
+
+    def iniciar(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.hilo = threading.current_thread()
+        self.ejecutando = True
+        while self.pendientes:
+            callback, args = self.pendientes.popleft()
+            loop.call_soon(self._llamar, callback, args)
+
+    def registrar_lector(self, fd, callback: Callable):
+        self.loop.add_reader(fd, callback)
+
+    def quitar_lector(self, fd):
+        if self.loop is not None:
+            self.loop.remove_reader(fd)
+
+    def llamar_en(self, segundos: float, callback: Callable, *args) -> Temporizador:
+        """Programa `callback(*args)` dentro de `segundos` (solo desde el hilo del loop o antes de iniciar())"""
+        temporizador = Temporizador(time.monotonic() + segundos, callback, args)
+        if self.loop is None:
+            self.pendientes.append((self._programar, (temporizador,)))
+        else:
+            self._programar(temporizador)
+        return temporizador
+
+    def llamar_cada(self, intervalo: float, callback: Callable, *args, inicio: float = 0.0) -> Temporizador:
+        temporizador = self.llamar_en(inicio, callback, *args)
+        temporizador.intervalo = intervalo
+        return temporizador
+
+    def llamar_desde_hilo(self, callback: Callable, *args):
+        if self.loop is None:
+            self.pendientes.append((callback, args))
+        elif self.ejecutando:
+            self.loop.call_soon_threadsafe(self._llamar, callback, args)
+
+    def en_hilo_del_bucle(self) -> bool:
+        return self.hilo is threading.current_thread()
+
+    def _programar(self, temporizador: Temporizador):
+        self.loop.call_at(self.loop.time() + max(0.0, temporizador.instante - time.monotonic()),
+                          self._disparar, temporizador)
+
+    def _disparar(self, temporizador: Temporizador):
+        if temporizador.cancelado or not self.ejecutando:
+            return
+        if temporizador.intervalo is not None:
+            temporizador.instante = time.monotonic() + temporizador.intervalo
+            self._programar(temporizador)
+        self._llamar(temporizador.callback, temporizador.args)
+
+    def _llamar(self, callback: Callable, args: tuple):
+        if not self.ejecutando:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            log.exception("❌ Error en callback del loop del transporte: %s", e)
+
+    def detener(self, esperar: float = 1.0):
+        self.ejecutando = False
+
+    def cerrar(self):
+        pass
+
+    def estado(self) -> dict:
+        return {}
+
+
+class _ColaRecibidos:
+    """Sustituye a cola_mensajes: entrega los mensajes a la asyncio.Queue del transporte"""
+
+    def __init__(self, cola: asyncio.Queue):
+        self.cola = cola
+
+    def put(self, mensaje):
+        # Siempre se llama desde el hilo del loop (callback de add_reader)
+        self.cola.put_nowait(mensaje)
+
+    def empty(self) -> bool:
+        return self.cola.empty()
+
+
+class LinkChatTransport:
+    """
+    Transporte asyncio sobre Envio_recibo_frames.
+
+    El socket AF_PACKET se registra con loop.add_reader y el loop sustituye
+    al bucle de E/S del comunicador: no hay hilo de recepción y cualquier
+    número de envíos, transferencias y pares se atienden en el hilo del
+    loop. Los envíos pasan por el planificador del comunicador (prioridades,
+    reparto por turnos y agrupación) y su pacer, igual que con receive_thread.
+
+    Uso:
+        async with LinkChatTransport("eth0") as transporte:
+            await transporte.send_message(mac, "hola")
+            async for mensaje in transporte:
+                ...
+    """
+
+    def __init__(self, interfaz: Optional[str] = None, comunicador: Optional[Envio_recibo_frames] = None,
+                 frames_por_turno: int = 64, **opciones):
+        """
+        Args:
+            interfaz: Interfaz de red (si no se pasa un comunicador)
+            comunicador: Envio_recibo_frames ya creado; no debe tener receive_thread en marcha
+            frames_por_turno: Frames enviados seguidos antes de ceder el loop a otras tareas
+            **opciones: Argumentos para Envio_recibo_frames (backend_recepcion, backend_envio...)
+        """
+        self.com = comunicador if comunicador is not None else Envio_recibo_frames(interfaz, **opciones)
+        self.com.bucle.cerrar()
+        self.com.bucle = _BucleAsyncio()
+        self.com.frames_por_turno = frames_por_turno
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.recibidos: Optional[asyncio.Queue] = None
+        self.envios = set()  # Futures de los envíos en curso, se cancelan al cerrar
+        self.abierto = False
+        self.integridad: Optional[str] = "blake2b"  # Cabecera de integridad en send_file (None: sin ella)
+
+    @property
+    def mac(self) -> str:
+        return self.com.mac_ori
+
+    async def abrir(self):
+        """Registra el socket en el loop en curso"""
+        if self.abierto:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.recibidos = asyncio.Queue()
+        self.com.cola_mensajes = _ColaRecibidos(self.recibidos)
+        self.com.bucle.iniciar(self.loop)
+        self.com.bucle.registrar_lector(self.com.mi_socket.fileno(), self.com.lector_recepcion())
+        self.abierto = True
+
+    async def cerrar(self):
+        """Deja de leer el socket, despierta a los iteradores y libera el comunicador"""
+        if not self.abierto:
+            return
+        self.abierto = False
+        self.com.bucle.quitar_lector(self.com.mi_socket.fileno())
+        for envio in self.envios:
+            envio.cancel()
+        self.recibidos.put_nowait(_FIN)
+        self.com.stop()
+
+    async def __aenter__(self):
+        await self.abrir()
+        return self
+
+    async def __aexit__(self, *excepcion):
+        await self.cerrar()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Frame:
+        mensaje = await self.recibir()
+        if mensaje is None:
+            raise StopAsyncIteration
+        return mensaje
+
+    async def recibir(self) -> Optional[Frame]:
+        """Siguiente mensaje completo recibido; None cuando el transporte se cierra"""
+        mensaje = await self.recibidos.get()
+        if mensaje is _FIN:
+            self.recibidos.put_nowait(_FIN)  # Para el resto de iteradores
+            return None
+        return mensaje
+
+    async def send_frames(self, frames, progreso: Optional[Callable[[int, int], None]] = None,
+                          clase: str = CLASE_MASIVA) -> int:
+        """
+        Envía frames (lista o generador) por el planificador del comunicador
+        sin bloquear el loop: los transmite el propio loop respetando el pacer,
+        intercalados con la recepción y con el resto de envíos.
+
+        Args:
+            frames: Frames ya codificados
+            progreso: Callback opcional (frames_enviados, bytes_enviados)
+            clase: Clase del planificador (ver PlanificadorEnvio)
+
+        Returns:
+            int: Bytes enviados
+        """
+        com = self.com
+        if com.agrupador is not None and com._agrupar(frames, clase):
+            return len(frames[0])
+        loop = self.loop
+        bucle = com.bucle
+        terminado = loop.create_future()
+        al_enviar = None
+        if progreso is not None:
+            def al_enviar(flujo):
+                # Si conduce otro hilo (p. ej. un envío fiable en el executor), el aviso pasa al loop
+                if bucle.en_hilo_del_bucle():
+                    progreso(flujo.enviados, flujo.bytes)
+                else:
+                    loop.call_soon_threadsafe(progreso, flujo.enviados, flujo.bytes)
+
+        al_terminar = lambda _: loop.call_soon_threadsafe(_resolver, terminado)
+        flujo = com.enviar_en_segundo_plano(frames, al_terminar, clase, al_enviar)
+        self.envios.add(terminado)
+        try:
+            await terminado
+        finally:
+            self.envios.discard(terminado)
+        if flujo.error is not None:
+            raise flujo.error
+        return flujo.bytes
+
+    async def send_message(self, destino: str, mensaje: Union[str, bytes],
+                           tipo_mensaje: Tipo_Mensaje = Tipo_Mensaje.texto) -> int:
+        """
+        Envía un mensaje (fragmentado si hace falta).
+
+        Returns:
+            int: Bytes enviados
+        """
+        frames = self.com.crear_frame(destino, tipo_mensaje, mensaje)
+        total_bytes = await self.send_frames(frames, clase=CLASE_INTERACTIVA)
+        self.com.estadisticas['mensajes_enviados'] += 1
+        if len(frames) > 1:
+            self.com.estadisticas['mensajes_fragmentados'] += 1
+        return total_bytes
+
+    async def send_file(self, ruta: str, destino: str,
+                        progreso: Optional[Callable[[int, int, int], None]] = None, fiable: bool = False) -> int:
+        """
+        Envía un archivo en streaming con el mismo formato que FileTransfer
+        (FILE_TRANSFER:nombre:tamaño: + contenido): la memoria no crece con el archivo.
+
+        Args:
+            ruta: Ruta del archivo
+            destino: MAC destino
+            progreso: Callback opcional (frames_enviados, total_frames, bytes_enviados)
+            fiable: Confirmación con SACK y retransmisión de lo perdido; el envío
+                corre en un hilo del executor y los SACK se procesan en el loop.
+                Si se interrumpe, reenviar el mismo archivo continúa donde se quedó
+
+        Returns:
+            int: Bytes enviados
+        """
+        nombre_archivo = os.path.basename(ruta)
+        tamaño_archivo = os.path.getsize(ruta)
+        metadata = f"FILE_TRANSFER:{nombre_archivo}:{tamaño_archivo}:".encode('utf-8')
+        tamaño_fragmento = self.com.payload_maximo(destino)
+        if self.integridad and len(metadata) + tamaño_archivo > tamaño_fragmento:
+            metadata = await self.loop.run_in_executor(None, self._con_integridad, ruta, metadata, tamaño_archivo,
+                                                       tamaño_fragmento)
+        longitud_total = len(metadata) + tamaño_archivo
+        total_frames = self.com.calcular_total_frames(destino, longitud_total)
+        avisar = None
+        if progreso is not None:
+            avisar = lambda enviados, bytes_enviados: progreso(enviados, total_frames, bytes_enviados)
+
+        if fiable:
+            with open(ruta, 'rb') as archivo:
+                fuente = FuenteFragmentos(metadata, archivo=archivo, tamaño_fragmento=tamaño_fragmento)
+                avisar_fiable = None
+                if progreso is not None:
+                    avisar_fiable = lambda _, confirmados, total, bytes_enviados: self.loop.call_soon_threadsafe(
+                        progreso, confirmados, total, bytes_enviados)
+                huella = await self.loop.run_in_executor(None, huella_contenido, fuente)
+                return await self.loop.run_in_executor(None, functools.partial(
+                    self.com.enviar_fiable, destino, Tipo_Mensaje.archivo, fuente,
+                    progress_callback=avisar_fiable, archivo_nombre=nombre_archivo, huella=huella))
+
+        log.info("📤 Enviando %s en streaming (%s frames)...", nombre_archivo, total_frames)
+        total_bytes = 0
+        enviados = 0
+        with open(ruta, 'rb', buffering=1 << 20) as archivo:
+            # El archivo se lee en el executor por bloques de trozos, el siguiente mientras sale el actual;
+            # los frames se construyen a partir de lo ya leído, así que el loop nunca espera al disco
+            leidos = FileTransfer._leer_trozos(archivo, metadata, tamaño_fragmento)
+            trozos = deque()
+            frames = self.com.crear_frames_stream(
+                destino,
+                Tipo_Mensaje.archivo.value,
+                _consumir(trozos),
+                longitud_total,
+                tamaño_fragmento=tamaño_fragmento
+            )
+            leer = lambda: list(itertools.islice(leidos, TROZOS_POR_LECTURA))
+            lectura = self.loop.run_in_executor(None, leer)
+            try:
+                while lectura is not None:
+                    trozos.extend(await lectura)
+                    ultimo = len(trozos) < TROZOS_POR_LECTURA
+                    lectura = None if ultimo else self.loop.run_in_executor(None, leer)
+                    if ultimo:
+                        lote = list(frames)  # Lo que queda, reparaciones FEC incluidas
+                    else:
+                        lote = []
+                        while trozos:
+                            lote.append(next(frames))
+                    avisar_lote = None
+                    if avisar is not None:
+                        avisar_lote = lambda n, b, base=enviados, base_bytes=total_bytes: avisar(base + n,
+                                                                                                base_bytes + b)
+                    total_bytes += await self.send_frames(lote, avisar_lote)
+                    enviados += len(lote)
+            finally:
+                if lectura is not None:
+                    lectura.cancel()
+        self.com.estadisticas['archivos_enviados'] += 1
+        log.info("✅ Archivo %s enviado en %s frame(s)", nombre_archivo, total_frames)
+        return total_bytes
+
+    def _con_integridad(self, ruta: str, metadata: bytes, tamaño: int, tamaño_fragmento: int) -> bytes:
+        """Antepone a `metadata` la cabecera de integridad del archivo (se ejecuta en el executor)"""
+        with open(ruta, 'rb', buffering=1 << 20) as archivo:
+            return cabecera_integridad(metadata, archivo, tamaño, self.integridad,
+                                       tamaño_fragmento=tamaño_fragmento) + metadata
+
+    def obtener_estadisticas(self) -> dict:
+        return self.com.obtener_estadisticas()
+
+
+def _resolver(futuro: asyncio.Future):
+    if not futuro.done():  # Cancelado al cerrar el transporte
+        futuro.set_result(None)
+
+
+def _consumir(trozos: deque):
+    """Entrega los trozos ya leídos; send_file solo pide frames mientras queden"""
+    while trozos:
+        yield trozos.popleft()